@@ -11,7 +11,8 @@ from chatbot.database.datastore.models.models import (
     QueryWithEmbedding,
 )
 from chatbot.database.datastore.services.chunks import get_document_chunks
-from chatbot.services.openai_service import get_embeddings
+from chatbot.services.openai_service import EMBEDDING_MODEL, EMBEDDING_DIMENSION
+from chatbot.services.embedding_batcher import embedding_batcher
 
 
 class DataStore(ABC):
@@ -44,7 +45,7 @@ class DataStore(ABC):
         #     ]
         # )
 
-        chunks = get_document_chunks(documents, chunk_token_size)
+        chunks = await get_document_chunks(documents, chunk_token_size)
 
         return await self._upsert(chunks)
 
@@ -83,7 +84,9 @@ class DataStore(ABC):
         Takes in a list of queries and filters and returns a list of query results with matching document chunks and scores.
         """
         query_texts = [query.query for query in queries]
-        query_embeddings = get_embeddings(query_texts)
+        query_embeddings = await embedding_batcher.embed_many(
+            query_texts, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSION
+        )
 
         queries_with_embeddings = [
             QueryWithEmbedding(**query.model_dump(), embedding=embedding)
@@ -5,7 +5,6 @@ from tenacity import retry, wait_random_exponential, stop_after_attempt
 import asyncio
 import logging
 from dotenv import load_dotenv
-from pinecone import Pinecone
 from pinecone.core.client.exceptions import NotFoundException
 
 from .datastore import DataStore
@@ -19,6 +18,8 @@ from chatbot.database.datastore.models.models import (
     Source,
 )
 from chatbot.database.datastore.services.date import to_unix_timestamp
+from chatbot.services.retrieval.vectorstores.pinecone.client import pinecone_registry
+from chatbot.services.retrieval.vectorstores.pinecone.batch_upsert import parallel_upsert
 
 load_dotenv()
 
@@ -27,17 +28,15 @@ PINECONE_INDEX = os.environ.get("PINECONE_INDEX")
 assert PINECONE_API_KEY is not None
 assert PINECONE_INDEX is not None
 
-UPSERT_BATCH_SIZE = 100
 EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", 256))
 
-pinecone = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
 
 class PineconeDataStore(DataStore):
     def __init__(self, index_name: Optional[str] = None):
 
         self.index = None
         pinecone_index = index_name if index_name is not None else PINECONE_INDEX
-        indexes = [item["name"] for item in pinecone.list_indexes()]
+        indexes = [item["name"] for item in pinecone_registry.client.list_indexes()]
 
         if pinecone_index and pinecone_index not in indexes:
             logging.error(f"Index {pinecone_index} does not exist")
@@ -45,7 +44,7 @@ class PineconeDataStore(DataStore):
         elif pinecone_index and pinecone_index in indexes:
             try:
                 logging.info(f"Connecting to existing index {pinecone_index}")
-                self.index = pinecone.Index(pinecone_index)
+                self.index = pinecone_registry.get_index(pinecone_index)
                 logging.info(f"Connected to index {pinecone_index} successfully")
             except Exception as e:
                 logging.error(f"Error connecting to index {pinecone_index}: {e}")
@@ -80,19 +79,13 @@ class PineconeDataStore(DataStore):
                 vector = (chunk.id, chunk.embedding, pinecone_metadata)
                 vectors.append(vector)
 
-        batches = [
-            vectors[i : i + UPSERT_BATCH_SIZE]
-            for i in range(0, len(vectors), UPSERT_BATCH_SIZE)
-        ]
-
-        for batch in batches:
-            try:
-                logging.info(f"Upserting batch of size {len(batch)}")
-                self.index.upsert(vectors=batch)
-                logging.info(f"Upserted batch successfully")
-            except Exception as e:
-                logging.error(f"Error upserting batch: {e}")
-                raise e
+        try:
+            # Byte-sized batches sent concurrently, off the event loop
+            stats = await asyncio.to_thread(parallel_upsert, self.index, vectors)
+            logging.info(f"Upserted {stats['vectors']} vectors ({stats['vectors_per_second']} vectors/s)")
+        except Exception as e:
+            logging.error(f"Error upserting batch: {e}")
+            raise e
 
         return doc_ids
 
@@ -1,4 +1,5 @@
 from typing import Dict, List, Optional, Tuple
+import asyncio
 import uuid
 import os
 import tiktoken
@@ -8,7 +9,8 @@ from chatbot.database.datastore.models.models import (
     DocumentChunk,
     DocumentChunkMetadata,
 )
-from chatbot.services.openai_service import get_embeddings
+from chatbot.services.openai_service import EMBEDDING_MODEL, EMBEDDING_DIMENSION
+from chatbot.services.embedding_pipeline import embedding_pipeline
 
 tokenizer = tiktoken.get_encoding("cl100k_base")
 
@@ -117,7 +119,7 @@ def create_document_chunks(
     return doc_chunks, doc_id
 
 
-def get_document_chunks(
+async def get_document_chunks(
     documents: List[Document], chunk_token_size: Optional[int]
 ) -> Dict[str, List[DocumentChunk]]:
     """
@@ -144,15 +146,14 @@ def get_document_chunks(
     if not all_chunks:
         return {}
 
-    embeddings: List[List[float]] = []
-
-    for i in range(0, len(all_chunks), EMBEDDINGS_BATCH_SIZE):
-        batch_texts = [
-            chunk.text for chunk in all_chunks[i : i + EMBEDDINGS_BATCH_SIZE]
-        ]
-
-        batch_embeddings = get_embeddings(batch_texts)
-        embeddings.extend(batch_embeddings)
+    # Token-budgeted batches are embedded concurrently under the shared rate limiter
+    embeddings = await asyncio.to_thread(
+        embedding_pipeline.embed,
+        [chunk.text for chunk in all_chunks],
+        EMBEDDING_MODEL,
+        EMBEDDING_DIMENSION,
+        max_batch_size=EMBEDDINGS_BATCH_SIZE,
+    )
 
     for i, chunk in enumerate(all_chunks):
         chunk.embedding = embeddings[i]
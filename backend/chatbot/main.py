@@ -17,7 +17,14 @@ from chatbot.routes.ai_response_routes import router as ai_response_router
 from chatbot.routes.llm_arena_routes import router as llm_arena_router
 from chatbot.routes.pdf_routes import router as pdf_router
 from chatbot.database.database import client
+from chatbot.services.retrieval.active_files import active_pdf_registry
+from chatbot.services.retrieval.vectorstores.weaviate.client import weaviate_manager
+from chatbot.services.retrieval.vectorstores.pinecone.client import pinecone_registry
+from chatbot.services.ingestion_queue import ingestion_queue
+from chatbot.services.text_extract.extraction_pool import extraction_pool
+import asyncio
 import logging
+import os
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.encoders import jsonable_encoder
 
@@ -81,10 +88,35 @@ async def startup_event():
     except Exception as e:
         print(f"Failed to connect to MongoDB: {e}")
 
+    try:
+        await active_pdf_registry.start()
+    except Exception as e:
+        print(f"Failed to load active PDF registry: {e}")
+
+    try:
+        await asyncio.to_thread(pinecone_registry.warm_up)
+    except Exception as e:
+        print(f"Failed to warm up Pinecone indexes: {e}")
+
+    if os.getenv("WEAVIATE_URL"):
+        try:
+            await asyncio.to_thread(weaviate_manager.connect)
+        except Exception as e:
+            print(f"Failed to connect to Weaviate: {e}")
+
+    try:
+        await ingestion_queue.start()
+    except Exception as e:
+        print(f"Failed to start PDF ingestion workers: {e}")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await ingestion_queue.stop()
+    await active_pdf_registry.stop()
+    extraction_pool.shutdown()
     client.close()
+    weaviate_manager.close()
 
 
 logging.basicConfig(level=logging.DEBUG)
@@ -13,6 +13,7 @@ class PDFFile(BaseModel):
     vectorized: bool = False
     path: Optional[str] = None
     active: bool = True  # Default to active
+    sha256: Optional[str] = None  # Content hash keying the stored ingestion artifacts
     
     class Config:
         arbitrary_types_allowed = True
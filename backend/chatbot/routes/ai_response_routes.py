@@ -2,13 +2,21 @@ from chatbot.constants import ANTHROPIC_SEARCH_TOOL, OPENAI_SEARCH_TOOL
 from chatbot.services.llm.anthropic import AnthropicLLM
 from chatbot.services.llm.openai import OpenAILLM
 from chatbot.services.retrieval.vector_search import VectorSearchService, VectorStoreConfig
+from chatbot.services.retrieval.router import retrieval_router, RETRIEVAL_ROUTER_MODE
+from chatbot.services.embedding_batcher import embedding_batcher
+from chatbot.services.semantic_cache import (
+    semantic_cache, fingerprint_results, history_fingerprint, config_key, SEMANTIC_CACHE_THRESHOLD
+)
 from chatbot.database.database import db
 from chatbot.models.message import Message, Citation
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from typing import List, Optional, Literal, Dict, Any, AsyncGenerator
+from pydantic import BaseModel, Field
+from typing import List, Optional, Literal, Dict, Any, AsyncGenerator, Awaitable, Callable
+import numpy as np
 import os
+import re
+import asyncio
 import logging
 import time
 import json
@@ -27,6 +35,13 @@ logger = logging.getLogger("llm_search")
 
 load_dotenv()
 
+# Minimum cosine similarity between the raw query and the model's rewritten
+# search query for speculative retrieval results to be reused
+SPECULATIVE_RETRIEVAL_THRESHOLD = float(os.getenv("SPECULATIVE_RETRIEVAL_THRESHOLD", 0.9))
+# Server-side ceiling on the tool-calling turns a request may ask for
+TOOL_ITERATIONS_LIMIT = int(os.getenv("TOOL_ITERATIONS_LIMIT", 3))
+MAX_TOOL_ITERATIONS = min(int(os.getenv("MAX_TOOL_ITERATIONS", 1)), TOOL_ITERATIONS_LIMIT)
+
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -45,6 +60,8 @@ class LLMSearchRequest(BaseModel):
     query: str
     vector_store: VectorStoreConfig
     llm: LLMConfig
+    use_semantic_cache: bool = False
+    semantic_cache_threshold: Optional[float] = None
 
 class SearchResult(BaseModel):
     text: str
@@ -63,6 +80,138 @@ class ConversationLLMRequest(BaseModel):
     vector_store: VectorStoreConfig
     llm: LLMConfig
     stream: bool = False
+    use_semantic_cache: bool = False
+    semantic_cache_threshold: Optional[float] = None
+    # Start retrieval on the raw query while the tool-decision call runs
+    speculative_retrieval: bool = False
+    speculative_similarity_threshold: Optional[float] = None
+    # always | never | heuristic | llm (let the model call the search tool)
+    retrieval_mode: str = RETRIEVAL_ROUTER_MODE
+    # Stream the tool-decision call: search as soon as the tool arguments are
+    # complete and pass a direct answer through instead of making a second call
+    stream_tool_decision: bool = False
+    # Tool-calling turns in "llm" mode; above 1, search results are fed back to
+    # the model so it can issue follow-up searches (1..TOOL_ITERATIONS_LIMIT)
+    max_tool_iterations: int = Field(default=MAX_TOOL_ITERATIONS, ge=1, le=TOOL_ITERATIONS_LIMIT)
+
+# Keeps fire-and-forget tasks referenced until they finish
+background_tasks = set()
+
+def run_in_background(coro) -> None:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def lookup_cached_answer(
+    endpoint: str,
+    query: str,
+    search: Callable[[], Awaitable[List[Dict[str, Any]]]],
+    llm_config: LLMConfig,
+    vector_config: VectorStoreConfig,
+    threshold: Optional[float],
+    history: Optional[List[Dict[str, Any]]] = None
+):
+    """
+    Return (cache_entry, cache_args, search_results). search (the raw-query
+    retrieval) is only awaited when a cached answer to a similar question
+    exists, to check its retrieved chunks; search_results is None otherwise.
+    cache_args = (query_vector, config key) are passed to store_cached_answer
+    on a miss. Conversation turns pass their prior messages as history.
+    """
+    threshold = threshold or SEMANTIC_CACHE_THRESHOLD
+    query_vector = await embedding_batcher.embed(query, model="text-embedding-3-large")
+    key = config_key(
+        {"endpoint": endpoint, "history": history_fingerprint(history or [])},
+        llm_config.model_dump(),
+        vector_config.model_dump()
+    )
+    cache_args = (query_vector, key)
+    if not semantic_cache.has_candidate(query_vector, key, threshold=threshold):
+        return None, cache_args, None
+    search_results = await search()
+    entry = semantic_cache.lookup(query_vector, fingerprint_results(search_results), key, threshold=threshold)
+    return entry, cache_args, search_results
+
+def store_cached_answer(
+    cache_args,
+    raw_query_results: List[Dict[str, Any]],
+    answer: str,
+    search_results: List[Dict[str, Any]]
+) -> None:
+    """Store an answer, fingerprinted by the raw-query retrieval that lookups compare against."""
+    query_vector, key = cache_args
+    semantic_cache.store(query_vector, fingerprint_results(raw_query_results), key, answer=answer, search_results=search_results)
+
+def replay_sse(answer: str) -> List[str]:
+    """Split a cached answer into SSE text events, a few words at a time."""
+    words = re.findall(r"\S+\s*", answer)
+    return [
+        f"data: {json.dumps({'type': 'text', 'content': ''.join(words[i:i + 8])})}\n\n"
+        for i in range(0, len(words), 8)
+    ]
+
+def is_search_call(response: Any) -> bool:
+    return isinstance(response, dict) and response.get("type") == "function_call" and response.get("name") == "search_vector_store"
+
+def search_calls(response: Any) -> List[Dict[str, Any]]:
+    """All search_vector_store calls of one model turn."""
+    if not isinstance(response, dict):
+        return []
+    return [call for call in response.get("calls", [response]) if is_search_call(call)]
+
+def merge_search_results(result_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Union of several searches' hits, deduplicated by text, best score first."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for result in results:
+            if result["text"] not in merged or result["score"] > merged[result["text"]]["score"]:
+                merged[result["text"]] = result
+    return sorted(merged.values(), key=lambda r: r["score"], reverse=True)
+
+async def resolve_speculative_search(
+    speculative_search: "asyncio.Future",
+    raw_query: str,
+    search_query: str,
+    threshold: Optional[float]
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Return the speculative (raw query) results if the rewritten search query is
+    close enough to the raw one, otherwise cancel the speculation and return None.
+    """
+    if raw_query.strip() != search_query.strip():
+        raw_vector, search_vector = await embedding_batcher.embed_many(
+            [raw_query, search_query], model="text-embedding-3-large"
+        )
+        raw_vector = np.asarray(raw_vector, dtype=np.float32)
+        search_vector = np.asarray(search_vector, dtype=np.float32)
+        similarity = float(raw_vector @ search_vector / ((np.linalg.norm(raw_vector) * np.linalg.norm(search_vector)) or 1.0))
+        if similarity < (threshold or SPECULATIVE_RETRIEVAL_THRESHOLD):
+            logger.info(f"Discarding speculative retrieval (similarity={similarity:.4f})")
+            speculative_search.cancel()
+            return None
+        logger.info(f"Using speculative retrieval (similarity={similarity:.4f})")
+    try:
+        return await speculative_search
+    except Exception as e:
+        logger.warning(f"Speculative retrieval failed, searching again: {str(e)}")
+        return None
+
+async def save_assistant_message(conversation_id: str, content: str, search_results: List[Dict[str, Any]]):
+    assistant_message = Message(
+        role="assistant",
+        content=content,
+        timestamp=datetime.utcnow(),
+        citations=[Citation(citation=result["text"], file_reference="vector_search_result") 
+                  for result in search_results] if search_results and content else None
+    )
+    await db['conversations'].update_one(
+        {"_id": ObjectId(conversation_id)},
+        {"$push": {"messages": assistant_message.model_dump()}}
+    )
+    await db['conversations'].update_one(
+        {"_id": ObjectId(conversation_id)},
+        {"$set": {"lastUpdated": datetime.utcnow()}}
+    )
 
 @router.post("/ask-llm", response_model=LLMSearchResponse)
 async def llm_search(request: LLMSearchRequest):
@@ -73,7 +222,33 @@ async def llm_search(request: LLMSearchRequest):
             vector_config=request.vector_store
         )
         logger.info(f"Search results: {search_results}")
-        context = vector_search_service.prepare_context(search_results)
+
+        cache_args = None
+        if request.use_semantic_cache:
+            async def retrieved() -> List[Dict[str, Any]]:
+                return search_results
+
+            cached, cache_args, _ = await lookup_cached_answer(
+                "ask-llm", request.query, retrieved,
+                request.llm, request.vector_store, request.semantic_cache_threshold
+            )
+            if cached:
+                logger.info(f"[{request_id}] Serving answer from semantic cache")
+                return LLMSearchResponse(
+                    llm_response=cached["answer"],
+                    vector_search_results=[
+                        SearchResult(
+                            text=result["text"],
+                            score=result["score"],
+                            filename=result.get("filename", "unknown")
+                        )
+                        for result in search_results
+                    ],
+                    llm_provider=request.llm.provider,
+                    llm_model=request.llm.model
+                )
+
+        context = vector_search_service.prepare_context(search_results, model=request.llm.model)
         messages = [
             {"role": "system", "content": f"Context:\n{context}"},
             {"role": "user", "content": request.query}
@@ -87,6 +262,8 @@ async def llm_search(request: LLMSearchRequest):
         )
         response = await llm.generate_response(messages)
         llm_response = response if isinstance(response, str) else ""
+        if cache_args:
+            store_cached_answer(cache_args, search_results, llm_response, search_results)
         return LLMSearchResponse(
             llm_response=llm_response,
             vector_search_results=[
@@ -112,6 +289,11 @@ async def llm_search_with_conversation(
     # token: str = Depends(oauth2_scheme)
 ):
     request_id = f"req_{int(time.time())}_{request.query[:10].replace(' ', '_')}"
+    if request.retrieval_mode not in retrieval_router.strategies:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown retrieval_mode '{request.retrieval_mode}'. Available: {sorted(retrieval_router.strategies)}"
+        )
     try:
         # Step 1: Fetch conversation and up to 6 latest messages
         conversation = await db['conversations'].find_one({"_id": ObjectId(request.conversation_id)})
@@ -134,45 +316,205 @@ async def llm_search_with_conversation(
             {"$push": {"messages": query_message.model_dump()}}
         )
         
+        # Step 2b: Optionally serve a cached answer for a near-identical question
+        # asked at the same point of a conversation (same prior turns)
+        cache_args = None
+        cache_results = None
+        if request.use_semantic_cache:
+            async def raw_query_search() -> List[Dict[str, Any]]:
+                return await vector_search_service.perform_vector_search(
+                    query=request.query,
+                    vector_config=request.vector_store
+                )
+
+            cached, cache_args, cache_results = await lookup_cached_answer(
+                "ask-llm-conversation", request.query, raw_query_search,
+                request.llm, request.vector_store, request.semantic_cache_threshold,
+                history=[{"role": msg.role, "content": msg.content} for msg in messages]
+            )
+            if cached:
+                logger.info(f"[{request_id}] Serving answer from semantic cache")
+                cached_results = cached["search_results"]
+                if not request.stream:
+                    await save_assistant_message(request.conversation_id, cached["answer"], cached_results)
+                    return LLMSearchResponse(
+                        llm_response=cached["answer"],
+                        vector_search_results=[SearchResult(text=result["text"], score=result["score"], filename=result.get("filename", "unknown")) 
+                                              for result in cached_results],
+                        llm_provider=request.llm.provider,
+                        llm_model=request.llm.model
+                    )
+
+                async def stream_cached_response() -> AsyncGenerator[str, None]:
+                    for event in replay_sse(cached["answer"]):
+                        yield event
+                    await save_assistant_message(request.conversation_id, cached["answer"], cached_results)
+                return StreamingResponse(
+                    stream_cached_response(),
+                    media_type="text/event-stream",
+                    headers={"Content-Type": "text/event-stream; charset=utf-8"}
+                )
+
         # Step 3: Prepare messages list for first LLM call with search tool
         message_list = [{"role": msg.role, "content": msg.content} for msg in messages] + [
             {"role": "user", "content": request.query}
         ]
         
-        # Step 4: First LLM call with search tool
-        tools = OPENAI_SEARCH_TOOL if request.llm.provider == "openai" else ANTHROPIC_SEARCH_TOOL
-        llm = (OpenAILLM if request.llm.provider == "openai" else AnthropicLLM)(
-            model=request.llm.model,
-            stream=False,
-            temperature=request.llm.temperature,
-            max_tokens=request.llm.max_tokens,
-            tools=tools,
-            instructions=request.llm.system_message
-        )
-        initial_response = await llm.generate_response(message_list)
+        # Step 4: Decide whether to search; only the "llm" mode pays for a
+        # tool-decision call with the search tool
+        search_decision = retrieval_router.decide(request.retrieval_mode, request.query, message_list)
+
+        speculative_search = None
+        search_queries: List[str] = []
+        search_tasks: List[asyncio.Task] = []
+
+        async def search(query: str) -> List[Dict[str, Any]]:
+            nonlocal speculative_search
+            speculative_results = None
+            if speculative_search:
+                # Only one query of the turn can reuse the speculative raw-query retrieval
+                pending, speculative_search = speculative_search, None
+                speculative_results = await resolve_speculative_search(
+                    pending, request.query, query, request.speculative_similarity_threshold
+                )
+            elif cache_results is not None and query == request.query:
+                speculative_results = cache_results
+            if speculative_results is not None:
+                return speculative_results
+            return await vector_search_service.perform_vector_search(query=query, vector_config=request.vector_store)
+
+        def start_searches(queries: List[str]) -> List[asyncio.Task]:
+            # Searches run concurrently; their query embeddings are coalesced into
+            # one embeddings request by the embedding batcher
+            tasks = [asyncio.create_task(search(query)) for query in queries]
+            search_queries.extend(queries)
+            search_tasks.extend(tasks)
+            return tasks
+
+        def call_queries(calls: List[Dict[str, Any]]) -> List[str]:
+            queries = [json.loads(call["arguments"] or "{}").get("query") or request.query for call in calls]
+            for query in queries:
+                logger.info(f"[{request_id}] Search tool called with query: {query}")
+            return queries
+
+        def cancel_searches():
+            for task in search_tasks:
+                task.cancel()
+            if speculative_search:
+                speculative_search.cancel()
+
+        # Tool-decision stream that started answering directly (stream_tool_decision)
+        direct_stream = None
+        direct_text = ""
+        # Agent loop follow-up that answered instead of searching again
+        loop_answer = ""
+        if search_decision is None:
+            tools = OPENAI_SEARCH_TOOL if request.llm.provider == "openai" else ANTHROPIC_SEARCH_TOOL
+            llm_class = OpenAILLM if request.llm.provider == "openai" else AnthropicLLM
+            llm = llm_class(
+                model=request.llm.model,
+                stream=request.stream_tool_decision,
+                temperature=request.llm.temperature,
+                max_tokens=request.llm.max_tokens,
+                tools=tools,
+                instructions=request.llm.system_message
+            )
+            # Speculatively search with the raw query while the model decides; the
+            # semantic cache lookup above already retrieved it when enabled
+            if request.speculative_retrieval:
+                if cache_results is not None:
+                    speculative_search = asyncio.get_running_loop().create_future()
+                    speculative_search.set_result(cache_results)
+                else:
+                    speculative_search = asyncio.create_task(vector_search_service.perform_vector_search(
+                        query=request.query,
+                        vector_config=request.vector_store
+                    ))
+            try:
+                initial_response = await llm.generate_response(message_list)
+                if request.stream_tool_decision:
+                    # Act on streamed events: each completed tool call starts its search
+                    # immediately, leading text means the model is answering directly
+                    events = initial_response
+                    first_event = await anext(events, "")
+                    turn_calls = []
+                    if is_search_call(first_event):
+                        turn_calls.append(first_event)
+                        turn_tasks = start_searches(call_queries([first_event]))
+                        async for event in events:
+                            if is_search_call(event):
+                                turn_calls.append(event)
+                                turn_tasks += start_searches(call_queries([event]))
+                    elif first_event:
+                        direct_text = first_event["content"] if first_event["type"] == "text" else ""
+                        direct_stream = events
+                        if not request.stream:
+                            # Nothing to pass through; read on in case tool calls follow the text
+                            turn_tasks = []
+                            async for event in direct_stream:
+                                if is_search_call(event):
+                                    turn_calls.append(event)
+                                    turn_tasks += start_searches(call_queries([event]))
+                                elif event["type"] == "text" and not turn_calls:
+                                    direct_text += event["content"]
+                            direct_stream = None
+                else:
+                    turn_calls = search_calls(initial_response)
+                    turn_tasks = start_searches(call_queries(turn_calls))
+
+                # Agent loop: hand each turn's results back to the model while it keeps
+                # issuing searches, up to max_tool_iterations turns
+                tool_messages = []
+                iteration = 1
+                while turn_calls and iteration < request.max_tool_iterations:
+                    turn_results = await asyncio.gather(*turn_tasks)
+                    tool_messages += llm_class.tool_result_messages(turn_calls, [
+                        vector_search_service.prepare_context(results, model=request.llm.model)
+                        for results in turn_results
+                    ])
+                    follow_up_llm = llm_class(
+                        model=request.llm.model,
+                        stream=False,
+                        temperature=request.llm.temperature,
+                        max_tokens=request.llm.max_tokens,
+                        tools=tools,
+                        instructions=request.llm.system_message
+                    )
+                    follow_up = await follow_up_llm.generate_response(message_list + tool_messages)
+                    turn_calls = search_calls(follow_up)
+                    if not turn_calls and isinstance(follow_up, str):
+                        # Answered from the results it has: that is the final answer
+                        loop_answer = follow_up
+                    turn_tasks = start_searches(call_queries(turn_calls))
+                    iteration += 1
+            except Exception:
+                cancel_searches()
+                raise
+
+            if not search_tasks and speculative_search and direct_stream is None:
+                speculative_search.cancel()
+        elif search_decision:
+            logger.info(f"[{request_id}] Router chose to search with the user query")
+            start_searches([request.query])
         
-        # Step 5: Check if search tool was called
-        search_query = None
-        context = ""
+        # Step 5: Search if requested
         search_results = []
-        if isinstance(initial_response, dict) and initial_response.get("type") == "function_call" and initial_response["name"] == "search_vector_store":
-            search_query = json.loads(initial_response["arguments"])["query"]
-            logger.info(f"[{request_id}] Search tool called with query: {search_query}")
-            
+
+        async def retrieve() -> List[Dict[str, Any]]:
             # Explicitly log that we're searching both regular and PDF content
-            logger.info(f"[{request_id}] Searching both regular content and PDF files namespace")
-            
-            search_results = await vector_search_service.perform_vector_search(
-                query=search_query,
-                vector_config=request.vector_store
-            )
+            logger.info(f"[{request_id}] Searching both regular content and PDF files namespace for {search_queries}")
+            try:
+                search_results = merge_search_results(await asyncio.gather(*search_tasks))
+            except Exception:
+                cancel_searches()
+                raise
             
             # Log what we found
             logger.info(f"[{request_id}] Found {len(search_results)} results")
             for i, result in enumerate(search_results):
                 logger.info(f"[{request_id}] Result {i+1}: from {result.get('filename', 'unknown')} with score {result['score']}")
             
-            context = vector_search_service.prepare_context(search_results)
+            context = vector_search_service.prepare_context(search_results, model=request.llm.model)
             # Log the context that will be sent to the LLM
             logger.info(f"[{request_id}] Context length: {len(context)} characters")
             
@@ -183,14 +525,19 @@ async def llm_search_with_conversation(
                     "role": "user",
                     "content": f"The following information was retrieved from our knowledge base which includes course materials and uploaded PDF files:\n<KNOWLEDGE_BASE>\n{context}\n</KNOWLEDGE_BASE>\n\nBased on this information and your expertise knowledge, please answer user question: \n<QUESTION>\n{last_user_message['content']}\n</QUESTION>"
                 }
+            return search_results
+
+        if search_tasks:
+            search_results = await retrieve()
         
         # Step 6: Final LLM call with system_message in instructions/system
-        llm = (OpenAILLM if request.llm.provider == "openai" else AnthropicLLM)(
-            model=request.llm.model,
-            stream=request.stream,
-            temperature=request.llm.temperature,
-            max_tokens=request.llm.max_tokens,
-            instructions=f"""
+        async def final_response():
+            llm = (OpenAILLM if request.llm.provider == "openai" else AnthropicLLM)(
+                model=request.llm.model,
+                stream=request.stream,
+                temperature=request.llm.temperature,
+                max_tokens=request.llm.max_tokens,
+                instructions=f"""
             You are a helpful AI assistant of Metrum Cyroflex company that makes medical equipment. 
             You are a very helpful AI assistant for their medical equipment distributors. 
             You do not advise them to visit doctor, rather just educate them as they need to know about the use cases and the equipment. 
@@ -198,27 +545,41 @@ async def llm_search_with_conversation(
             Apply nice, clean and readable text formatting.
             
             """
+            )
+            return await llm.generate_response(message_list)
+
+        async def cache_answer(answer: str) -> None:
+            # Fingerprint with the raw-query retrieval: reuse this turn's when it ran
+            # one, otherwise retrieve it here (off the response path)
+            try:
+                raw_results = cache_results
+                if raw_results is None and request.query in search_queries:
+                    raw_results = await search_tasks[search_queries.index(request.query)]
+                if raw_results is None:
+                    raw_results = await vector_search_service.perform_vector_search(
+                        query=request.query,
+                        vector_config=request.vector_store
+                    )
+                store_cached_answer(cache_args, raw_results, answer, search_results)
+            except Exception as e:
+                logger.warning(f"[{request_id}] Could not cache answer: {str(e)}")
+
+        # A direct answer from the streamed tool-decision call is the final answer
+        answered_directly = bool(
+            search_decision is None and request.stream_tool_decision and not search_tasks
+            and (direct_stream is not None or direct_text)
         )
-        response = await llm.generate_response(message_list)
+        response = None if answered_directly or loop_answer else await final_response()
         
         # Step 7: Handle response and save it
         if not request.stream:
-            llm_content = response if isinstance(response, str) else ""
-            assistant_message = Message(
-                role="assistant",
-                content=llm_content,
-                timestamp=datetime.utcnow(),
-                citations=[Citation(citation=result["text"], file_reference="vector_search_result") 
-                          for result in search_results] if search_results and isinstance(response, str) else None
-            )
-            await db['conversations'].update_one(
-                {"_id": ObjectId(request.conversation_id)},
-                {"$push": {"messages": assistant_message.model_dump()}}
-            )
-            await db['conversations'].update_one(
-                {"_id": ObjectId(request.conversation_id)},
-                {"$set": {"lastUpdated": datetime.utcnow()}}
-            )
+            if answered_directly:
+                llm_content = direct_text
+            else:
+                llm_content = loop_answer or (response if isinstance(response, str) else "")
+            await save_assistant_message(request.conversation_id, llm_content, search_results)
+            if cache_args and llm_content:
+                run_in_background(cache_answer(llm_content))
             return LLMSearchResponse(
                 llm_response=llm_content,
                 vector_search_results=[SearchResult(text=result["text"], score=result["score"]) 
@@ -228,30 +589,47 @@ async def llm_search_with_conversation(
             )
         else:
             async def stream_response_with_retrieval() -> AsyncGenerator[str, None]:
-                if search_query:
-                    yield f"data: {json.dumps({'type': 'retrieving', 'content': f'Searching for: {search_query}'})}\n\n"
+                nonlocal search_results
                 full_content = ""
-                async for chunk in response:
-                    if chunk["type"] == "text":
-                        full_content += chunk["content"]
-                        yield f"data: {json.dumps({'type': 'text', 'content': chunk['content']})}\n\n"
-                    elif chunk["type"] == "function_call":
-                        yield f"data: {json.dumps({'type': 'function_call', 'name': chunk['name'], 'arguments': chunk['arguments']})}\n\n"
-                assistant_message = Message(
-                    role="assistant",
-                    content=full_content,
-                    timestamp=datetime.utcnow(),
-                    citations=[Citation(citation=result["text"], file_reference="vector_search_result") 
-                              for result in search_results] if search_results and full_content else None
-                )
-                await db['conversations'].update_one(
-                    {"_id": ObjectId(request.conversation_id)},
-                    {"$push": {"messages": assistant_message.model_dump()}}
-                )
-                await db['conversations'].update_one(
-                    {"_id": ObjectId(request.conversation_id)},
-                    {"$set": {"lastUpdated": datetime.utcnow()}}
-                )
+                response_stream = response
+                if answered_directly:
+                    # Pass the tool-decision text straight through; if the model calls
+                    # the search tool after some text, search and continue with the answer
+                    full_content = direct_text
+                    yield f"data: {json.dumps({'type': 'text', 'content': direct_text})}\n\n"
+                    response_stream = None
+                    late_calls = []
+                    async for event in direct_stream:
+                        if is_search_call(event):
+                            late_calls.append(event)
+                            start_searches(call_queries([event]))
+                        elif event["type"] == "text" and not late_calls:
+                            full_content += event["content"]
+                            yield f"data: {json.dumps({'type': 'text', 'content': event['content']})}\n\n"
+                    if late_calls:
+                        searching = ", ".join(search_queries)
+                        yield f"data: {json.dumps({'type': 'retrieving', 'content': f'Searching for: {searching}'})}\n\n"
+                        search_results = await retrieve()
+                        response_stream = await final_response()
+                    elif speculative_search:
+                        speculative_search.cancel()
+                elif search_queries:
+                    searching = ", ".join(search_queries)
+                    yield f"data: {json.dumps({'type': 'retrieving', 'content': f'Searching for: {searching}'})}\n\n"
+                    if loop_answer:
+                        full_content = loop_answer
+                        for event in replay_sse(loop_answer):
+                            yield event
+                if response_stream is not None:
+                    async for chunk in response_stream:
+                        if chunk["type"] == "text":
+                            full_content += chunk["content"]
+                            yield f"data: {json.dumps({'type': 'text', 'content': chunk['content']})}\n\n"
+                        elif chunk["type"] == "function_call":
+                            yield f"data: {json.dumps({'type': 'function_call', 'name': chunk['name'], 'arguments': chunk['arguments']})}\n\n"
+                await save_assistant_message(request.conversation_id, full_content, search_results)
+                if cache_args and full_content:
+                    run_in_background(cache_answer(full_content))
             return StreamingResponse(
                 stream_response_with_retrieval(),
                 media_type="text/event-stream",
@@ -1,34 +1,45 @@
 # backend/chatbot/routes/pdf_routes.py (update)
+import asyncio
+import json
 import os
 import shutil
 import traceback
 from fastapi import APIRouter, File, HTTPException, Query, UploadFile, Form, Depends
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 
 from chatbot.models.pdf_file import PDFFile
 from chatbot.database.database import db
-from chatbot.services.text_extract.pdf_extractor import PDFExtractor
-from chatbot.services.text_extract.text_splitter import text_splitter
-from chatbot.services.retrieval.vectorstores.pinecone.upsert import upsert_chunks as pinecone_upsert_chunks
+from chatbot.services.retrieval.active_files import active_pdf_registry
+from chatbot.services.semantic_cache import semantic_cache
+from chatbot.services.ingestion_queue import (
+    ingestion_queue, serialize_job, build_pdf_chunks, release_pdf_artifacts,
+    FINISHED, PDF_INDEX_NAME, PDF_NAMESPACE
+)
+from chatbot.services.retrieval.result_cache import bump_generation
+from chatbot.services.ingestion_artifacts import file_sha256
 from fastapi.security import OAuth2PasswordBearer
 from chatbot.middleware.jwt import verify_access_token
 
 router = APIRouter()
 PDF_STORAGE_PATH = os.getenv("PDF_STORAGE_PATH", "./uploaded_pdfs")
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", 1))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Ensure the PDF storage directory exists
 os.makedirs(PDF_STORAGE_PATH, exist_ok=True)
 
-@router.post("/pdf", response_model=List[PDFFile])
+@router.post("/pdf", status_code=202)
 async def upload_pdf(
     files: List[UploadFile] = File(...),
     token: str = Depends(oauth2_scheme)
 ):
-    """Upload multiple PDF files, process them for the RAG system, and store metadata."""
+    """
+    Upload multiple PDF files. Each file is stored and queued for ingestion
+    (extraction, chunking, embedding, upsert); track it with GET /pdf/jobs/{id}.
+    """
     try:
         user_id = verify_access_token(token)
     except Exception as e:
@@ -36,7 +47,7 @@ async def upload_pdf(
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
     MAX_SIZE = 25 * 1024 * 1024  # 25MB
-    processed_files = []
+    queued_jobs = []
     errors = []  # Track individual file errors
     
     print(f"PDF_STORAGE_PATH: {PDF_STORAGE_PATH}")
@@ -82,12 +93,21 @@ async def upload_pdf(
                 errors.append(error_msg)
                 continue  # Skip files with size checking errors
             
+            # The name identifies the stored file and the PDF's vectors, so
+            # a second upload under it would overwrite the first one's
+            if await db['pdf_files'].find_one({"name": file.filename}, {"_id": 1}):
+                error_msg = f"File {file.filename}: A PDF with this name already exists"
+                print(error_msg)
+                errors.append(error_msg)
+                continue
+            
             # Save file to disk
             file_path = os.path.join(PDF_STORAGE_PATH, file.filename)
             try:
                 print(f"Saving file to: {file_path}")
                 with open(file_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
+                    await asyncio.to_thread(shutil.copyfileobj, file.file, buffer)
+                sha256 = await asyncio.to_thread(file_sha256, file_path)
                 print(f"File saved successfully: {file_path}")
             except Exception as e:
                 error_msg = f"File {file.filename}: Save failed - {str(e)}"
@@ -95,77 +115,32 @@ async def upload_pdf(
                 errors.append(error_msg)
                 continue  # Skip files with saving errors
             
-            # Extract text from PDF
+            # Save file metadata to MongoDB; the ingestion job marks it vectorized
             try:
-                print(f"Extracting text from: {file.filename}")
-                extractor = PDFExtractor()
-                with open(file_path, "rb") as pdf_file:
-                    extracted_text = extractor.extract_text(pdf_file)
-                
-                print(f"Extracted text length: {len(extracted_text) if extracted_text else 0}")
-                
-                # Check if text extraction was successful
-                if not extracted_text or len(extracted_text.strip()) < 50:  # Minimal text threshold
-                    # Clean up the file as it's not usable
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                    error_msg = f"File {file.filename}: Insufficient text extracted ({len(extracted_text.strip()) if extracted_text else 0} chars)"
-                    print(error_msg)
-                    errors.append(error_msg)
-                    continue  # Skip files with insufficient text
-                
-                # Process for RAG (chunking and vectorization)
-                print(f"Creating chunks for: {file.filename}")
-                chunks = text_splitter(extracted_text)
-                
-                print(f"Created {len(chunks) if chunks else 0} chunks")
-                
-                if not chunks or len(chunks) == 0:
-                    # Clean up the file as it's not usable
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                    error_msg = f"File {file.filename}: No chunks created"
-                    print(error_msg)
-                    errors.append(error_msg)
-                    continue  # Skip files with no chunks
-                
-                # Prepare chunk tuples with filename
-                chunk_tuples = [(chunk, file.filename) for chunk in chunks]
-                
-                # Upsert to Pinecone
-                print(f"Upserting to Pinecone for: {file.filename}")
-                pinecone_upsert_chunks(
-                    chunks=chunk_tuples, 
-                    index_name="pdf-vectors",  # Use your existing index
-                    namespace="pdf_files"  
-                )
-                print(f"Pinecone upsert completed for: {file.filename}")
-                
-                # Save file metadata to MongoDB
-                print(f"Saving metadata to MongoDB for: {file.filename}")
                 pdf_file = PDFFile(
                     name=file.filename,
                     size=file_size,
                     date_added=datetime.utcnow(),
                     user_id=user_id,
-                    vectorized=True,
+                    vectorized=False,
                     path=file_path,
-                    active=True 
+                    active=True,
+                    sha256=sha256
                 )
-                
                 result = await db['pdf_files'].insert_one(pdf_file.dict(by_alias=True))
-                pdf_file.id = result.inserted_id
-                processed_files.append(pdf_file)
-                print(f"Successfully processed: {file.filename}")
-                
+                active_pdf_registry.add(file.filename)
+                job = await ingestion_queue.enqueue(
+                    result.inserted_id, file.filename, file_path, user_id=user_id, sha256=sha256
+                )
+                queued_jobs.append(serialize_job(job))
+                print(f"Queued for ingestion: {file.filename} (job {job['_id']})")
             except Exception as e:
-                # Clean up file if processing fails
                 if os.path.exists(file_path):
                     os.remove(file_path)
-                error_msg = f"File {file.filename}: Processing failed - {str(e)}"
+                error_msg = f"File {file.filename}: Queueing failed - {str(e)}"
                 print(error_msg)
                 errors.append(error_msg)
-                continue  # Skip files with processing errors
+                continue
                 
         except Exception as e:
             # General error handling for this file
@@ -174,19 +149,70 @@ async def upload_pdf(
             errors.append(error_msg)
             continue
     
-    print(f"Processing complete. Successful: {len(processed_files)}, Errors: {len(errors)}")
+    print(f"Upload complete. Queued: {len(queued_jobs)}, Errors: {len(errors)}")
     if errors:
         print("Errors encountered:")
         for error in errors:
             print(f"  - {error}")
     
-    if not processed_files:
+    if not queued_jobs:
         error_detail = "Nie udało się przetworzyć żadnego z przesłanych plików PDF."
         if errors:
             error_detail += f" Błędy: {'; '.join(errors[:3])}"  # Show first 3 errors
         raise HTTPException(status_code=400, detail=error_detail)
     
-    return processed_files
+    return {"jobs": queued_jobs, "errors": errors}
+
+@router.get("/pdf/jobs/{job_id}")
+async def get_ingestion_job(
+    job_id: str,
+    token: str = Depends(oauth2_scheme)
+):
+    """Status and progress of a PDF ingestion job."""
+    verify_access_token(token)
+    
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy identyfikator zadania")
+    
+    job = await ingestion_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Nie znaleziono zadania")
+    
+    return serialize_job(job)
+
+@router.get("/pdf/jobs/{job_id}/events")
+async def stream_ingestion_job(
+    job_id: str,
+    token: str = Depends(oauth2_scheme)
+):
+    """Server-sent events with the job state on every change, until it is done or failed."""
+    verify_access_token(token)
+    
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy identyfikator zadania")
+    if not await ingestion_queue.get(job_id):
+        raise HTTPException(status_code=404, detail="Nie znaleziono zadania")
+    
+    async def job_events():
+        last_state = None
+        while True:
+            job = await ingestion_queue.get(job_id)
+            if not job:
+                yield f"data: {json.dumps({'status': 'missing', 'id': job_id})}\n\n"
+                return
+            state = serialize_job(job)
+            if state != last_state:
+                yield f"data: {json.dumps(state)}\n\n"
+                last_state = state
+            if state["status"] in FINISHED:
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+    
+    return StreamingResponse(
+        job_events(),
+        media_type="text/event-stream",
+        headers={"Content-Type": "text/event-stream; charset=utf-8"}
+    )
 
 @router.get("/pdfs")
 async def list_pdfs(
@@ -289,6 +315,9 @@ async def rename_pdf(
     if not pdf_file:
         raise HTTPException(status_code=404, detail="Nie znaleziono pliku PDF")
     
+    if new_name != pdf_file["name"] and await db['pdf_files'].find_one({"name": new_name}, {"_id": 1}):
+        raise HTTPException(status_code=409, detail="Plik PDF o tej nazwie już istnieje")
+    
     # Update the name
     result = await db['pdf_files'].update_one(
         {"_id": ObjectId(pdf_id)},
@@ -298,6 +327,12 @@ async def rename_pdf(
     if result.modified_count == 0:
         raise HTTPException(status_code=500, detail="Nie udało się zaktualizować nazwy pliku PDF")
     
+    active_pdf_registry.remove(pdf_file["name"])
+    active_pdf_registry.add(new_name, pdf_file.get("active", True))
+    semantic_cache.invalidate_files([pdf_file["name"], new_name])
+    # Cached retrieval results were filtered with the old active filenames
+    bump_generation("pinecone", PDF_INDEX_NAME, PDF_NAMESPACE)
+    
     # Return the updated PDF file
     updated_pdf = await db['pdf_files'].find_one({"_id": ObjectId(pdf_id)})
     updated_pdf["_id"] = str(updated_pdf["_id"])
@@ -333,7 +368,8 @@ async def delete_pdf(
         from chatbot.services.retrieval.vectorstores.pinecone.upsert import delete_vectors_by_filename
         
         # Call the delete function
-        response = delete_vectors_by_filename(
+        response = await asyncio.to_thread(
+            delete_vectors_by_filename,
             filename=filename,
             index_name="pdf-vectors",  # Use your index name
             namespace="pdf_files"
@@ -358,6 +394,15 @@ async def delete_pdf(
     if result.deleted_count == 0:
         raise HTTPException(status_code=500, detail="Failed to delete PDF file from database")
     
+    active_pdf_registry.remove(filename)
+    semantic_cache.invalidate_files([filename])
+
+    # Stored text, chunks and embeddings are kept only while some PDF has this content
+    try:
+        await release_pdf_artifacts(pdf_file.get("sha256"))
+    except Exception as e:
+        print(f"Warning: Failed to delete ingestion artifacts: {str(e)}")
+    
     return {"message": "Plik PDF został pomyślnie usunięty"}
 
 @router.get("/pdf/{pdf_id}/download")
@@ -421,6 +466,9 @@ async def toggle_pdf_active(
     if result.modified_count == 0:
         raise HTTPException(status_code=500, detail="Nie udało się zaktualizować statusu aktywności pliku PDF")
     
+    active_pdf_registry.add(pdf_file["name"], active_status)
+    semantic_cache.invalidate_files([pdf_file["name"]])
+    
     # If setting to inactive, remove vectors from Pinecone
     if not active_status:
         try:
@@ -428,7 +476,8 @@ async def toggle_pdf_active(
             from chatbot.services.retrieval.vectorstores.pinecone.upsert import delete_vectors_by_filename
             
             # Call the delete function - same as used in delete PDF
-            delete_vectors_by_filename(
+            await asyncio.to_thread(
+                delete_vectors_by_filename,
                 filename=pdf_file["name"],
                 index_name="pdf-vectors",  # Use your index name
                 namespace="pdf_files"
@@ -438,28 +487,29 @@ async def toggle_pdf_active(
         except Exception as e:
             print(f"Warning: Failed to remove vectors for inactive file: {str(e)}")
     
-    # If setting to active, re-vectorize the file
+    # If setting to active, re-vectorize the file; stored artifacts make this a pure upsert
     if active_status and os.path.exists(pdf_file.get("path", "")):
         try:
-            # Re-vectorize the file
-            from chatbot.services.text_extract.pdf_extractor import PDFExtractor
-            from chatbot.services.text_extract.text_splitter import text_splitter
-            from chatbot.services.retrieval.vectorstores.pinecone.upsert import upsert_chunks
+            from chatbot.services.retrieval.vectorstores.pinecone.upsert import upsert_embedded_chunks
             
-            extractor = PDFExtractor()
-            with open(pdf_file["path"], "rb") as file:
-                extracted_text = extractor.extract_text(file)
+            sha256 = pdf_file.get("sha256")
+            if not sha256:
+                sha256 = await asyncio.to_thread(file_sha256, pdf_file["path"])
+                await db['pdf_files'].update_one({"_id": ObjectId(pdf_id)}, {"$set": {"sha256": sha256}})
             
-            chunks = text_splitter(extracted_text)
+            chunks, embeddings, token_counts, _ = await build_pdf_chunks(pdf_file["path"], sha256, pdf_file["name"])
             
             # Prepare chunk tuples with filename
             chunk_tuples = [(chunk, pdf_file["name"]) for chunk in chunks]
             
             # Upsert to Pinecone
-            upsert_chunks(
-                chunks=chunk_tuples, 
+            await asyncio.to_thread(
+                upsert_embedded_chunks,
+                chunks=chunk_tuples,
+                embeddings=embeddings,
                 index_name="pdf-vectors",  # Use your existing index
-                namespace="pdf_files"  
+                namespace="pdf_files",
+                token_counts=token_counts
             )
             
             print(f"Re-vectorized active file: {pdf_file['name']}")
@@ -483,11 +533,11 @@ async def test_pdf_vectors(
     # Test searching in pdf_files namespace
     try:
         from chatbot.services.retrieval.vectorstores.pinecone.query import PineconeQuery
-        from chatbot.services.openai_service import get_embeddings
-        import traceback
+        from chatbot.services.openai_service import EMBEDDING_MODEL, EMBEDDING_DIMENSION
+        from chatbot.services.embedding_batcher import embedding_batcher
         
         # Get embeddings for the query
-        query_embeddings = get_embeddings([query])
+        query_embeddings = [await embedding_batcher.embed(query, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSION)]
         
         # Define Pinecone query
         pinecone_query = PineconeQuery(
@@ -499,7 +549,7 @@ async def test_pdf_vectors(
         top_k = 10  # Get more results for testing
         
         # First, test the wrapper function
-        wrapper_results = pinecone_query.query(
+        wrapper_results = await pinecone_query.aquery(
             user_query=query,
             top_k=top_k
         )
@@ -561,11 +611,9 @@ async def list_pinecone_indexes(token: str = Depends(oauth2_scheme)):
     verify_access_token(token)
     
     try:
-        from pinecone import Pinecone
-        import os
+        from chatbot.services.retrieval.vectorstores.pinecone.client import pinecone_registry
         
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        indexes = pc.list_indexes()
+        indexes = pinecone_registry.client.list_indexes()
         
         # Convert the indexes to a simple list or dictionary
         # The exact structure depends on what pc.list_indexes() returns
@@ -590,11 +638,9 @@ async def pinecone_namespace_stats(token: str = Depends(oauth2_scheme)):
     verify_access_token(token)
     
     try:
-        from pinecone import Pinecone
-        import os
+        from chatbot.services.retrieval.vectorstores.pinecone.client import pinecone_registry
         
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        index = pc.Index("pdf-vectors")
+        index = pinecone_registry.get_index("pdf-vectors")
         
         # Get stats for the entire index
         stats = index.describe_index_stats()
@@ -1,9 +1,14 @@
 # chatbot/routes/querying_routes.py
+import asyncio
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from chatbot.services.retrieval.vectorstores.pinecone.query import PineconeQuery
 from chatbot.services.retrieval.vectorstores.weaviate.query import WeaviateQuery
+from chatbot.services.embedding_cache import embedding_cache
+from chatbot.services.embedding_batcher import embedding_batcher
+from chatbot.services.semantic_cache import semantic_cache
+from chatbot.services.retrieval.result_cache import retrieval_cache
 import os
 from dotenv import load_dotenv
 
@@ -47,7 +52,7 @@ async def query_pinecone_index(request: QueryRequest):
             index_name=request.index_name,
             namespace=request.namespace
         )
-        results = pinecone_query.query(
+        results = await pinecone_query.aquery(
             user_query=request.query,
             top_k=request.top_k
         )
@@ -66,10 +71,10 @@ async def query_pinecone_index(request: QueryRequest):
 
 @router.post("/weaviate-query", response_model=QueryResponse)
 async def query_weaviate_collection(request: WeaviateQueryRequest):
-    weaviate_query = None
     try:
         weaviate_query = WeaviateQuery(collection_name=request.collection_name)
-        results = weaviate_query.query(
+        results = await asyncio.to_thread(
+            weaviate_query.query,
             user_query=request.query,
             top_k=request.top_k
         )
@@ -85,21 +90,20 @@ async def query_weaviate_collection(request: WeaviateQueryRequest):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if weaviate_query:
-            weaviate_query.close()
 
 @router.post("/weaviate-hybrid-query", response_model=QueryResponse)
 async def hybrid_query_weaviate_collection(request: HybridQueryRequest):
-    weaviate_query = None
     try:
         weaviate_query = WeaviateQuery(collection_name=request.collection_name)
-        results = weaviate_query.hybrid_query(
+        query_vector = await embedding_batcher.embed(request.query, model="text-embedding-3-large")
+        results = await asyncio.to_thread(
+            weaviate_query.hybrid_query,
             user_query=request.query,
             top_k=request.top_k,
             alpha=request.alpha,
             fusion_type=request.fusion_type,
-            query_properties=request.query_properties
+            query_properties=request.query_properties,
+            query_vector=query_vector
         )
         return {
             "results": [
@@ -113,6 +117,15 @@ async def hybrid_query_weaviate_collection(request: HybridQueryRequest):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if weaviate_query:
-            weaviate_query.close()
\ No newline at end of file
+
+@router.get("/embedding-cache/stats")
+async def get_embedding_cache_stats():
+    return embedding_cache.stats()
+
+@router.get("/semantic-cache/stats")
+async def get_semantic_cache_stats():
+    return semantic_cache.stats()
+
+@router.get("/retrieval-cache/stats")
+async def get_retrieval_cache_stats():
+    return retrieval_cache.stats()
@@ -4,15 +4,24 @@ import os
 from chatbot.services.llm.openai import OpenAILLM
 from chatbot.services.retrieval.vectorstores.pinecone.upsert import upsert_chunks as pinecone_upsert_chunks
 from chatbot.services.retrieval.vectorstores.weaviate.upsert import upsert_chunks as weaviate_upsert_chunks
-from chatbot.services.text_extract.text_splitter import text_splitter
+from chatbot.services.retrieval.vectorstores.local.upsert import upsert_chunks as local_upsert_chunks
+from chatbot.services.text_extract.text_splitter import text_splitter, text_splitter_with_token_counts
+from chatbot.services.semantic_cache import semantic_cache
 from chatbot.services.text_extract.pdf_extractor import PDFExtractor
 from chatbot.services.text_extract.txt_extractor import TXTExtractor
+from chatbot.services.text_extract.extraction_pool import extraction_pool
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form
 from typing import Optional
 from io import BytesIO
 
 router = APIRouter()
 
+async def extract_upload_text(extractor, file_bytes: bytes) -> str:
+    """PDF extraction and OCR run in the extraction process pool; plain text is decoded inline."""
+    if isinstance(extractor, PDFExtractor):
+        return await extraction_pool.extract_pdf(file_bytes)
+    return extractor.extract_text(BytesIO(file_bytes))
+
 @router.post("/pinecone-upsert")
 async def upload_and_upsert_pinecone(
     file: UploadFile = File(...),
@@ -27,14 +36,55 @@ async def upload_and_upsert_pinecone(
         raise HTTPException(status_code=400, detail="Unsupported file type.")
 
     file_bytes = await file.read()
-    extracted_text = extractor.extract_text(BytesIO(file_bytes))
-    chunks = text_splitter(extracted_text)
+    extracted_text = await extract_upload_text(extractor, file_bytes)
+    chunks, token_counts = await asyncio.to_thread(text_splitter_with_token_counts, extracted_text)
+    
+    # Create list of (text, filename) tuples
+    chunk_tuples = [(chunk, file.filename) for chunk in chunks]
+
+    try:
+        await asyncio.to_thread(
+            pinecone_upsert_chunks,
+            chunks=chunk_tuples,
+            index_name=index_name,
+            namespace=namespace,
+            token_counts=token_counts
+        )
+        semantic_cache.invalidate_files([file.filename])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"status": "ok", "chunks_upserted": len(chunks)}
+
+@router.post("/local-upsert")
+async def upload_and_upsert_local(
+    file: UploadFile = File(...),
+    index_name: str = Form(...),
+    namespace: Optional[str] = Form("")
+):
+    if file.content_type == "application/pdf":
+        extractor = PDFExtractor()
+    elif file.content_type in ["text/plain", "text/markdown"]:
+        extractor = TXTExtractor()
+    else:
+        raise HTTPException(status_code=400, detail="Unsupported file type.")
+
+    file_bytes = await file.read()
+    extracted_text = await extract_upload_text(extractor, file_bytes)
+    chunks, token_counts = await asyncio.to_thread(text_splitter_with_token_counts, extracted_text)
     
     # Create list of (text, filename) tuples
     chunk_tuples = [(chunk, file.filename) for chunk in chunks]
 
     try:
-        pinecone_upsert_chunks(chunks=chunk_tuples, index_name=index_name, namespace=namespace)
+        await asyncio.to_thread(
+            local_upsert_chunks,
+            chunks=chunk_tuples,
+            index_name=index_name,
+            namespace=namespace,
+            token_counts=token_counts
+        )
+        semantic_cache.invalidate_files([file.filename])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -53,14 +103,15 @@ async def upload_and_upsert_weaviate(
         raise HTTPException(status_code=400, detail="Unsupported file type.")
 
     file_bytes = await file.read()
-    extracted_text = extractor.extract_text(BytesIO(file_bytes))
-    chunks = text_splitter(extracted_text)
+    extracted_text = await extract_upload_text(extractor, file_bytes)
+    chunks = await asyncio.to_thread(text_splitter, extracted_text)
     
     # Create list of (text, filename) tuples
     chunk_tuples = [(chunk, file.filename) for chunk in chunks]
 
     try:
-        weaviate_upsert_chunks(chunks=chunk_tuples, collection_name=collection_name)
+        await asyncio.to_thread(weaviate_upsert_chunks, chunks=chunk_tuples, collection_name=collection_name)
+        semantic_cache.invalidate_files([file.filename])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -80,8 +131,8 @@ async def upload_and_upsert_pinecone_with_mini_title(
         raise HTTPException(status_code=400, detail="Unsupported file type.")
 
     file_bytes = await file.read()
-    extracted_text = extractor.extract_text(BytesIO(file_bytes))
-    chunks = text_splitter(extracted_text)
+    extracted_text = await extract_upload_text(extractor, file_bytes)
+    chunks = await asyncio.to_thread(text_splitter, extracted_text)
 
     openai_llm = OpenAILLM(model="gpt-4o-mini")
 
@@ -105,7 +156,8 @@ async def upload_and_upsert_pinecone_with_mini_title(
     enriched_chunk_tuples = [(f"{desc}\n\n{chunk}", file.filename) for desc, chunk in zip(descriptions, chunks)]
 
     try:
-        pinecone_upsert_chunks(chunks=enriched_chunk_tuples, index_name=index_name, namespace=namespace)
+        await asyncio.to_thread(pinecone_upsert_chunks, chunks=enriched_chunk_tuples, index_name=index_name, namespace=namespace)
+        semantic_cache.invalidate_files([file.filename])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -128,8 +180,8 @@ async def upload_and_upsert_weaviate_with_mini_title(
         raise HTTPException(status_code=400, detail="Unsupported file type.")
 
     file_bytes = await file.read()
-    extracted_text = extractor.extract_text(BytesIO(file_bytes))
-    chunks = text_splitter(extracted_text)
+    extracted_text = await extract_upload_text(extractor, file_bytes)
+    chunks = await asyncio.to_thread(text_splitter, extracted_text)
 
     openai_llm = OpenAILLM(model="gpt-4o-mini")
 
@@ -153,7 +205,8 @@ async def upload_and_upsert_weaviate_with_mini_title(
     enriched_chunk_tuples = [(f"{desc}\n\n{chunk}", file.filename) for desc, chunk in zip(descriptions, chunks)]
 
     try:
-        weaviate_upsert_chunks(chunks=enriched_chunk_tuples, collection_name=collection_name)
+        await asyncio.to_thread(weaviate_upsert_chunks, chunks=enriched_chunk_tuples, collection_name=collection_name)
+        semantic_cache.invalidate_files([file.filename])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,122 @@
+# chatbot/services/embedding_batcher.py
+import os
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+import tiktoken
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+from chatbot.services.embedding_cache import embedding_cache, make_cache_key
+
+load_dotenv()
+
+logger = logging.getLogger("embedding_batcher")
+logger.setLevel(logging.INFO)
+
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 64))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 100000))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", 5))
+
+tokenizer = tiktoken.get_encoding("cl100k_base")
+
+
+class _PendingBatch:
+    def __init__(self):
+        self.texts: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.by_text: Dict[str, asyncio.Future] = {}
+        self.tokens = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingBatcher:
+    """
+    Non-blocking embedding service that coalesces concurrent requests.
+
+    Single texts that arrive within max_wait_ms of each other (for the same
+    model and dimensions) are sent as one embeddings call and the vectors are
+    fanned back out to the awaiting callers. A batch is flushed early once it
+    reaches max_batch_size texts or max_batch_tokens tokens. Cached texts are
+    answered from the shared embedding cache without waiting.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+        max_batch_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+        max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS,
+    ):
+        self.client = AsyncOpenAI()
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait_ms / 1000
+        self._pending: Dict[Tuple[str, Optional[int]], _PendingBatch] = {}
+        self._tasks = set()
+
+    async def embed(self, text: str, model: str = "text-embedding-3-large", dimensions: Optional[int] = None) -> List[float]:
+        cache_key = make_cache_key(text, model, dimensions)
+        cached = embedding_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        batch_key = (model, dimensions)
+
+        batch = self._pending.get(batch_key)
+        if batch is not None and text in batch.by_text:
+            return await asyncio.shield(batch.by_text[text])
+
+        tokens = len(tokenizer.encode(text, disallowed_special=()))
+        if batch is not None and batch.tokens + tokens > self.max_batch_tokens:
+            self._flush(batch_key)
+            batch = None
+        if batch is None:
+            batch = _PendingBatch()
+            batch.timer = loop.call_later(self.max_wait, self._flush, batch_key)
+            self._pending[batch_key] = batch
+
+        future = loop.create_future()
+        batch.texts.append(text)
+        batch.futures.append(future)
+        batch.by_text[text] = future
+        batch.tokens += tokens
+
+        if len(batch.texts) >= self.max_batch_size:
+            self._flush(batch_key)
+
+        vector = await asyncio.shield(future)
+        return embedding_cache.set(cache_key, vector)
+
+    async def embed_many(self, texts: List[str], model: str = "text-embedding-3-large", dimensions: Optional[int] = None) -> List[List[float]]:
+        return list(await asyncio.gather(*[self.embed(text, model, dimensions) for text in texts]))
+
+    def _flush(self, batch_key: Tuple[str, Optional[int]]) -> None:
+        batch = self._pending.pop(batch_key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._send(batch_key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch_key: Tuple[str, Optional[int]], batch: _PendingBatch) -> None:
+        model, dimensions = batch_key
+        params = {"input": batch.texts, "model": model}
+        if dimensions:
+            params["dimensions"] = dimensions
+        try:
+            logger.info(f"Embedding batch of {len(batch.texts)} texts ({batch.tokens} tokens) with {model}")
+            response = await self.client.embeddings.create(**params)
+            for future, result in zip(batch.futures, response.data):
+                if not future.done():
+                    future.set_result(result.embedding)
+        except Exception as e:
+            logger.error(f"Error embedding batch: {str(e)}")
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+
+
+embedding_batcher = EmbeddingBatcher()
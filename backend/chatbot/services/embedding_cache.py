@@ -0,0 +1,237 @@
+# chatbot/services/embedding_cache.py
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("embedding_cache")
+logger.setLevel(logging.INFO)
+
+# Memory budget of the in-process tier. Vectors are held as float32, so a
+# 3072-dim embedding takes 12 KiB and the default fits ~2700 of them.
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+# Leave unset to keep the cache in memory only. When set, every uvicorn worker
+# opens the same SQLite file so entries survive restarts and are shared.
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+# Row cap of the SQLite tier (a 3072-dim row is ~12 KiB, so ~1.2 GiB by default);
+# least recently used rows are pruned every EMBEDDING_CACHE_PRUNE_EVERY writes
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", 100_000))
+EMBEDDING_CACHE_PRUNE_EVERY = int(os.getenv("EMBEDDING_CACHE_PRUNE_EVERY", 1000))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share one cache entry."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_cache_key(text: str, model: str, dimensions: Optional[int] = None) -> str:
+    raw = f"{model}\x1f{dimensions or ''}\x1f{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model, dimensions, normalized text).
+
+    The first tier is an in-process LRU bounded by bytes. The optional second
+    tier is a SQLite file, so embeddings survive restarts and are shared
+    between workers, capped at max_rows by pruning the least recently used
+    rows. Both tiers store float32 buffers (a Python float list costs ~8x
+    more) and convert to lists on read; set() returns the same float32-rounded
+    vector, so callers see identical values whether or not it was cached.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+        path: Optional[str] = EMBEDDING_CACHE_PATH,
+        max_rows: int = EMBEDDING_CACHE_MAX_ROWS,
+        prune_every: int = EMBEDDING_CACHE_PRUNE_EVERY
+    ):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_rows = max_rows
+        self.prune_every = max(1, prune_every)
+        self._writes_since_prune = 0
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connection()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(embeddings)")]
+            if "last_used" not in columns:
+                # Files created before pruning existed; their rows count as least recently used
+                conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            self._prune()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            self._local.conn = conn
+        return conn
+
+    def _prune(self) -> None:
+        """Delete the least recently used rows beyond max_rows."""
+        try:
+            conn = self._connection()
+            deleted = conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,),
+            ).rowcount
+            conn.commit()
+            if deleted:
+                logger.info(f"Pruned {deleted} least recently used embeddings from {self.path}")
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache prune failed: {str(e)}")
+
+    def _remember(self, key: str, buffer: array) -> None:
+        size = buffer.itemsize * len(buffer)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous.itemsize * len(previous)
+            self._memory[key] = buffer
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.itemsize * len(evicted)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            buffer = self._memory.get(key)
+            if buffer is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+        if buffer is not None:
+            return buffer.tolist()
+
+        if self.path:
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache disk read failed: {str(e)}")
+                row = None
+            if row is not None:
+                buffer = array("f", row[0])
+                self._remember(key, buffer)
+                with self._lock:
+                    self.disk_hits += 1
+                return buffer.tolist()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, vector: List[float]) -> List[float]:
+        """Cache vector and return it rounded to float32, as get() would."""
+        buffer = array("f", vector)
+        self._remember(key, buffer)
+        if self.path:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    (key, buffer.tobytes(), time.time()),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache disk write failed: {str(e)}")
+            with self._lock:
+                self._writes_since_prune += 1
+                prune = self._writes_since_prune >= self.prune_every
+                if prune:
+                    self._writes_since_prune = 0
+            if prune:
+                self._prune()
+        return buffer.tolist()
+
+    def get_or_embed(
+        self,
+        texts: List[str],
+        model: str,
+        dimensions: Optional[int],
+        embed_fn: Callable[[List[str]], List[List[float]]],
+    ) -> List[List[float]]:
+        """
+        Return embeddings for texts, calling embed_fn once with only the texts
+        that are not cached yet (duplicates in the input are embedded once).
+        """
+        keys = [make_cache_key(text, model, dimensions) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        for i, key in enumerate(keys):
+            if key in missing:
+                missing[key].append(i)
+                continue
+            vector = self.get(key)
+            if vector is None:
+                missing[key] = [i]
+            else:
+                results[i] = vector
+
+        if missing:
+            positions = list(missing.values())
+            vectors = embed_fn([texts[p[0]] for p in positions])
+            for key, indices, vector in zip(missing.keys(), positions, vectors):
+                vector = self.set(key, vector)
+                for i in indices:
+                    results[i] = vector
+
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.path),
+                "disk_max_rows": self.max_rows if self.path else None,
+            }
+
+
+embedding_cache = EmbeddingCache()
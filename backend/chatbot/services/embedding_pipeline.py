@@ -0,0 +1,258 @@
+# chatbot/services/embedding_pipeline.py
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+import tiktoken
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from dotenv import load_dotenv
+
+from chatbot.services.openai_service import client
+from chatbot.services.embedding_cache import embedding_cache, make_cache_key
+
+load_dotenv()
+
+logger = logging.getLogger("embedding_pipeline")
+logger.setLevel(logging.INFO)
+
+# The embeddings endpoint accepts at most 2048 inputs and 300k tokens per request
+EMBEDDING_PIPELINE_BATCH_SIZE = int(os.getenv("EMBEDDING_PIPELINE_BATCH_SIZE", 256))
+EMBEDDING_PIPELINE_BATCH_TOKENS = int(os.getenv("EMBEDDING_PIPELINE_BATCH_TOKENS", 100000))
+EMBEDDING_PIPELINE_CONCURRENCY = int(os.getenv("EMBEDDING_PIPELINE_CONCURRENCY", 4))
+# Tokens per minute for this process (0 disables the limiter). Each uvicorn worker
+# has its own limiter, so set this to the account limit divided by the workers.
+EMBEDDING_TPM_LIMIT = int(os.getenv("EMBEDDING_TPM_LIMIT", 1000000))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 6))
+EMBEDDING_RETRY_BASE_SECONDS = float(os.getenv("EMBEDDING_RETRY_BASE_SECONDS", 1))
+EMBEDDING_RETRY_MAX_SECONDS = 60.0
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+tokenizer = tiktoken.get_encoding("cl100k_base")
+
+# on_batch(positions, vectors): positions index into the texts passed to embed()
+BatchCallback = Callable[[List[int], List[List[float]]], None]
+
+
+class EmbeddingCancelled(Exception):
+    """The consumer of a streamed embedding run went away."""
+
+
+class TokenRateLimiter:
+    """Thread-safe token bucket refilled continuously at tokens_per_minute."""
+
+    def __init__(self, tokens_per_minute: int = EMBEDDING_TPM_LIMIT):
+        self.capacity = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        if self.capacity <= 0:
+            return
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait = (tokens - self.available) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingPipeline:
+    """
+    Embedding stage for ingestion.
+
+    Texts are grouped into batches bounded by both input count and tokens,
+    sent concurrently by a small thread pool under a shared tokens-per-minute
+    limiter, and retried with exponential backoff on rate limits, timeouts and
+    server errors. Finished batches are handed to on_batch as they complete,
+    so callers can upsert them while later batches are still being embedded.
+
+    The query embedding cache is bypassed by default: one document's chunks
+    would evict every cached query. Ingestion reuse comes from the stored
+    artifacts and the chunk ID diff instead.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = EMBEDDING_PIPELINE_BATCH_SIZE,
+        max_batch_tokens: int = EMBEDDING_PIPELINE_BATCH_TOKENS,
+        concurrency: int = EMBEDDING_PIPELINE_CONCURRENCY,
+        rate_limiter: Optional[TokenRateLimiter] = None,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter or TokenRateLimiter()
+        self.max_retries = max_retries
+        # Retries are handled here, with the limiter in the loop
+        self.client = client.with_options(max_retries=0)
+
+    def _make_batches(self, texts: List[str], max_batch_size: int) -> List[Tuple[List[int], int]]:
+        """Split texts into (indices, tokens) batches under the size and token limits."""
+        counts = [len(tokens) for tokens in tokenizer.encode_batch(texts, disallowed_special=())]
+        batches: List[Tuple[List[int], int]] = []
+        indices: List[int] = []
+        batch_tokens = 0
+        for i, count in enumerate(counts):
+            if indices and (len(indices) >= max_batch_size or batch_tokens + count > self.max_batch_tokens):
+                batches.append((indices, batch_tokens))
+                indices, batch_tokens = [], 0
+            indices.append(i)
+            batch_tokens += count
+        if indices:
+            batches.append((indices, batch_tokens))
+        return batches
+
+    def _embed_batch(
+        self,
+        texts: List[str],
+        tokens: int,
+        model: str,
+        dimensions: Optional[int],
+        cancelled: Optional[threading.Event]
+    ) -> List[List[float]]:
+        params = {"input": texts, "model": model}
+        if dimensions:
+            params["dimensions"] = dimensions
+
+        for attempt in range(self.max_retries + 1):
+            if cancelled is not None and cancelled.is_set():
+                raise EmbeddingCancelled()
+            self.rate_limiter.acquire(tokens)
+            try:
+                response = self.client.embeddings.create(**params)
+                return [result.embedding for result in response.data]
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(EMBEDDING_RETRY_MAX_SECONDS, EMBEDDING_RETRY_BASE_SECONDS * 2 ** attempt)
+                retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                delay *= 1 + random.random() * 0.25
+                logger.warning(
+                    f"Embedding batch of {len(texts)} texts failed ({type(e).__name__}); "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+    def embed(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-3-large",
+        dimensions: Optional[int] = None,
+        on_batch: Optional[BatchCallback] = None,
+        max_batch_size: Optional[int] = None,
+        cancelled: Optional[threading.Event] = None,
+        use_cache: bool = False
+    ) -> List[List[float]]:
+        """
+        Embed texts, returning one vector per text in order; repeated texts
+        are embedded once. on_batch is called from this thread, once for the
+        cached texts (with use_cache) and then once per embedded batch in
+        completion order.
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        keys = [make_cache_key(text, model, dimensions) for text in texts]
+        missing: Dict[str, List[int]] = {}
+        cached_positions = []
+        for i, key in enumerate(keys):
+            if key in missing:
+                missing[key].append(i)
+                continue
+            vector = embedding_cache.get(key) if use_cache else None
+            if vector is None:
+                missing[key] = [i]
+            else:
+                results[i] = vector
+                cached_positions.append(i)
+
+        if on_batch and cached_positions:
+            on_batch(cached_positions, [results[i] for i in cached_positions])
+        if not missing:
+            return results
+
+        unique_keys = list(missing)
+        unique_texts = [texts[missing[key][0]] for key in unique_keys]
+        batches = self._make_batches(unique_texts, max_batch_size or self.max_batch_size)
+        total_tokens = sum(tokens for _, tokens in batches)
+        started = time.monotonic()
+
+        executor = ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches)))
+        try:
+            futures = {
+                executor.submit(
+                    self._embed_batch, [unique_texts[i] for i in indices], tokens, model, dimensions, cancelled
+                ): indices
+                for indices, tokens in batches
+            }
+            for future in as_completed(futures):
+                vectors = future.result()
+                positions = []
+                for i, vector in zip(futures[future], vectors):
+                    key = unique_keys[i]
+                    if use_cache:
+                        vector = embedding_cache.set(key, vector)
+                    for position in missing[key]:
+                        results[position] = vector
+                        positions.append(position)
+                if on_batch:
+                    on_batch(positions, [results[p] for p in positions])
+        finally:
+            # On failure, batches that have not started are dropped
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Embedded {len(unique_texts)} texts ({total_tokens} tokens) in {len(batches)} batches "
+            f"in {elapsed:.1f}s ({total_tokens / max(elapsed, 1e-6):.0f} tokens/s)"
+        )
+        return results
+
+    async def stream(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-3-large",
+        dimensions: Optional[int] = None
+    ) -> AsyncIterator[Tuple[List[int], List[List[float]]]]:
+        """Async view of embed(): yields (positions, vectors) as batches finish."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def on_batch(positions: List[int], vectors: List[List[float]]) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, (positions, vectors))
+
+        def finished(task: asyncio.Future) -> None:
+            # Scheduled after every on_batch put, so the sentinel always comes last
+            queue.put_nowait(None)
+            if not task.cancelled():
+                task.exception()  # Re-raised by the await below unless the consumer left early
+
+        task = asyncio.ensure_future(asyncio.to_thread(self.embed, texts, model, dimensions, on_batch, None, cancelled))
+        task.add_done_callback(finished)
+        try:
+            while (item := await queue.get()) is not None:
+                yield item
+            await task
+        finally:
+            if not task.done():
+                cancelled.set()
+
+
+embedding_pipeline = EmbeddingPipeline()
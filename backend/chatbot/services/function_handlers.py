@@ -5,12 +5,9 @@ import logging
 import httpx
 import os
 from chatbot.database.database import db
-from pinecone import Pinecone
-from openai import OpenAI
+from chatbot.services.openai_service import embed_texts
+from chatbot.services.retrieval.vectorstores.pinecone.client import pinecone_registry
 
-openai = OpenAI()
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index("pdf-vectors")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -115,14 +112,10 @@ class FunctionHandler:
                 logger.info(f"Processing dish: {dish_name}")
                 
                 try:
-                    response = openai.embeddings.create(
-                        input=dish_name,
-                        model="text-embedding-3-large"
-                    )
-                    query_embedding = response.data[0].embedding
+                    query_embedding = embed_texts([dish_name], model="text-embedding-3-large")[0]
 
                     # Query Pinecone using the embedding
-                    search_response = index.query(
+                    search_response = pinecone_registry.get_index("pdf-vectors").query(
                         namespace="ns1",
                         vector=query_embedding,
                         top_k=1,
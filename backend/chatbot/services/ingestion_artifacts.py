@@ -0,0 +1,134 @@
+# chatbot/services/ingestion_artifacts.py
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("ingestion_artifacts")
+logger.setLevel(logging.INFO)
+
+INGESTION_ARTIFACT_PATH = os.getenv("INGESTION_ARTIFACT_PATH", "./ingestion_artifacts")
+# float16 halves the footprint; cosine scores of text-embedding-3 vectors are unaffected in practice
+INGESTION_ARTIFACT_DTYPE = os.getenv("INGESTION_ARTIFACT_DTYPE", "float16")
+
+TEXT_FILE = "text.txt"
+CHUNKS_FILE = "chunks.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionArtifactStore:
+    """
+    Content-addressed store of what ingesting a PDF produces, keyed by the
+    SHA-256 of the file's bytes:
+
+        <root>/<sha[:2]>/<sha>/text.txt         extracted text
+        <root>/<sha[:2]>/<sha>/chunks.json      chunk texts, token counts and embedding model
+        <root>/<sha[:2]>/<sha>/embeddings.npy   one row per chunk
+
+    Reactivating or re-uploading an identical file then needs neither
+    extraction (including OCR) nor embedding calls, only the vector upsert.
+    Files are written under a temporary name and renamed into place, so
+    uvicorn workers sharing the directory never read a partial artifact.
+    """
+
+    def __init__(self, path: str = INGESTION_ARTIFACT_PATH, dtype: str = INGESTION_ARTIFACT_DTYPE):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+
+    def _dir(self, sha256: str) -> str:
+        return os.path.join(self.path, sha256[:2], sha256)
+
+    def _write(self, sha256: str, name: str, write) -> None:
+        directory = self._dir(sha256)
+        os.makedirs(directory, exist_ok=True)
+        final_path = os.path.join(directory, name)
+        tmp_path = f"{final_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                write(f)
+            os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load_text(self, sha256: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self._dir(sha256), TEXT_FILE), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save_text(self, sha256: str, text: str) -> None:
+        self._write(sha256, TEXT_FILE, lambda f: f.write(text.encode("utf-8")))
+
+    def load_chunks(self, sha256: str, model: str) -> Optional[Tuple[List[str], np.ndarray, Optional[List[int]]]]:
+        """
+        Chunks, their float32 embeddings and token counts (None if not
+        recorded), or None if missing or embedded with another model.
+        """
+        directory = self._dir(sha256)
+        try:
+            with open(os.path.join(directory, CHUNKS_FILE), encoding="utf-8") as f:
+                record = json.load(f)
+            embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable ingestion artifacts for {sha256}: {str(e)}")
+            return None
+
+        if record.get("model") != model or len(record["chunks"]) != len(embeddings):
+            return None
+        return record["chunks"], embeddings.astype(np.float32), record.get("token_counts")
+
+    def save_chunks(
+        self,
+        sha256: str,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        model: str,
+        token_counts: Optional[List[int]] = None
+    ) -> None:
+        matrix = np.asarray(embeddings, dtype=self.dtype)
+        # Embeddings first: chunks.json is what marks the artifact complete
+        self._write(sha256, EMBEDDINGS_FILE, lambda f: np.save(f, matrix))
+        record = {
+            "model": model,
+            "dimensions": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "chunks": chunks,
+            "token_counts": token_counts,
+        }
+        self._write(sha256, CHUNKS_FILE, lambda f: f.write(json.dumps(record, ensure_ascii=False).encode("utf-8")))
+        logger.info(f"Stored {len(chunks)} chunk embeddings for {sha256} ({matrix.nbytes / 1024:.0f} KiB)")
+
+    def delete(self, sha256: str) -> bool:
+        """Remove everything stored for sha256; returns whether anything was there."""
+        directory = self._dir(sha256)
+        if not os.path.isdir(directory):
+            return False
+        shutil.rmtree(directory, ignore_errors=True)
+        try:
+            os.rmdir(os.path.dirname(directory))  # Only succeeds once the prefix directory is empty
+        except OSError:
+            pass
+        logger.info(f"Deleted ingestion artifacts for {sha256}")
+        return True
+
+
+ingestion_artifacts = IngestionArtifactStore()
@@ -0,0 +1,406 @@
+# chatbot/services/ingestion_queue.py
+import os
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from chatbot.database.database import db
+from chatbot.services.embedding_pipeline import embedding_pipeline
+from chatbot.services.ingestion_artifacts import ingestion_artifacts, file_sha256
+from chatbot.services.text_extract.extraction_pool import extraction_pool
+from chatbot.services.text_extract.text_splitter import text_splitter_with_token_counts
+from chatbot.services.retrieval.vectorstores.pinecone.upsert import (
+    upsert_embedded_chunks, write_chunk_vectors, fetch_stored_embeddings, delete_vectors_by_ids
+)
+from chatbot.services.retrieval.vectorstores.chunk_ids import chunk_id
+from chatbot.services.retrieval.active_files import active_pdf_registry
+from chatbot.services.semantic_cache import semantic_cache
+
+load_dotenv()
+
+logger = logging.getLogger("ingestion_queue")
+logger.setLevel(logging.INFO)
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 2))
+INGESTION_POLL_SECONDS = float(os.getenv("INGESTION_POLL_SECONDS", 2))
+# A job whose lease is not renewed in time (worker crashed or restarted) is resumed by another worker
+INGESTION_LEASE_SECONDS = float(os.getenv("INGESTION_LEASE_SECONDS", 120))
+INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", 3))
+PDF_INDEX_NAME = "pdf-vectors"
+PDF_NAMESPACE = "pdf_files"
+PDF_EMBEDDING_MODEL = "text-embedding-3-large"
+# Minimum extracted characters for a PDF to be worth indexing
+MIN_TEXT_LENGTH = 50
+
+QUEUED = "queued"
+EXTRACTING = "extracting"
+EMBEDDING = "embedding"
+UPSERTING = "upserting"
+DONE = "done"
+FAILED = "failed"
+IN_PROGRESS = [EXTRACTING, EMBEDDING, UPSERTING]
+FINISHED = [DONE, FAILED]
+
+jobs_collection = db['ingestion_jobs']
+
+
+class IngestionError(Exception):
+    """A PDF that cannot be ingested; the job fails without being retried."""
+
+
+async def build_pdf_chunks(
+    path: str,
+    sha256: str,
+    filename: str,
+    on_progress: Optional[Callable[..., Awaitable[None]]] = None,
+    on_batch: Optional[Callable[[List[str], List[List[float]], List[int]], Awaitable[None]]] = None
+) -> Tuple[List[str], List[List[float]], Optional[List[int]], Optional[Set[str]]]:
+    """
+    Chunks, embeddings and chunk token counts of the PDF at path, plus the
+    chunk IDs stored for the file before any batch was written (None when the
+    index was not listed). Artifacts stored for its
+    content hash are reused, so an identical file is extracted and embedded
+    only once; whatever has to be computed is stored for next time. When the
+    file's text changed, chunks already in the index are not re-embedded:
+    their vectors are fetched from Pinecone by their deterministic IDs.
+    on_progress(status, progress) is awaited as stages start and advance, and
+    on_batch(chunk_texts, vectors, token_counts) as each embedding batch finishes, so the
+    caller can upsert while the remaining chunks are still being embedded.
+    """
+    async def report(status: Optional[str], progress: Dict[str, Any]) -> None:
+        if on_progress:
+            await on_progress(status, progress)
+
+    stored = await asyncio.to_thread(ingestion_artifacts.load_chunks, sha256, PDF_EMBEDDING_MODEL)
+    if stored is not None:
+        chunks, embeddings, token_counts = stored
+        logger.info(f"Reusing {len(chunks)} stored chunk embeddings for {sha256}")
+        await report(None, {"chunks_total": len(chunks), "chunks_embedded": len(chunks), "reused": True})
+        return chunks, embeddings.tolist(), token_counts, None
+
+    await report(EXTRACTING, {})
+    extracted_text = await asyncio.to_thread(ingestion_artifacts.load_text, sha256)
+    if extracted_text is None:
+        extracted_text = await extraction_pool.extract_pdf(path)
+        if not extracted_text or len(extracted_text.strip()) < MIN_TEXT_LENGTH:
+            raise IngestionError(
+                f"Insufficient text extracted ({len(extracted_text.strip()) if extracted_text else 0} chars)"
+            )
+        await asyncio.to_thread(ingestion_artifacts.save_text, sha256, extracted_text)
+
+    chunks, token_counts = await asyncio.to_thread(text_splitter_with_token_counts, extracted_text)
+    if not chunks:
+        raise IngestionError("No chunks created")
+
+    stored, stored_ids = await asyncio.to_thread(
+        fetch_stored_embeddings, [(chunk, filename) for chunk in chunks], PDF_INDEX_NAME, PDF_NAMESPACE
+    )
+    missing = [i for i in range(len(chunks)) if i not in stored]
+    progress = {"chunks_total": len(chunks), "chunks_embedded": len(stored), "chunks_reused": len(stored)}
+    await report(EMBEDDING, progress)
+    embeddings = [stored.get(i) for i in range(len(chunks))]
+    if missing:
+        async for batch_positions, vectors in embedding_pipeline.stream(
+            [chunks[i] for i in missing], model=PDF_EMBEDDING_MODEL
+        ):
+            positions = [missing[i] for i in batch_positions]
+            for i, vector in zip(positions, vectors):
+                embeddings[i] = vector
+            if on_batch:
+                await on_batch([chunks[i] for i in positions], vectors, [token_counts[i] for i in positions])
+            progress = {**progress, "chunks_embedded": progress["chunks_embedded"] + len(positions)}
+            await report(None, progress)
+
+    await asyncio.to_thread(
+        ingestion_artifacts.save_chunks, sha256, chunks, embeddings, PDF_EMBEDDING_MODEL, token_counts
+    )
+    return chunks, embeddings, token_counts, stored_ids[filename]
+
+
+async def release_pdf_artifacts(sha256: Optional[str]) -> None:
+    """Delete the stored artifacts of a removed PDF unless another PDF record has the same content."""
+    if not sha256:
+        return
+    if await db['pdf_files'].count_documents({"sha256": sha256}, limit=1):
+        return
+    await asyncio.to_thread(ingestion_artifacts.delete, sha256)
+
+
+def serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public, JSON-serializable view of a job record."""
+    return {
+        "id": str(job["_id"]),
+        "pdf_id": str(job["pdf_id"]) if job.get("pdf_id") else None,
+        "filename": job["filename"],
+        "status": job["status"],
+        "progress": job.get("progress", {}),
+        "error": job.get("error"),
+        "attempts": job.get("attempts", 0),
+        "created_at": job["created_at"].isoformat() if job.get("created_at") else None,
+        "finished_at": job["finished_at"].isoformat() if job.get("finished_at") else None,
+    }
+
+
+class IngestionQueue:
+    """
+    Mongo-backed queue of PDF ingestion jobs.
+
+    Every uvicorn worker runs INGESTION_WORKERS consumer tasks that claim jobs
+    with an atomic find_one_and_update and hold them under a lease renewed by
+    a heartbeat. Jobs left in an in-progress state by a crashed or restarted
+    worker are reclaimed once their lease expires and resumed from extraction;
+    vectors a previous attempt already wrote keep their IDs and are skipped.
+    """
+
+    def __init__(self, workers: int = INGESTION_WORKERS):
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._running_jobs: set = set()
+
+    async def enqueue(
+        self,
+        pdf_id: ObjectId,
+        filename: str,
+        path: str,
+        user_id: Optional[str] = None,
+        sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        job = {
+            "pdf_id": pdf_id,
+            "filename": filename,
+            "path": path,
+            "sha256": sha256,
+            "user_id": user_id,
+            "status": QUEUED,
+            "progress": {},
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+            "worker_id": None,
+            "lease_expires_at": None,
+        }
+        result = await jobs_collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        self._wakeup.set()
+        logger.info(f"Queued ingestion job {result.inserted_id} for '{filename}'")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        await jobs_collection.create_index([("status", 1), ("created_at", 1)])
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} ingestion workers ({self.worker_id})")
+
+    async def stop(self) -> None:
+        interrupted = list(self._running_jobs)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Hand interrupted jobs over to the next worker straight away
+        if interrupted:
+            await jobs_collection.update_many(
+                {"_id": {"$in": interrupted}, "worker_id": self.worker_id},
+                {"$set": {"lease_expires_at": datetime.utcnow()}}
+            )
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await jobs_collection.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED},
+                {"status": {"$in": IN_PROGRESS}, "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "worker_id": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=INGESTION_LEASE_SECONDS),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion worker {number} failed to claim a job: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=INGESTION_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._running_jobs.add(job["_id"])
+            heartbeat = asyncio.create_task(self._heartbeat(job["_id"]))
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # E.g. Mongo unavailable while recording a failure; the lease
+                # expires and another attempt picks the job up again
+                logger.error(f"Ingestion worker {number} failed on job {job['_id']}: {str(e)}")
+            finally:
+                heartbeat.cancel()
+                self._running_jobs.discard(job["_id"])
+
+    async def _heartbeat(self, job_id: ObjectId) -> None:
+        while True:
+            await asyncio.sleep(INGESTION_LEASE_SECONDS / 3)
+            try:
+                await jobs_collection.update_one(
+                    {"_id": job_id, "worker_id": self.worker_id},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=INGESTION_LEASE_SECONDS)}}
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep renewing: the lease outlives a few missed beats
+                logger.warning(f"Failed to renew lease of ingestion job {job_id}: {str(e)}")
+
+    async def _update(self, job: Dict[str, Any], **fields) -> None:
+        fields["updated_at"] = datetime.utcnow()
+        if fields.get("status") in FINISHED:
+            fields["finished_at"] = fields["updated_at"]
+            fields["lease_expires_at"] = None
+        job.update(fields)
+        await jobs_collection.update_one({"_id": job["_id"], "worker_id": self.worker_id}, {"$set": fields})
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        if job["attempts"] > INGESTION_MAX_ATTEMPTS:
+            await self._update(job, status=FAILED, error=f"Gave up after {INGESTION_MAX_ATTEMPTS} interrupted attempts")
+            await self._discard_pdf(job)
+            return
+        if job["attempts"] > 1:
+            logger.info(f"Resuming interrupted ingestion job {job['_id']} ('{job['filename']}', attempt {job['attempts']})")
+
+        try:
+            await self._process(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            message = str(e) if isinstance(e, IngestionError) else f"Processing failed - {str(e)}"
+            logger.error(f"Ingestion job {job['_id']} for '{job['filename']}' failed: {message}")
+            await self._update(job, status=FAILED, error=message)
+            await self._discard_pdf(job)
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        filename = job["filename"]
+        sha256 = job.get("sha256") or await asyncio.to_thread(file_sha256, job["path"])
+
+        async def on_progress(status: Optional[str], progress: Dict[str, Any]) -> None:
+            fields = {"progress": progress}
+            if status:
+                fields["status"] = status
+            await self._update(job, **fields)
+
+        streamed_ids: Set[str] = set()
+
+        async def on_batch(batch_chunks: List[str], vectors: List[List[float]], token_counts: List[int]) -> None:
+            batch_ids = [chunk_id(filename, chunk) for chunk in batch_chunks]
+            await self._record_vector_ids(job, batch_ids)
+            await asyncio.to_thread(
+                write_chunk_vectors,
+                [(chunk, filename) for chunk in batch_chunks],
+                vectors,
+                index_name=PDF_INDEX_NAME,
+                namespace=PDF_NAMESPACE,
+                token_counts=token_counts
+            )
+            streamed_ids.update(batch_ids)
+
+        chunks, embeddings, token_counts, stored_ids = await build_pdf_chunks(
+            job["path"], sha256, filename, on_progress, on_batch
+        )
+        progress = job["progress"]
+
+        # Chunk IDs are deterministic: batches streamed in above, and vectors an
+        # interrupted attempt already wrote, are skipped; stale ones are deleted.
+        # The stored IDs are known, so the index is not listed again.
+        await self._update(job, status=UPSERTING)
+        known_ids = stored_ids | streamed_ids if stored_ids is not None else set()
+        await self._record_vector_ids(job, [
+            cid for cid in dict.fromkeys(chunk_id(filename, chunk) for chunk in chunks) if cid not in known_ids
+        ])
+        await asyncio.to_thread(
+            upsert_embedded_chunks,
+            [(chunk, filename) for chunk in chunks],
+            embeddings,
+            index_name=PDF_INDEX_NAME,
+            namespace=PDF_NAMESPACE,
+            token_counts=token_counts,
+            existing_ids={filename: known_ids} if stored_ids is not None else None
+        )
+
+        pdf_file = await db['pdf_files'].find_one_and_update(
+            {"_id": job["pdf_id"]},
+            {"$set": {"vectorized": True, "sha256": sha256}},
+            return_document=ReturnDocument.AFTER
+        )
+        if pdf_file is None:
+            # Deleted while it was being ingested; _discard_pdf removes the vectors
+            raise IngestionError("PDF was deleted during ingestion")
+
+        active_pdf_registry.add(pdf_file["name"], pdf_file.get("active", True))
+        semantic_cache.invalidate_files([pdf_file["name"]])
+        await self._update(job, status=DONE, progress={**progress, "chunks_upserted": len(chunks)})
+        logger.info(f"Ingestion job {job['_id']} for '{filename}' done ({len(chunks)} chunks)")
+
+    async def _record_vector_ids(self, job: Dict[str, Any], ids: List[str]) -> None:
+        """
+        Persist the IDs a job is about to write, before writing them, so a
+        failed or abandoned job removes exactly its own vectors.
+        """
+        recorded = set(job.get("vector_ids", []))
+        new_ids = [cid for cid in ids if cid not in recorded]
+        if not new_ids:
+            return
+        await jobs_collection.update_one(
+            {"_id": job["_id"], "worker_id": self.worker_id},
+            {"$addToSet": {"vector_ids": {"$each": new_ids}}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+        job["vector_ids"] = job.get("vector_ids", []) + new_ids
+
+    async def _discard_pdf(self, job: Dict[str, Any]) -> None:
+        """Remove the vectors, stored file, metadata and artifacts of a PDF that could not be ingested."""
+        if job.get("vector_ids"):
+            # Only the IDs this job (or an interrupted attempt of it) wrote
+            try:
+                await asyncio.to_thread(delete_vectors_by_ids, job["vector_ids"], PDF_INDEX_NAME, PDF_NAMESPACE)
+            except Exception as e:
+                logger.warning(f"Failed to delete vectors of '{job['filename']}' after failed ingestion: {str(e)}")
+        try:
+            await db['pdf_files'].delete_one({"_id": job["pdf_id"]})
+            if job.get("path") and os.path.exists(job["path"]):
+                os.remove(job["path"])
+            await release_pdf_artifacts(job.get("sha256"))
+        except Exception as e:
+            logger.warning(f"Failed to clean up '{job['filename']}' after failed ingestion: {str(e)}")
+
+
+ingestion_queue = IngestionQueue()
@@ -44,25 +44,29 @@ class AnthropicLLM:
         
         if not self.stream:
             response = await self.client.messages.create(**params)
-            tool_response = None
+            tool_calls = []
             text_response = None
             for content_block in response.content:
                 if content_block.type == "tool_use":
-                    tool_response = {
+                    tool_calls.append({
                         "type": "function_call",
+                        "id": content_block.id,
                         "name": content_block.name,
                         "arguments": json.dumps(content_block.input)
-                    }
-                    break
+                    })
                 elif content_block.type == "text":
                     text_response = content_block.text
-            return tool_response if tool_response is not None else text_response if text_response is not None else ""
+            if tool_calls:
+                # The first call keeps the single-call shape; every call of the turn is under "calls"
+                return {**tool_calls[0], "calls": tool_calls}
+            return text_response if text_response is not None else ""
             
         else:
             stream = self.client.messages.stream(**params)
             
             async def stream_response():
                 full_text = ""
+                tool_id = None
                 tool_name = None
                 tool_arguments = ""
                 
@@ -72,6 +76,7 @@ class AnthropicLLM:
                             full_text += event.delta.text
                             yield {"type": "text", "content": event.delta.text}
                         elif event.type == "content_block_start" and event.content_block.type == "tool_use":
+                            tool_id = event.content_block.id
                             tool_name = event.content_block.name
                             tool_arguments = ""
                         elif event.type == "content_block_delta" and event.delta.type == "input_json_delta":
@@ -79,6 +84,7 @@ class AnthropicLLM:
                         elif event.type == "content_block_stop" and tool_name:
                             yield {
                                 "type": "function_call",
+                                "id": tool_id,
                                 "name": tool_name,
                                 "arguments": tool_arguments
                             }
@@ -87,4 +93,29 @@ class AnthropicLLM:
                         elif event.type == "message_stop":
                             break
             
-            return stream_response()
\ No newline at end of file
+            return stream_response()
+
+    @staticmethod
+    def tool_result_messages(calls: List[Dict[str, Any]], results: List[str]) -> List[Dict[str, Any]]:
+        """Messages that return the results of one turn's tool calls to the model."""
+        return [
+            {
+                "role": "assistant",
+                "content": [
+                    {
+                        "type": "tool_use",
+                        "id": call["id"],
+                        "name": call["name"],
+                        "input": json.loads(call["arguments"] or "{}")
+                    }
+                    for call in calls
+                ]
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"type": "tool_result", "tool_use_id": call["id"], "content": result}
+                    for call, result in zip(calls, results)
+                ]
+            }
+        ]
@@ -40,7 +40,9 @@ class OpenAILLM:
         
         for i, message in enumerate(messages):
             role = message.get("role", "unknown")
-            content = message.get("content", "")
+            content = message.get("content") or ""
+            if not isinstance(content, str):
+                content = json.dumps(content)
             content_preview = content[:500] + "..." if len(content) > 500 else content
             logger.info(f"  Message[{i+1}] ({role}): {content_preview}")
             if len(content) > 500:
@@ -77,14 +79,18 @@ class OpenAILLM:
                 logger.info(f"  Full response length: {len(content)} characters")
                 return content
             elif choice.message.tool_calls:
-                tool_call = choice.message.tool_calls[0]
-                logger.info(f"  Tool call: {tool_call.function.name}")
-                logger.info(f"  Tool arguments: {tool_call.function.arguments}")
-                return {
-                    "type": "function_call",
-                    "name": tool_call.function.name,
-                    "arguments": tool_call.function.arguments
-                }
+                # The first call keeps the single-call shape; every call of the turn is under "calls"
+                calls = []
+                for tool_call in choice.message.tool_calls:
+                    logger.info(f"  Tool call: {tool_call.function.name}")
+                    logger.info(f"  Tool arguments: {tool_call.function.arguments}")
+                    calls.append({
+                        "type": "function_call",
+                        "id": tool_call.id,
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments
+                    })
+                return {**calls[0], "calls": calls}
             logger.info("  No content or tool calls in response")
             return ""
         
@@ -94,8 +100,8 @@ class OpenAILLM:
             
             async def stream_response():
                 full_text = ""
-                tool_name = None
-                tool_arguments = ""
+                # Parallel tool calls stream interleaved, keyed by their index
+                tool_calls = {}
                 chunk_count = 0
                 
                 async for chunk in stream:
@@ -108,26 +114,52 @@ class OpenAILLM:
                         full_text += delta
                         yield {"type": "text", "content": delta}
                     elif chunk.choices and chunk.choices[0].delta.tool_calls:
-                        tool_call_delta = chunk.choices[0].delta.tool_calls[0]
-                        if tool_call_delta.function.name and not tool_name:
-                            tool_name = tool_call_delta.function.name
-                            logger.info(f"Tool call detected: {tool_name}")
-                        if tool_call_delta.function.arguments:
-                            tool_arguments += tool_call_delta.function.arguments
+                        for tool_call_delta in chunk.choices[0].delta.tool_calls:
+                            tool_call = tool_calls.setdefault(tool_call_delta.index, {"id": None, "name": None, "arguments": ""})
+                            if tool_call_delta.id:
+                                tool_call["id"] = tool_call_delta.id
+                            if tool_call_delta.function and tool_call_delta.function.name and not tool_call["name"]:
+                                tool_call["name"] = tool_call_delta.function.name
+                                logger.info(f"Tool call detected: {tool_call['name']}")
+                            if tool_call_delta.function and tool_call_delta.function.arguments:
+                                tool_call["arguments"] += tool_call_delta.function.arguments
                     elif chunk.choices and chunk.choices[0].finish_reason == "tool_calls":
-                        if tool_name and tool_arguments:
-                            logger.info(f"Tool call completed: {tool_name} with arguments: {tool_arguments}")
-                            yield {
-                                "type": "function_call",
-                                "name": tool_name,
-                                "arguments": tool_arguments
-                            }
-                            tool_name = None
-                            tool_arguments = ""
+                        for index in sorted(tool_calls):
+                            tool_call = tool_calls[index]
+                            if tool_call["name"]:
+                                logger.info(f"Tool call completed: {tool_call['name']} with arguments: {tool_call['arguments']}")
+                                yield {
+                                    "type": "function_call",
+                                    "id": tool_call["id"],
+                                    "name": tool_call["name"],
+                                    "arguments": tool_call["arguments"]
+                                }
+                        tool_calls = {}
                 
                 logger.info(f"Streaming completed. Total chunks: {chunk_count}, Final text length: {len(full_text)} characters")
                 if full_text:
                     preview = full_text[:300] + "..." if len(full_text) > 300 else full_text
                     logger.info(f"Final response preview: {preview}")
             
-            return stream_response()
\ No newline at end of file
+            return stream_response()
+
+    @staticmethod
+    def tool_result_messages(calls: List[Dict[str, Any]], results: List[str]) -> List[Dict[str, Any]]:
+        """Messages that return the results of one turn's tool calls to the model."""
+        messages = [{
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": call["arguments"]}
+                }
+                for call in calls
+            ]
+        }]
+        messages.extend(
+            {"role": "tool", "tool_call_id": call["id"], "content": result}
+            for call, result in zip(calls, results)
+        )
+        return messages
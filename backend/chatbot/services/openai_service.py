@@ -1,8 +1,10 @@
-from typing import List
+from typing import List, Optional
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
 
+from chatbot.services.embedding_cache import embedding_cache
+
 load_dotenv()
 
 EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-large")
@@ -11,11 +13,19 @@ EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", 256))
 client = OpenAI()
 
 
-def get_embeddings(texts: List[str]) -> List[List[float]]:
+def embed_texts(texts: List[str], model: str, dimensions: Optional[int] = None) -> List[List[float]]:
+    """Embed texts through the shared embedding cache; only uncached texts hit the API."""
+
+    def _create(missing: List[str]) -> List[List[float]]:
+        params = {"input": missing, "model": model}
+        if dimensions:
+            params["dimensions"] = dimensions
+        response = client.embeddings.create(**params)
+        return [result.embedding for result in response.data]
 
-    response = client.embeddings.create(
-        input=texts, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSION
-    )
-    data = response.data
+    return embedding_cache.get_or_embed(texts, model, dimensions, _create)
+
+
+def get_embeddings(texts: List[str]) -> List[List[float]]:
 
-    return [result.embedding for result in data]
+    return embed_texts(texts, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSION)
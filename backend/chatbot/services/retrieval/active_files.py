@@ -0,0 +1,85 @@
+# chatbot/services/retrieval/active_files.py
+import os
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Set
+from dotenv import load_dotenv
+
+from chatbot.database.database import db
+
+load_dotenv()
+
+logger = logging.getLogger("active_files")
+logger.setLevel(logging.INFO)
+
+# Other uvicorn workers only see toggles through a reload, so keep this short.
+# The reload runs in a background task, never on a request.
+ACTIVE_FILES_REFRESH_SECONDS = float(os.getenv("ACTIVE_FILES_REFRESH_SECONDS", 30))
+
+
+class ActivePDFRegistry:
+    """
+    In-process map of PDF filename -> active flag used to filter pdf_files hits.
+
+    Loaded at startup and kept current by the PDF routes and the ingestion
+    queue. A background task reloads the whole map every
+    ACTIVE_FILES_REFRESH_SECONDS to pick up changes made by other workers.
+    Names that are not known yet are resolved with one batched $in query;
+    names not found are not cached, so a PDF uploaded through another worker
+    is seen as soon as its record exists.
+    """
+
+    def __init__(self, refresh_seconds: float = ACTIVE_FILES_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._active: Dict[str, bool] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def load(self) -> None:
+        cursor = db['pdf_files'].find({}, {"name": 1, "active": 1})
+        active = {}
+        async for pdf in cursor:
+            active[pdf["name"]] = pdf.get("active", True)  # Default to active if not specified
+        self._active = active
+        logger.info(f"Loaded active flags for {len(active)} PDF files")
+
+    async def start(self) -> None:
+        # The refresh task also retries a failed initial load
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh())
+        await self.load()
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    async def _refresh(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Failed to reload active PDF flags: {str(e)}")
+
+    def add(self, name: str, active: bool = True) -> None:
+        self._active[name] = active
+
+    def remove(self, name: str) -> None:
+        self._active[name] = False
+
+    async def active_names(self, names: Iterable[str]) -> Set[str]:
+        """Return the subset of names whose PDF exists and is active."""
+        names = set(names)
+        missing = [name for name in names if name not in self._active]
+        if missing:
+            cursor = db['pdf_files'].find({"name": {"$in": missing}}, {"name": 1, "active": 1})
+            async for pdf in cursor:
+                self._active[pdf["name"]] = pdf.get("active", True)
+
+        return {name for name in names if self._active.get(name)}
+
+
+active_pdf_registry = ActivePDFRegistry()
@@ -0,0 +1,173 @@
+# chatbot/services/retrieval/context_packer.py
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from nltk.tokenize import sent_tokenize
+
+from chatbot.services.embedding_cache import normalize_text
+
+load_dotenv()
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000))
+# Per-model context budgets; models not listed use CONTEXT_TOKEN_BUDGET
+MODEL_CONTEXT_BUDGETS = {
+    "gpt-4o": 8000,
+    "gpt-4o-mini": 8000,
+    "gpt-4-turbo": 8000,
+    "gpt-4": 4000,
+    "gpt-3.5-turbo": 3000,
+}
+# Rough chars-per-token ratio, used only when a hit has no stored token_count
+CHARS_PER_TOKEN = 4
+
+
+class _Sentence:
+    """A sentence as it appears in the chunk (trailing whitespace included) and its dedupe key."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.key = normalize_text(text)
+
+    def __eq__(self, other) -> bool:
+        return self.key == other.key
+
+
+class _Passage:
+    def __init__(self, filename: str, sentences: List[_Sentence], tokens: int, chars: int):
+        self.filename = filename
+        self.sentences = sentences
+        # Tokens per character of this passage's source chunk(s), so sentence
+        # token counts can be derived from the stored chunk count
+        self.tokens_per_char = tokens / chars if chars else 1 / CHARS_PER_TOKEN
+
+    def sentence_tokens(self, sentence: _Sentence) -> int:
+        return max(1, round(len(sentence.key) * self.tokens_per_char))
+
+
+def _split_sentences(text: str) -> List[_Sentence]:
+    """
+    Sentences of text with the whitespace that follows each one, so joining
+    them back keeps the chunk's newlines, lists and tables intact.
+    """
+    sentences = []
+    offset = 0
+    for sentence in sent_tokenize(text):
+        start = text.find(sentence, offset)
+        if start < 0:
+            original = sentence  # Not a verbatim substring; keep the tokenizer's version
+        else:
+            end = start + len(sentence)
+            while end < len(text) and text[end].isspace():
+                end += 1
+            original = text[start:end]
+            offset = end
+        item = _Sentence(original)
+        if item.key:
+            sentences.append(item)
+    return sentences
+
+
+def _join_sentences(sentences: List[_Sentence]) -> str:
+    parts = []
+    for sentence in sentences:
+        if parts and not parts[-1][-1].isspace():
+            parts.append(" ")  # Last sentence of a chunk, followed by one from the next
+        parts.append(sentence.text)
+    return "".join(parts).strip()
+
+
+def _chunk_tokens(result: Dict[str, Any]) -> int:
+    # The upserts store the splitter's per-chunk count as token_count metadata,
+    # so packing does not re-tokenize; older chunks fall back to the estimate
+    token_count = result.get("token_count")
+    if token_count:
+        return int(token_count)
+    return max(1, len(result["text"]) // CHARS_PER_TOKEN)
+
+
+def _merge_overlap(first: List[str], second: List[str]) -> Optional[List[str]]:
+    """Join two sentence lists if a suffix of first equals a prefix of second."""
+    for k in range(min(len(first), len(second)), 0, -1):
+        if first[-k:] == second[:k]:
+            return first + second[k:]
+    return None
+
+
+def budget_for_model(model: Optional[str]) -> int:
+    return MODEL_CONTEXT_BUDGETS.get(model, CONTEXT_TOKEN_BUDGET) if model else CONTEXT_TOKEN_BUDGET
+
+
+def pack_context(
+    search_results: List[Dict[str, Any]],
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Build the LLM context from search hits.
+
+    Overlapping chunks from the same file (text_splitter repeats up to 200
+    tokens between neighbours) are stitched into one passage, sentences
+    already included elsewhere are dropped, and passages are added best
+    score first until token_budget is reached. Token counts come from the
+    token_count stored with each chunk, prorated per sentence by length.
+
+    Sentences are compared by their normalized text but emitted as they
+    appear in the chunk, so formatting reaches the LLM unchanged.
+
+    Returns the context string and stats with the input and packed token
+    counts, the tokens removed as overlap or duplicates (tokens_deduped) and
+    the tokens of unique sentences that did not fit the budget
+    (tokens_truncated).
+    """
+    passages: List[_Passage] = []
+    input_tokens = 0
+
+    for result in sorted(search_results, key=lambda r: r.get("score", 0.0), reverse=True):
+        tokens = _chunk_tokens(result)
+        input_tokens += tokens
+        sentences = _split_sentences(result["text"])
+        filename = result.get("filename", "unknown")
+
+        merged = False
+        for passage in passages:
+            if passage.filename != filename:
+                continue
+            joined = _merge_overlap(passage.sentences, sentences) or _merge_overlap(sentences, passage.sentences)
+            if joined is not None:
+                passage.sentences = joined
+                merged = True
+                break
+        if not merged:
+            passages.append(_Passage(filename, sentences, tokens, len(result["text"])))
+
+    seen = set()
+    counted = set()
+    parts = []
+    packed_tokens = 0
+    unique_tokens = 0
+    for passage in passages:
+        kept = []
+        full = packed_tokens >= token_budget
+        for sentence in passage.sentences:
+            cost = passage.sentence_tokens(sentence)
+            if sentence.key not in counted:
+                counted.add(sentence.key)
+                unique_tokens += cost
+            if full or sentence.key in seen:
+                continue
+            if packed_tokens + cost > token_budget:
+                full = True  # The rest of this passage is only counted
+                continue
+            seen.add(sentence.key)
+            kept.append(sentence)
+            packed_tokens += cost
+        if kept:
+            parts.append(f"[{passage.filename}]: {_join_sentences(kept)}\n")
+
+    stats = {
+        "input_tokens": input_tokens,
+        "packed_tokens": packed_tokens,
+        "tokens_deduped": max(0, input_tokens - unique_tokens),
+        "tokens_truncated": max(0, unique_tokens - packed_tokens),
+        "passages": len(parts),
+    }
+    return "\n".join(parts), stats
@@ -0,0 +1,54 @@
+# chatbot/services/retrieval/fusion.py
+from typing import Any, Dict, List, Optional
+from chatbot.services.embedding_cache import normalize_text
+
+
+def _normalized_scores(results: List[Dict[str, Any]]) -> List[float]:
+    """Min-max normalize one store's scores to [0, 1] so stores become comparable."""
+    scores = [float(r["score"]) for r in results]
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0 for _ in scores]
+    return [(score - low) / (high - low) for score in scores]
+
+
+def fuse_results(
+    ranked_lists: Dict[str, List[Dict[str, Any]]],
+    method: str = "rrf",
+    weights: Optional[Dict[str, float]] = None,
+    rrf_k: int = 60,
+) -> List[Dict[str, Any]]:
+    """
+    Merge per-store result lists (each sorted best first) into one list.
+
+    method="rrf" scores a chunk by sum(weight / (rrf_k + rank)) over the
+    stores that returned it; method="weighted" sums weight * min-max
+    normalized score. Chunks with identical (whitespace-normalized) text are
+    merged into a single result. The fused score replaces "score" and the
+    returning stores are listed under "sources".
+    """
+    weights = weights or {}
+    fused: Dict[str, Dict[str, Any]] = {}
+
+    for store, results in ranked_lists.items():
+        if not results:
+            continue
+        weight = weights.get(store, 1.0)
+        if method == "weighted":
+            contributions = [weight * s for s in _normalized_scores(results)]
+        else:
+            contributions = [weight / (rrf_k + rank) for rank in range(1, len(results) + 1)]
+
+        seen_in_store = set()
+        for result, contribution in zip(results, contributions):
+            key = normalize_text(result["text"])
+            if key in seen_in_store:
+                continue
+            seen_in_store.add(key)
+
+            if key not in fused:
+                fused[key] = {**result, "score": 0.0, "sources": []}
+            fused[key]["score"] += contribution
+            fused[key]["sources"].append(store)
+
+    return sorted(fused.values(), key=lambda r: r["score"], reverse=True)
@@ -0,0 +1,48 @@
+# chatbot/services/retrieval/mmr.py
+from typing import Any, Dict, List
+import numpy as np
+
+
+def mmr_select(
+    query_vector: List[float],
+    candidates: List[Dict[str, Any]],
+    top_k: int,
+    lambda_mult: float = 0.5,
+) -> List[Dict[str, Any]]:
+    """
+    Pick top_k candidates by maximal marginal relevance.
+
+    Each step takes the candidate maximizing
+    lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, selected),
+    so near-duplicate chunks are skipped in favour of new material.
+    Candidates must carry their embedding under "values"; those without one
+    are only used once every candidate with a vector has been considered.
+    """
+    with_values = [c for c in candidates if c.get("values")]
+    without_values = [c for c in candidates if not c.get("values")]
+    if len(with_values) <= top_k:
+        return (with_values + without_values)[:top_k]
+
+    matrix = np.asarray([c["values"] for c in with_values], dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= np.linalg.norm(query) or 1.0
+
+    relevance = matrix @ query
+    # Highest similarity of each candidate to anything already selected
+    redundancy = np.full(len(with_values), -np.inf, dtype=np.float32)
+    available = np.ones(len(with_values), dtype=bool)
+    selected: List[int] = []
+
+    for _ in range(top_k):
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+
+    return [with_values[i] for i in selected]
@@ -0,0 +1,138 @@
+# chatbot/services/retrieval/result_cache.py
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from chatbot.services.embedding_cache import normalize_text
+
+load_dotenv()
+
+logger = logging.getLogger("retrieval_cache")
+logger.setLevel(logging.INFO)
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", 1024))
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", 600))
+# Generation markers live on disk so a re-index in one worker is seen by all
+RETRIEVAL_GENERATIONS_PATH = os.getenv("RETRIEVAL_GENERATIONS_PATH", "./.retrieval_generations")
+
+Target = Tuple[str, str, str]  # (store_type, index_or_collection, namespace)
+
+
+class GenerationTracker:
+    """
+    Per index/namespace generation counters.
+
+    bump() rewrites a small marker file; current() reads its mtime, so a bump
+    from any worker on the host invalidates every worker's cached results.
+    """
+
+    def __init__(self, root: str = RETRIEVAL_GENERATIONS_PATH):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, target: Target) -> str:
+        name = hashlib.sha256("\x1f".join(target).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, name)
+
+    def current(self, target: Target) -> int:
+        try:
+            return os.stat(self._path(target)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def bump(self, target: Target) -> None:
+        path = self._path(target)
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            previous = self.current(target)
+            try:
+                with open(path, "r") as f:
+                    generation = int(f.read() or 0) + 1
+            except (FileNotFoundError, ValueError):
+                generation = 1
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(generation))
+            os.replace(tmp_path, path)
+            # Guarantee a new mtime even on coarse-grained filesystems
+            now = time.time_ns()
+            os.utime(path, ns=(now, max(now, previous + 1)))
+        logger.info(f"Bumped retrieval generation for {target} to {generation}")
+
+
+generation_tracker = GenerationTracker()
+
+
+def bump_generation(store_type: str, index_name: str, namespace: str = "") -> None:
+    """Invalidate cached retrieval results for one index/namespace (or collection)."""
+    try:
+        generation_tracker.bump((store_type, index_name, namespace or ""))
+    except OSError as e:
+        logger.warning(f"Failed to bump retrieval generation: {str(e)}")
+
+
+class RetrievalResultCache:
+    """
+    LRU cache of perform_vector_search results keyed by (normalized query,
+    vector store config hash). Each entry remembers the generation of every
+    index/namespace it read from and is discarded as soon as any of them
+    has been bumped by an upsert or delete.
+    """
+
+    def __init__(self, max_size: int = RETRIEVAL_CACHE_SIZE, ttl_seconds: float = RETRIEVAL_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query: str, config: Dict[str, Any]) -> str:
+        raw = normalize_text(query) + "\x1f" + json.dumps(config, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, targets: List[Target]) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                fresh = (
+                    time.monotonic() - entry["created_at"] <= self.ttl_seconds
+                    and entry["generations"] == [generation_tracker.current(t) for t in targets]
+                )
+                if fresh:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(entry["results"])
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def generations(self, targets: List[Target]) -> List[int]:
+        """Snapshot generations before searching, so a concurrent re-index is never masked."""
+        return [generation_tracker.current(t) for t in targets]
+
+    def set(self, key: str, generations: List[int], results: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._entries[key] = {
+                "results": copy.deepcopy(results),
+                "generations": generations,
+                "created_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+retrieval_cache = RetrievalResultCache()
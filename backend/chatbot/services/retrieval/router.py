@@ -0,0 +1,75 @@
+# chatbot/services/retrieval/router.py
+import os
+import re
+import logging
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("retrieval_router")
+logger.setLevel(logging.INFO)
+
+RETRIEVAL_ROUTER_MODE = os.getenv("RETRIEVAL_ROUTER_MODE", "llm")
+
+# Conversational turns that never need the knowledge base (Polish and English)
+SMALL_TALK_PATTERN = re.compile(
+    r"^(cześć|czesc|hej|hejka|siema|witam|dzień dobry|dzien dobry|dobry wieczór|dobry wieczor|"
+    r"dzięki|dzieki|dziękuję|dziekuje|dziękuje|super|ok|okej|okay|jasne|rozumiem|świetnie|swietnie|"
+    r"do widzenia|na razie|pa|tak|nie|"
+    r"hi|hello|hey|thanks|thank you|thx|great|cool|got it|bye|goodbye|yes|no)"
+    r"[\s!.,?:)]*$",
+    re.IGNORECASE
+)
+
+# A strategy returns True to search, False to answer without searching, or
+# None to let the LLM decide through the search tool
+RouteStrategy = Callable[[str, List[Dict[str, str]]], Optional[bool]]
+
+
+def _always(query: str, history: List[Dict[str, str]]) -> Optional[bool]:
+    return True
+
+
+def _never(query: str, history: List[Dict[str, str]]) -> Optional[bool]:
+    return False
+
+
+def _llm(query: str, history: List[Dict[str, str]]) -> Optional[bool]:
+    return None
+
+
+def _heuristic(query: str, history: List[Dict[str, str]]) -> Optional[bool]:
+    """Skip retrieval for greetings, thanks and acknowledgements; search everything else."""
+    return not SMALL_TALK_PATTERN.match(query.strip())
+
+
+class RetrievalRouter:
+    """
+    Decides whether a conversational turn needs vector search. Deciding locally
+    ("always", "never", "heuristic") removes the tool-decision LLM round-trip;
+    "llm" keeps the original behaviour of offering the search tool to the model.
+    Additional strategies can be added with register().
+    """
+
+    def __init__(self):
+        self.strategies: Dict[str, RouteStrategy] = {
+            "always": _always,
+            "never": _never,
+            "heuristic": _heuristic,
+            "llm": _llm,
+        }
+
+    def register(self, mode: str, strategy: RouteStrategy) -> None:
+        self.strategies[mode] = strategy
+
+    def decide(self, mode: str, query: str, history: List[Dict[str, str]]) -> Optional[bool]:
+        strategy = self.strategies.get(mode)
+        if strategy is None:
+            raise ValueError(f"Unknown retrieval mode '{mode}'. Available: {sorted(self.strategies)}")
+        decision = strategy(query, history)
+        logger.info(f"Retrieval router ({mode}) decision: {'llm' if decision is None else decision}")
+        return decision
+
+
+retrieval_router = RetrievalRouter()
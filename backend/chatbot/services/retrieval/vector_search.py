@@ -1,137 +1,277 @@
 # chatbot/services/vector_search.py
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Tuple
 from chatbot.services.retrieval.vectorstores.pinecone.query import PineconeQuery
 from chatbot.services.retrieval.vectorstores.weaviate.query import WeaviateQuery
+from chatbot.services.retrieval.vectorstores.local.query import LocalQuery
 from fastapi import HTTPException
 from pydantic import BaseModel
 from typing import Literal, Optional
-from chatbot.database.database import db
+from chatbot.services.retrieval.active_files import active_pdf_registry
+from chatbot.services.embedding_batcher import embedding_batcher
+from chatbot.services.retrieval.result_cache import retrieval_cache
+from chatbot.services.retrieval.fusion import fuse_results
+from chatbot.services.retrieval.mmr import mmr_select
+from chatbot.services.retrieval.context_packer import pack_context, budget_for_model
 import logging
 
 # Configure logger for vector search
 logger = logging.getLogger("vector_search")
 logger.setLevel(logging.INFO)
 
+PDF_NAMESPACE = "pdf_files"
+
 class VectorStoreConfig(BaseModel):
-    store_type: Literal["pinecone", "weaviate"]
+    store_type: Literal["pinecone", "weaviate", "local", "federated"]
     index_name: Optional[str] = None
     namespace: Optional[str] = ""
+    # Fan-out targets: every (index, namespace) pair is queried concurrently
+    # with a single query embedding and the hits are merged by score.
+    namespaces: Optional[List[str]] = None
+    index_names: Optional[List[str]] = None
     collection_name: Optional[str] = None
     hybrid: Optional[bool] = False
     alpha: Optional[float] = 0.5
     fusion_type: Optional[str] = None
     query_properties: Optional[List[str]] = None
     top_k: int = 5
+    # Only used by the local store
+    search_mode: Literal["exact", "ivf", "hnsw"] = "exact"
+    # Diversity reranking (Pinecone and local stores): over-fetch mmr_fetch_k
+    # candidates per target with their vectors and pick top_k by MMR
+    mmr: bool = False
+    mmr_lambda: float = 0.5
+    mmr_fetch_k: int = 20
+    # Only used by the federated store (Pinecone targets + Weaviate collection)
+    federated_fusion: Literal["rrf", "weighted"] = "rrf"
+    rrf_k: int = 60
+    store_weights: Optional[Dict[str, float]] = None
+    store_timeout: float = 3.0
+
+    def search_targets(self) -> List[Tuple[str, str]]:
+        """Resolve the (index_name, namespace) pairs a Pinecone or local search should hit."""
+        index_names = self.index_names or [self.index_name]
+        if self.namespaces:
+            namespaces = self.namespaces
+        elif self.namespace:
+            namespaces = [self.namespace]
+        else:
+            # Search in both default and pdf_files namespaces if none specified
+            namespaces = ["", PDF_NAMESPACE]
+        return [(index_name, namespace) for index_name in index_names for namespace in namespaces]
+
+    def generation_targets(self) -> List[Tuple[str, str, str]]:
+        """Index/namespace generations that cached results for this config depend on."""
+        targets = []
+        if self.store_type in ("weaviate", "federated"):
+            targets.append(("weaviate", self.collection_name or "", ""))
+        if self.store_type != "weaviate":
+            store_type = "pinecone" if self.store_type == "federated" else self.store_type
+            targets.extend(
+                (store_type, index_name or "", namespace) for index_name, namespace in self.search_targets()
+            )
+        return targets
 
 class VectorSearchService:
     async def perform_vector_search(self, query: str, vector_config: VectorStoreConfig) -> List[Dict[str, Any]]:
         """Execute vector search based on the provided configuration."""
         logger.info(f"Starting vector search for query: '{query}' with config: {vector_config.model_dump()}")
+
+        cache_key = retrieval_cache.make_key(query, vector_config.model_dump())
+        cache_targets = vector_config.generation_targets()
+        cached = retrieval_cache.get(cache_key, cache_targets)
+        if cached is not None:
+            logger.info(f"Serving {len(cached)} results from retrieval cache")
+            return cached
+        generations = retrieval_cache.generations(cache_targets)
         
-        if vector_config.store_type == "pinecone":
-            if not vector_config.index_name:
-                raise HTTPException(status_code=400, detail="index_name is required for Pinecone search")
-            
-            pinecone_query = PineconeQuery(
-                index_name=vector_config.index_name,
-                namespace=vector_config.namespace
+        store_type = vector_config.store_type
+        if store_type != "weaviate" and not vector_config.index_name and not vector_config.index_names:
+            raise HTTPException(status_code=400, detail=f"index_name is required for {store_type} search")
+        if store_type in ("weaviate", "federated") and not vector_config.collection_name:
+            raise HTTPException(status_code=400, detail=f"collection_name is required for {store_type} search")
+
+        degraded = False
+        query_vector = None
+        if store_type != "weaviate" or vector_config.hybrid:
+            query_vector = await embedding_batcher.embed(query, model="text-embedding-3-large")
+
+        if store_type in ("pinecone", "local"):
+            use_mmr = vector_config.mmr
+            results = await self.fan_out_search(
+                query_vector, vector_config.search_targets(),
+                max(vector_config.mmr_fetch_k, vector_config.top_k) if use_mmr else vector_config.top_k,
+                store_type=store_type,
+                search_mode=vector_config.search_mode,
+                include_values=use_mmr
             )
-            
-            # Search in multiple namespaces if not specified
-            if not vector_config.namespace:
-                logger.info("No specific namespace provided, searching in both default and pdf_files namespaces")
-                # Combine results from main namespace and pdf_files namespace
-                results = []
-                
-                # Search in default namespace
-                logger.info("Searching in default namespace...")
-                main_results = pinecone_query.query(
-                    user_query=query,
-                    top_k=vector_config.top_k
-                )
-                logger.info(f"Found {len(main_results)} results in default namespace")
-                for i, result in enumerate(main_results):
-                    logger.info(f"  Default[{i+1}]: score={result['score']:.4f}, file={result.get('filename', 'unknown')}")
-                    logger.info(f"    Text preview: {result['text'][:150]}...")
-                results.extend(main_results)
-                
-                # Search in pdf_files namespace
-                logger.info("Searching in pdf_files namespace...")
-                pinecone_query_pdf = PineconeQuery(
-                    index_name=vector_config.index_name,
-                    namespace="pdf_files"
-                )
-                pdf_results = pinecone_query_pdf.query(
-                    user_query=query,
-                    top_k=vector_config.top_k
-                )
-                logger.info(f"Found {len(pdf_results)} results in pdf_files namespace")
-                
-                # Filter results from pdf_files namespace based on active status
-                filtered_pdf_results = []
-                for i, result in enumerate(pdf_results):
-                    logger.info(f"  PDF[{i+1}]: score={result['score']:.4f}, file={result.get('filename', 'unknown')}")
-                    logger.info(f"    Text preview: {result['text'][:150]}...")
-                    
-                    if "filename" in result:
-                        # Check if the source PDF is active
-                        pdf_file = await db['pdf_files'].find_one({"name": result["filename"]})
-                        if pdf_file and pdf_file.get("active", True):  # Default to active if not specified
-                            filtered_pdf_results.append(result)
-                            logger.info(f"    ✓ PDF file '{result['filename']}' is active, including result")
-                        else:
-                            logger.info(f"    ✗ PDF file '{result['filename']}' is inactive, excluding result")
-                    else:
-                        filtered_pdf_results.append(result)
-                        logger.info(f"    ✓ No filename metadata, including result")
-                
-                # Add filtered PDF results
-                results.extend(filtered_pdf_results)
-                logger.info(f"After filtering, included {len(filtered_pdf_results)} PDF results")
-                
-                # Sort by relevance score and take top results
-                results.sort(key=lambda x: x["score"], reverse=True)
-                final_results = results[:vector_config.top_k]
-                logger.info(f"Final results after sorting and limiting to top {vector_config.top_k}:")
-                for i, result in enumerate(final_results):
-                    logger.info(f"  Final[{i+1}]: score={result['score']:.4f}, file={result.get('filename', 'unknown')}")
-                
-                return final_results
+            # Sort by relevance score and take top results
+            results.sort(key=lambda x: x["score"], reverse=True)
+            if use_mmr:
+                logger.info(f"Selecting {vector_config.top_k} of {len(results)} candidates by MMR (lambda={vector_config.mmr_lambda})")
+                results = mmr_select(query_vector, results, vector_config.top_k, vector_config.mmr_lambda)
+                for result in results:
+                    result.pop("values", None)
+        elif store_type == "weaviate":
+            results = await self.weaviate_search(query, query_vector, vector_config)
+        else:
+            results, degraded = await self.federated_search(query, query_vector, vector_config)
+
+        final_results = results[:vector_config.top_k]
+        logger.info(f"Final results after sorting and limiting to top {vector_config.top_k}:")
+        for i, result in enumerate(final_results):
+            logger.info(f"  Final[{i+1}]: score={result['score']:.4f}, file={result.get('filename', 'unknown')}")
+
+        if degraded:
+            # Partial results must not outlive the outage of the missing store
+            logger.info("Not caching degraded federated results")
+        else:
+            retrieval_cache.set(cache_key, generations, final_results)
+        return final_results
+
+    async def weaviate_search(
+        self,
+        query: str,
+        query_vector: Optional[List[float]],
+        vector_config: VectorStoreConfig
+    ) -> List[Dict[str, Any]]:
+        """BM25 (or hybrid when vector_config.hybrid) search of the configured Weaviate collection."""
+        weaviate_query = WeaviateQuery(collection_name=vector_config.collection_name)
+        if vector_config.hybrid:
+            results = await asyncio.to_thread(
+                weaviate_query.hybrid_query,
+                user_query=query,
+                top_k=vector_config.top_k,
+                alpha=vector_config.alpha,
+                fusion_type=vector_config.fusion_type,
+                query_properties=vector_config.query_properties,
+                query_vector=query_vector
+            )
+        else:
+            results = await asyncio.to_thread(weaviate_query.query, user_query=query, top_k=vector_config.top_k)
+        logger.info(f"Found {len(results)} results in Weaviate collection '{vector_config.collection_name}'")
+        return results
+
+    async def federated_search(
+        self,
+        query: str,
+        query_vector: List[float],
+        vector_config: VectorStoreConfig
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Query Pinecone and Weaviate concurrently with one shared embedding and fuse
+        the rankings. A store that errors or exceeds store_timeout is left out, so
+        one slow store degrades the result instead of blocking it. Returns the
+        fused results and whether any store was left out.
+        """
+        async def _bounded(store: str, search) -> Optional[List[Dict[str, Any]]]:
+            try:
+                return await asyncio.wait_for(search, timeout=vector_config.store_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{store} search timed out after {vector_config.store_timeout}s, skipping it")
+            except Exception as e:
+                logger.error(f"{store} search failed, skipping it: {str(e)}")
+            return None
+
+        pinecone_results, weaviate_results = await asyncio.gather(
+            _bounded("pinecone", self.fan_out_search(
+                query_vector, vector_config.search_targets(), vector_config.top_k, store_type="pinecone"
+            )),
+            _bounded("weaviate", self.weaviate_search(query, query_vector, vector_config))
+        )
+        if pinecone_results is None and weaviate_results is None:
+            raise HTTPException(status_code=504, detail="All vector stores failed or timed out")
+
+        ranked_lists = {}
+        if pinecone_results is not None:
+            ranked_lists["pinecone"] = sorted(pinecone_results, key=lambda x: x["score"], reverse=True)
+        if weaviate_results is not None:
+            ranked_lists["weaviate"] = weaviate_results
+
+        fused = fuse_results(
+            ranked_lists,
+            method=vector_config.federated_fusion,
+            weights=vector_config.store_weights,
+            rrf_k=vector_config.rrf_k
+        )
+        return fused, len(ranked_lists) < 2
+
+    async def fan_out_search(
+        self,
+        query_vector: List[float],
+        targets: List[Tuple[str, str]],
+        top_k: int,
+        store_type: str = "pinecone",
+        search_mode: str = "exact",
+        include_values: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Query every (index_name, namespace) target concurrently with one embedding.
+        The blocking Pinecone/local calls run in worker threads, so latency is bounded by
+        the slowest target rather than the sum of all of them.
+        """
+        async def _search(index_name: str, namespace: str) -> List[Dict[str, Any]]:
+            if store_type == "local":
+                store_query = LocalQuery(index_name=index_name, namespace=namespace, search_mode=search_mode)
             else:
-                # Use specified namespace
-                logger.info(f"Searching in specified namespace: '{vector_config.namespace}'")
-                results = pinecone_query.query(
-                    user_query=query,
-                    top_k=vector_config.top_k
-                )
-                logger.info(f"Found {len(results)} results in namespace '{vector_config.namespace}'")
-                for i, result in enumerate(results):
-                    logger.info(f"  Result[{i+1}]: score={result['score']:.4f}, file={result.get('filename', 'unknown')}")
-                    logger.info(f"    Text preview: {result['text'][:150]}...")
-                return results
-
-    def prepare_context(self, search_results: List[Dict[str, Any]]) -> str:
-        """Format search results into a context string for the LLM."""
+                store_query = PineconeQuery(index_name=index_name, namespace=namespace)
+            return await asyncio.to_thread(store_query.query_by_vector, query_vector, top_k, include_values)
+
+        responses = await asyncio.gather(
+            *[_search(index_name, namespace) for index_name, namespace in targets]
+        )
+
+        results = []
+        for (index_name, namespace), target_results in zip(targets, responses):
+            label = namespace or "default"
+            logger.info(f"Found {len(target_results)} results in {index_name}/{label}")
+            for i, result in enumerate(target_results):
+                logger.info(f"  {label}[{i+1}]: score={result['score']:.4f}, file={result.get('filename', 'unknown')}")
+                logger.info(f"    Text preview: {result['text'][:150]}...")
+
+            if namespace == PDF_NAMESPACE:
+                target_results = await self._filter_inactive_pdfs(target_results)
+                logger.info(f"After filtering, included {len(target_results)} PDF results")
+            results.extend(target_results)
+
+        return results
+
+    async def _filter_inactive_pdfs(self, pdf_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Filter results from pdf_files namespace based on active status."""
+        active = await active_pdf_registry.active_names(
+            result["filename"] for result in pdf_results if "filename" in result
+        )
+        filtered_pdf_results = []
+        for result in pdf_results:
+            if "filename" not in result:
+                filtered_pdf_results.append(result)
+                logger.info(f"    ✓ No filename metadata, including result")
+            elif result["filename"] in active:
+                filtered_pdf_results.append(result)
+                logger.info(f"    ✓ PDF file '{result['filename']}' is active, including result")
+            else:
+                logger.info(f"    ✗ PDF file '{result['filename']}' is inactive, excluding result")
+        return filtered_pdf_results
+
+    def prepare_context(self, search_results: List[Dict[str, Any]], model: Optional[str] = None) -> str:
+        """
+        Format search results into a context string for the LLM, packed into
+        the token budget of `model` (see context_packer).
+        """
         logger.info(f"Preparing context from {len(search_results)} search results")
-        
-        context_parts = []
-        total_chars = 0
-        
+
         for i, result in enumerate(search_results):
-            filename = result.get('filename', 'unknown')
-            text = result['text']
-            score = result['score']
-            
-            context_part = f"[{filename}]: {text}\n"
-            context_parts.append(context_part)
-            total_chars += len(context_part)
-            
-            logger.info(f"  Context[{i+1}]: from '{filename}' (score: {score:.4f}, {len(text)} chars)")
-        
-        final_context = "\n".join(context_parts)
-        logger.info(f"Final context prepared: {total_chars} total characters")
+            logger.info(f"  Context[{i+1}]: from '{result.get('filename', 'unknown')}' (score: {result['score']:.4f}, {len(result['text'])} chars)")
+
+        final_context, stats = pack_context(search_results, token_budget=budget_for_model(model))
+        logger.info(
+            f"Final context prepared: {len(final_context)} total characters, "
+            f"{stats['passages']} passages, ~{stats['packed_tokens']} tokens "
+            f"(of {stats['input_tokens']} input tokens, {stats['tokens_deduped']} deduplicated, "
+            f"{stats['tokens_truncated']} over budget)"
+        )
         logger.info(f"Context preview (first 300 chars): {final_context[:300]}...")
-        
+
         return final_context
     
     def test_pdf_search(self, query: str, index_name: str = "pdf-vectors"):
@@ -0,0 +1,83 @@
+# chatbot/services/retrieval/vectorstores/chunk_ids.py
+import uuid
+import hashlib
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+# Fixed namespace so Weaviate UUIDs derived from the same chunk ID never change
+CHUNK_UUID_NAMESPACE = uuid.UUID("6f1d3a52-8c1e-4b8e-9a47-2d5c0e7b9f13")
+# Metadata flag set on every vector stored under chunk_id(); vectors without it
+# were written with random IDs before chunk IDs were derived from content
+CONTENT_ID_FLAG = "content_id"
+
+
+def document_key(document_id: str) -> str:
+    """Short, ASCII-safe key for a document (filenames may contain any characters)."""
+    return hashlib.sha256(document_id.encode("utf-8")).hexdigest()[:16]
+
+
+def document_prefix(document_id: str) -> str:
+    """Common prefix of every chunk ID of a document, for listing by prefix."""
+    return f"{document_key(document_id)}#"
+
+
+def chunk_id(document_id: str, chunk_text: str) -> str:
+    """Deterministic chunk ID: the same text in the same document always gets the same ID."""
+    content_hash = hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()[:32]
+    return f"{document_prefix(document_id)}{content_hash}"
+
+
+def chunk_uuid(document_id: str, chunk_text: str) -> str:
+    """chunk_id as a UUID, for stores that only accept UUIDs (Weaviate)."""
+    return str(uuid.uuid5(CHUNK_UUID_NAMESPACE, chunk_id(document_id, chunk_text)))
+
+
+class ChunkSyncPlan:
+    """
+    Difference between a document's chunks and the IDs already stored for it.
+
+    new: (position in the input, chunk id) of chunks that must be embedded and written
+    stale: stored IDs no longer produced by the document, to be deleted
+    unchanged: number of chunks already stored under their ID
+    """
+
+    def __init__(self, new: List[Tuple[int, str]], stale: List[str], unchanged: int):
+        self.new = new
+        self.stale = stale
+        self.unchanged = unchanged
+
+    def summary(self) -> str:
+        return f"{len(self.new)} new, {self.unchanged} unchanged, {len(self.stale)} stale"
+
+
+def plan_chunk_sync(
+    chunks: List[Tuple[str, str]],
+    existing_ids: Dict[str, Set[str]],
+    make_id: Callable[[str, str], str] = chunk_id
+) -> ChunkSyncPlan:
+    """
+    Plan an incremental re-index.
+    Args:
+        chunks: List of tuples (chunk_text, filename); the filename is the document id
+        existing_ids: Stored chunk IDs per filename
+        make_id: chunk_id or chunk_uuid, matching the store
+    """
+    new: List[Tuple[int, str]] = []
+    current: Dict[str, Set[str]] = {}
+    unchanged = 0
+    for position, (chunk_text, filename) in enumerate(chunks):
+        cid = make_id(filename, chunk_text)
+        seen = current.setdefault(filename, set())
+        if cid in seen:
+            continue  # Identical chunk text repeated within the document
+        seen.add(cid)
+        if cid in existing_ids.get(filename, set()):
+            unchanged += 1
+        else:
+            new.append((position, cid))
+
+    stale = [cid for filename, ids in existing_ids.items() for cid in ids - current.get(filename, set())]
+    return ChunkSyncPlan(new, stale, unchanged)
+
+
+def filenames_of(chunks: Iterable[Tuple[str, str]]) -> List[str]:
+    return list(dict.fromkeys(filename for _, filename in chunks))
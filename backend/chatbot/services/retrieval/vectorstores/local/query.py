@@ -0,0 +1,40 @@
+# chatbot/services/retrieval/vectorstores/local/query.py
+import asyncio
+from typing import List, Dict, Any
+from chatbot.services.openai_service import embed_texts
+from chatbot.services.embedding_batcher import embedding_batcher
+from chatbot.services.retrieval.vectorstores.local.store import local_vector_store
+
+class LocalQuery:
+    def __init__(self, index_name: str = None, namespace: str = "", search_mode: str = "exact"):
+        self.partition = local_vector_store.namespace(index_name, namespace)
+        self.namespace = namespace
+        self.search_mode = search_mode
+
+    def query(self, user_query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        query_vector = embed_texts([user_query], model="text-embedding-3-large")[0]
+        return self.query_by_vector(query_vector, top_k=top_k)
+
+    async def aquery(self, user_query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        query_vector = await embedding_batcher.embed(user_query, model="text-embedding-3-large")
+        return await asyncio.to_thread(self.query_by_vector, query_vector, top_k)
+
+    def query_by_vector(self, query_vector: List[float], top_k: int = 5, include_values: bool = False) -> List[Dict[str, Any]]:
+        try:
+            matches = self.partition.search(query_vector, top_k=top_k, mode=self.search_mode, include_values=include_values)
+            results = []
+            for _, score, metadata in matches:
+                result = {
+                    "text": metadata.get("text", ""),
+                    "score": score,
+                    "filename": metadata.get("filename", "unknown")
+                }
+                if metadata.get("token_count"):
+                    result["token_count"] = int(metadata["token_count"])
+                if include_values:
+                    result["values"] = metadata["values"]
+                results.append(result)
+            return results
+        except Exception as e:
+            print(f"Error during local vector query: {str(e)}")
+            raise
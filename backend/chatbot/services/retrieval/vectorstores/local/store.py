@@ -0,0 +1,278 @@
+# chatbot/services/retrieval/vectorstores/local/store.py
+import os
+import json
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import hnswlib
+except ImportError:  # Optional: only needed for search_mode="hnsw"
+    hnswlib = None
+
+load_dotenv()
+
+logger = logging.getLogger("local_vector_store")
+logger.setLevel(logging.INFO)
+
+LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", "./local_vectors")
+LOCAL_IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", 8))
+# Below this many vectors approximate indexes are not worth building
+LOCAL_ANN_MIN_VECTORS = int(os.getenv("LOCAL_ANN_MIN_VECTORS", 2048))
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.jsonl"
+LOCK_FILE = ".lock"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class LocalNamespace:
+    """
+    One (index, namespace) partition stored as a float32 matrix of unit
+    vectors (vectors.npy, memory-mapped on load) plus a metadata.jsonl file
+    with one {"id", "text", "filename"} record per row.
+
+    Files are rewritten atomically on every change; readers in other workers
+    pick up the new version on their next query by comparing mtimes. Writers
+    hold an exclusive flock on .lock for the whole load-modify-write, so
+    concurrent upserts from different uvicorn workers never overwrite each
+    other, and readers load both files under a shared flock, so they never
+    pair one version's vectors with another version's metadata.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.vectors: Optional[np.ndarray] = None
+        self.metadata: List[Dict[str, Any]] = []
+        self._version: Optional[Tuple[int, int]] = None
+        self._ivf: Optional[Tuple[np.ndarray, List[np.ndarray]]] = None
+        self._hnsw = None
+        self._lock = threading.Lock()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, VECTORS_FILE)
+
+    @property
+    def _metadata_path(self) -> str:
+        return os.path.join(self.directory, METADATA_FILE)
+
+    @contextmanager
+    def _flock(self, operation: int):
+        """Inter-process lock on the namespace directory (LOCK_EX or LOCK_SH)."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def _write_lock(self):
+        """Thread lock plus an exclusive inter-process lock on the namespace directory."""
+        with self._lock, self._flock(fcntl.LOCK_EX):
+            yield
+
+    def _current_version(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._metadata_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load_if_changed(self, locked: bool = False) -> None:
+        """
+        Reload the files if another worker replaced them. Callers already
+        holding the exclusive flock pass locked=True; everyone else loads under
+        a shared flock, so no writer can swap a file between the two reads.
+        """
+        version = self._current_version()
+        if version is None:
+            self.vectors, self.metadata, self._version = None, [], None
+            self._ivf = self._hnsw = None
+            return
+        if version == self._version:
+            return
+
+        with nullcontext() if locked else self._flock(fcntl.LOCK_SH):
+            version = self._current_version()
+            vectors = np.load(self._vectors_path, mmap_mode="r")
+            with open(self._metadata_path, "r", encoding="utf-8") as f:
+                metadata = [json.loads(line) for line in f if line.strip()]
+
+        if vectors.shape[0] != len(metadata):
+            raise RuntimeError(
+                f"Local vector store {self.directory} is inconsistent: "
+                f"{vectors.shape[0]} vectors but {len(metadata)} metadata records"
+            )
+        self.vectors, self.metadata, self._version = vectors, metadata, version
+        self._ivf = self._hnsw = None
+        logger.info(f"Loaded {len(self.metadata)} vectors from {self.directory}")
+
+    def _write(self, vectors: np.ndarray, metadata: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_vectors = self._vectors_path + ".tmp.npy"
+        tmp_metadata = self._metadata_path + ".tmp"
+        np.save(tmp_vectors, vectors.astype(np.float32))
+        with open(tmp_metadata, "w", encoding="utf-8") as f:
+            for record in metadata:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # Vectors first: the metadata mtime is the version readers check
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_metadata, self._metadata_path)
+        self._version = None
+
+    def upsert(self, records: List[Dict[str, Any]], vectors: List[List[float]]) -> None:
+        with self._write_lock():
+            self._load_if_changed(locked=True)
+            new_vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+            new_ids = {record["id"] for record in records}
+            keep = [i for i, record in enumerate(self.metadata) if record["id"] not in new_ids]
+            if self.vectors is not None and keep:
+                merged = np.vstack([np.asarray(self.vectors[keep]), new_vectors])
+            else:
+                merged = new_vectors
+            self._write(merged, [self.metadata[i] for i in keep] + records)
+
+    def delete(self, filename: Optional[str] = None, ids: Optional[List[str]] = None) -> int:
+        with self._write_lock():
+            self._load_if_changed(locked=True)
+            if self.vectors is None:
+                return 0
+            ids = set(ids or [])
+            keep = [
+                i for i, record in enumerate(self.metadata)
+                if record.get("filename") != filename and record["id"] not in ids
+            ]
+            removed = len(self.metadata) - len(keep)
+            if removed:
+                dimension = self.vectors.shape[1]
+                vectors = np.asarray(self.vectors[keep]) if keep else np.empty((0, dimension), dtype=np.float32)
+                self._write(vectors, [self.metadata[i] for i in keep])
+            return removed
+
+    def ids(self, filename: Optional[str] = None) -> List[str]:
+        """Stored IDs, optionally only those of one file."""
+        with self._lock:
+            self._load_if_changed()
+            return [
+                record["id"] for record in self.metadata
+                if filename is None or record.get("filename") == filename
+            ]
+
+    def search(
+        self,
+        query_vector: List[float],
+        top_k: int,
+        mode: str = "exact",
+        include_values: bool = False
+    ) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """
+        Return (row, score, metadata) for the top_k rows. With include_values the
+        metadata is a copy that also carries the stored (normalized) vector.
+        """
+        with self._lock:
+            self._load_if_changed()
+            if self.vectors is None or len(self.metadata) == 0:
+                return []
+            query = _normalize(np.asarray([query_vector], dtype=np.float32))[0]
+            top_k = min(top_k, len(self.metadata))
+
+            if mode == "hnsw" and len(self.metadata) >= LOCAL_ANN_MIN_VECTORS:
+                rows, scores = self._search_hnsw(query, top_k)
+            elif mode == "ivf" and len(self.metadata) >= LOCAL_ANN_MIN_VECTORS:
+                rows, scores = self._search_ivf(query, top_k)
+            else:
+                rows, scores = self._search_exact(self.vectors, query, top_k)
+
+            if include_values:
+                return [
+                    (int(row), float(score), {**self.metadata[row], "values": self.vectors[row].tolist()})
+                    for row, score in zip(rows, scores)
+                ]
+            return [(int(row), float(score), self.metadata[row]) for row, score in zip(rows, scores)]
+
+    @staticmethod
+    def _search_exact(vectors: np.ndarray, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = vectors @ query
+        if top_k < len(scores):
+            rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            rows = np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows])]
+        return rows, scores[rows]
+
+    def _search_ivf(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self._ivf is None:
+            self._ivf = self._build_ivf()
+        centroids, lists = self._ivf
+        nprobe = min(LOCAL_IVF_NPROBE, len(centroids))
+        probes = np.argsort(-(centroids @ query))[:nprobe]
+        candidates = np.concatenate([lists[p] for p in probes])
+        if len(candidates) < top_k:
+            return self._search_exact(self.vectors, query, top_k)
+        rows, scores = self._search_exact(np.asarray(self.vectors[candidates]), query, top_k)
+        return candidates[rows], scores
+
+    def _build_ivf(self, iterations: int = 10) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """Spherical k-means coarse quantizer with ~sqrt(n) inverted lists."""
+        vectors = np.asarray(self.vectors)
+        nlist = max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = vectors[assignments == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        lists = [np.flatnonzero(assignments == c) for c in range(nlist)]
+        logger.info(f"Built IVF index with {nlist} lists over {len(vectors)} vectors")
+        return centroids, lists
+
+    def _search_hnsw(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if hnswlib is None:
+            logger.warning("hnswlib is not installed, falling back to exact search")
+            return self._search_exact(self.vectors, query, top_k)
+        if self._hnsw is None:
+            vectors = np.asarray(self.vectors)
+            index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+            index.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+            index.add_items(vectors, np.arange(len(vectors)))
+            index.set_ef(max(64, top_k * 4))
+            self._hnsw = index
+        labels, distances = self._hnsw.knn_query(query, k=top_k)
+        # hnswlib's "ip" distance is 1 - inner product
+        return labels[0], 1.0 - distances[0]
+
+
+class LocalVectorStore:
+    """Registry of LocalNamespace partitions rooted at LOCAL_VECTOR_STORE_PATH."""
+
+    def __init__(self, root: str = LOCAL_VECTOR_STORE_PATH):
+        self.root = root
+        self._namespaces: Dict[Tuple[str, str], LocalNamespace] = {}
+        self._lock = threading.Lock()
+
+    def namespace(self, index_name: str, namespace: str = "") -> LocalNamespace:
+        key = (index_name, namespace or "")
+        with self._lock:
+            if key not in self._namespaces:
+                directory = os.path.join(self.root, index_name, namespace or "_default")
+                self._namespaces[key] = LocalNamespace(directory)
+            return self._namespaces[key]
+
+
+local_vector_store = LocalVectorStore()
@@ -0,0 +1,61 @@
+# chatbot/services/retrieval/vectorstores/local/upsert.py
+from chatbot.services.embedding_pipeline import embedding_pipeline
+from chatbot.services.retrieval.vectorstores.local.store import local_vector_store
+from chatbot.services.retrieval.result_cache import bump_generation
+from chatbot.services.retrieval.vectorstores.chunk_ids import filenames_of, plan_chunk_sync
+import tiktoken
+from typing import List, Optional, Tuple
+
+tokenizer = tiktoken.get_encoding("cl100k_base")
+
+def upsert_chunks(
+    chunks: List[Tuple[str, str]],
+    index_name: str,
+    namespace: str = "",
+    token_counts: Optional[List[int]] = None
+):
+    """
+    Upsert chunks with associated filenames into the local vector store.
+    Record IDs are derived from (filename, chunk text), so only chunks that
+    are not stored yet are embedded and written, and rows of the same files
+    that are no longer produced (including ones with random IDs from earlier
+    upserts) are deleted.
+    Args:
+        chunks: List of tuples (chunk_text, filename)
+        index_name: Name of the local index (a directory under LOCAL_VECTOR_STORE_PATH)
+        namespace: Namespace within the index
+        token_counts: Optional per-chunk token counts from the splitter
+    """
+    store = local_vector_store.namespace(index_name, namespace)
+    existing = {filename: set(store.ids(filename=filename)) for filename in filenames_of(chunks)}
+    plan = plan_chunk_sync(chunks, existing)
+
+    if plan.new:
+        new_texts = [chunks[position][0] for position, _ in plan.new]
+        embeddings = embedding_pipeline.embed(new_texts, model="text-embedding-3-large")
+        if token_counts is None:
+            new_counts = [len(tokens) for tokens in tokenizer.encode_batch(new_texts)]
+        else:
+            new_counts = [token_counts[position] for position, _ in plan.new]
+
+        records = [
+            {"id": cid, "text": chunks[position][0], "filename": chunks[position][1], "token_count": token_count}
+            for (position, cid), token_count in zip(plan.new, new_counts)
+        ]
+        store.upsert(records, embeddings)
+
+    # Stale rows go only after their replacements are written
+    if plan.stale:
+        store.delete(ids=plan.stale)
+
+    bump_generation("local", index_name, namespace)
+    print(f"Synced {len(chunks)} chunks to local store (index={index_name}, namespace='{namespace}'): {plan.summary()}.")
+    return plan
+
+
+def delete_vectors_by_filename(filename: str, index_name: str, namespace: str = "pdf_files"):
+    """Delete all local vectors associated with a specific filename."""
+    removed = local_vector_store.namespace(index_name, namespace).delete(filename=filename)
+    bump_generation("local", index_name, namespace)
+    print(f"Deleted {removed} local vectors with filename '{filename}' from index '{index_name}', namespace '{namespace}'")
+    return {"deleted": removed}
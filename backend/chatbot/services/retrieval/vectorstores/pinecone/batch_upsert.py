@@ -0,0 +1,137 @@
+# chatbot/services/retrieval/vectorstores/pinecone/batch_upsert.py
+import os
+import json
+import time
+import random
+import logging
+from collections import deque
+from typing import Any, Dict, List, Sequence, Tuple, Union
+from dotenv import load_dotenv
+
+from chatbot.services.retrieval.vectorstores.pinecone.client import PINECONE_POOL_THREADS
+
+load_dotenv()
+
+logger = logging.getLogger("pinecone_batch_upsert")
+logger.setLevel(logging.INFO)
+
+# Pinecone rejects upsert requests over 2MB or 1000 vectors; stay below the byte limit
+PINECONE_UPSERT_MAX_BYTES = int(os.getenv("PINECONE_UPSERT_MAX_BYTES", 1800000))
+PINECONE_UPSERT_MAX_VECTORS = int(os.getenv("PINECONE_UPSERT_MAX_VECTORS", 1000))
+# Requests in flight at once; they run on the index's async_req thread pool
+PINECONE_UPSERT_CONCURRENCY = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", PINECONE_POOL_THREADS))
+PINECONE_UPSERT_RETRIES = int(os.getenv("PINECONE_UPSERT_RETRIES", 2))
+
+# Either {"id", "values", "metadata"} dicts or (id, values, metadata) tuples
+Vector = Union[Dict[str, Any], Tuple[str, List[float], Dict[str, Any]]]
+
+
+def _parts(vector: Vector) -> Tuple[str, List[float], Dict[str, Any]]:
+    if isinstance(vector, dict):
+        return vector["id"], vector["values"], vector.get("metadata") or {}
+    return vector[0], vector[1], vector[2] if len(vector) > 2 else {}
+
+
+def make_batches(
+    vectors: Sequence[Vector],
+    max_bytes: int = PINECONE_UPSERT_MAX_BYTES,
+    max_vectors: int = PINECONE_UPSERT_MAX_VECTORS
+) -> List[Tuple[List[Vector], int]]:
+    """
+    Group vectors into (batch, estimated bytes) by request payload size.
+    The JSON size of the values is measured on the first vector and scaled by
+    dimension for the rest; ids and metadata are measured per vector.
+    """
+    batches: List[Tuple[List[Vector], int]] = []
+    if not vectors:
+        return batches
+
+    _, sample_values, _ = _parts(vectors[0])
+    bytes_per_value = len(json.dumps(sample_values)) / max(1, len(sample_values))
+
+    batch: List[Vector] = []
+    batch_bytes = 0
+    for vector in vectors:
+        vector_id, values, metadata = _parts(vector)
+        size = int(len(values) * bytes_per_value) + len(json.dumps(metadata)) + len(vector_id) + 64
+        if batch and (batch_bytes + size > max_bytes or len(batch) >= max_vectors):
+            batches.append((batch, batch_bytes))
+            batch, batch_bytes = [], 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        batches.append((batch, batch_bytes))
+    return batches
+
+
+def _upsert_with_retry(index, batch: List[Vector], namespace: str, failed: Exception) -> None:
+    """Retry a batch whose async request failed, synchronously with backoff."""
+    for attempt in range(PINECONE_UPSERT_RETRIES):
+        delay = (2 ** attempt) * (1 + random.random())
+        logger.warning(f"Upsert of {len(batch)} vectors failed ({failed}); retrying in {delay:.1f}s")
+        time.sleep(delay)
+        try:
+            index.upsert(vectors=batch, namespace=namespace)
+            return
+        except Exception as e:
+            failed = e
+    raise failed
+
+
+def parallel_upsert(
+    index,
+    vectors: Sequence[Vector],
+    namespace: str = "",
+    max_bytes: int = PINECONE_UPSERT_MAX_BYTES,
+    max_vectors: int = PINECONE_UPSERT_MAX_VECTORS,
+    concurrency: int = PINECONE_UPSERT_CONCURRENCY
+) -> Dict[str, float]:
+    """
+    Upsert vectors in byte-sized batches, keeping up to concurrency requests
+    in flight with async_req, and return throughput stats. If a batch fails
+    its retries, no further batches are sent and the error is raised once
+    the requests in flight have finished.
+    """
+    batches = make_batches(vectors, max_bytes=max_bytes, max_vectors=max_vectors)
+    started = time.monotonic()
+    pending = deque()
+
+    def wait_oldest() -> None:
+        batch, request = pending.popleft()
+        try:
+            request.get()
+        except Exception as e:
+            _upsert_with_retry(index, batch, namespace, e)
+
+    try:
+        for batch, _ in batches:
+            if len(pending) >= concurrency:
+                wait_oldest()
+            pending.append((batch, index.upsert(vectors=batch, namespace=namespace, async_req=True)))
+        while pending:
+            wait_oldest()
+    except Exception:
+        # Requests already sent keep writing; wait for them so the caller's
+        # cleanup does not race the last writes, then report the first failure
+        while pending:
+            batch, request = pending.popleft()
+            try:
+                request.get()
+            except Exception as e:
+                logger.warning(f"Upsert of {len(batch)} vectors also failed: {str(e)}")
+        raise
+
+    elapsed = time.monotonic() - started
+    stats = {
+        "vectors": len(vectors),
+        "batches": len(batches),
+        "bytes": sum(size for _, size in batches),
+        "seconds": round(elapsed, 3),
+        "vectors_per_second": round(len(vectors) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    if vectors:
+        logger.info(
+            f"Upserted {stats['vectors']} vectors to namespace '{namespace}' in {stats['batches']} batches "
+            f"(~{stats['bytes'] / 1e6:.1f} MB) in {elapsed:.2f}s ({stats['vectors_per_second']} vectors/s)"
+        )
+    return stats
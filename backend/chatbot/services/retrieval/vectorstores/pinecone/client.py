@@ -0,0 +1,95 @@
+# chatbot/services/retrieval/vectorstores/pinecone/client.py
+import os
+import time
+import logging
+import threading
+from typing import Dict, Iterable, Set
+from pinecone import Pinecone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("pinecone_client")
+logger.setLevel(logging.INFO)
+
+# Threads used by async_req/parallel requests and the size of the urllib3
+# connection pool each Index keeps alive. The pool should be at least as
+# large as the number of threads so concurrent calls reuse open connections.
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", 8))
+PINECONE_CONNECTION_POOL_MAXSIZE = int(os.getenv("PINECONE_CONNECTION_POOL_MAXSIZE", 16))
+# Indexes checked (and created if missing) once on startup
+PINECONE_INDEXES = [name.strip() for name in os.getenv("PINECONE_INDEXES", "pdf-vectors").split(",") if name.strip()]
+
+
+class PineconeIndexRegistry:
+    """
+    Single Pinecone client for the process with cached Index handles.
+
+    pinecone.Index(name) resolves the index host with a control-plane call and
+    builds a new HTTP pool every time, so handles are created once per name
+    and reused. Index existence is checked once per name as well.
+    """
+
+    def __init__(
+        self,
+        pool_threads: int = PINECONE_POOL_THREADS,
+        connection_pool_maxsize: int = PINECONE_CONNECTION_POOL_MAXSIZE
+    ):
+        self.client = Pinecone(api_key=os.getenv("PINECONE_API_KEY"), pool_threads=pool_threads)
+        self.pool_threads = pool_threads
+        self.connection_pool_maxsize = connection_pool_maxsize
+        self._indexes: Dict[str, object] = {}
+        self._ensured: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def get_index(self, index_name: str):
+        index = self._indexes.get(index_name)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._indexes.get(index_name)
+            if index is None:
+                index = self.client.Index(
+                    index_name,
+                    pool_threads=self.pool_threads,
+                    connection_pool_maxsize=self.connection_pool_maxsize
+                )
+                self._indexes[index_name] = index
+                logger.info(f"Connected to Pinecone index '{index_name}'")
+        return index
+
+    def ensure_index(self, index_name: str, dimension: int = 3072):
+        """Return the index handle, creating the index first if it does not exist yet."""
+        if index_name in self._ensured:
+            return self.get_index(index_name)
+
+        with self._lock:
+            if index_name not in self._ensured:
+                if not self.client.has_index(index_name):
+                    self.client.create_index(
+                        name=index_name,
+                        dimension=dimension,
+                        metric="cosine",
+                        spec={"cloud": "aws", "region": "us-east-1"}
+                    )
+                    print(f"Created Pinecone index '{index_name}'.")
+                    self._wait_until_ready(index_name)
+                self._ensured.add(index_name)
+
+        return self.get_index(index_name)
+
+    def _wait_until_ready(self, index_name: str, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = self.client.describe_index(index_name).status
+            if status and status.get("ready"):
+                return
+            time.sleep(1)
+        logger.warning(f"Pinecone index '{index_name}' not ready after {timeout}s")
+
+    def warm_up(self, index_names: Iterable[str] = PINECONE_INDEXES, dimension: int = 3072) -> None:
+        for index_name in index_names:
+            self.ensure_index(index_name, dimension=dimension)
+
+
+pinecone_registry = PineconeIndexRegistry()
@@ -1,40 +1,42 @@
 # chatbot/services/retrieval/vectorstores/pinecone/query.py
-from pinecone import Pinecone
-from openai import OpenAI
+import asyncio
+from chatbot.services.openai_service import embed_texts
+from chatbot.services.embedding_batcher import embedding_batcher
+from chatbot.services.retrieval.vectorstores.pinecone.client import pinecone_registry
 from typing import List, Dict, Any
-import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-pinecone = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-
 class PineconeQuery:
     def __init__(self, index_name: str = None, namespace: str = ""):
-        self.index = pinecone.Index(index_name)
+        self.index = pinecone_registry.get_index(index_name)
         self.namespace = namespace
 
     def embed_query(self, query: str) -> List[float]:
         try:
-            resp = openai.embeddings.create(
-                model="text-embedding-3-large",
-                input=query
-            )
-            return resp.data[0].embedding
+            return embed_texts([query], model="text-embedding-3-large")[0]
         except Exception as e:
             print(f"Error extracting embedding: {str(e)}")
             raise
 
     def query(self, user_query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         query_vector = self.embed_query(user_query)
+        return self.query_by_vector(query_vector, top_k=top_k)
+
+    async def aquery(self, user_query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Non-blocking variant of query: async embedding, Pinecone call in a worker thread."""
+        query_vector = await embedding_batcher.embed(user_query, model="text-embedding-3-large")
+        return await asyncio.to_thread(self.query_by_vector, query_vector, top_k)
 
+    def query_by_vector(self, query_vector: List[float], top_k: int = 5, include_values: bool = False) -> List[Dict[str, Any]]:
         try:
             results = self.index.query(
                 vector=query_vector,
                 top_k=top_k,
                 namespace=self.namespace,
-                include_metadata=True
+                include_metadata=True,
+                include_values=include_values
             )
             
             results_with_scores = []
@@ -43,13 +45,23 @@ class PineconeQuery:
                     text = match.metadata.get('text', '') if match.metadata else ''
                     filename = match.metadata.get('filename', 'unknown') if match.metadata else 'unknown'
                     score = match.score if hasattr(match, 'score') else 0.0
-                    results_with_scores.append({"text": text, "score": score, "filename": filename})
+                    result = {"text": text, "score": score, "filename": filename}
+                    if match.metadata and match.metadata.get('token_count'):
+                        result["token_count"] = int(match.metadata['token_count'])
+                    if include_values:
+                        result["values"] = list(match.values or [])
+                    results_with_scores.append(result)
             elif isinstance(results, dict) and 'matches' in results:
                 for match in results['matches']:
                     text = match['metadata'].get('text', '') if 'metadata' in match else ''
                     filename = match['metadata'].get('filename', 'unknown') if 'metadata' in match else 'unknown'
                     score = match.get('score', 0.0)
-                    results_with_scores.append({"text": text, "score": score, "filename": filename})
+                    result = {"text": text, "score": score, "filename": filename}
+                    if 'metadata' in match and match['metadata'].get('token_count'):
+                        result["token_count"] = int(match['metadata']['token_count'])
+                    if include_values:
+                        result["values"] = match.get('values', [])
+                    results_with_scores.append(result)
             
             return results_with_scores
             
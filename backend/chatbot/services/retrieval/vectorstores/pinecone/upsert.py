@@ -1,72 +1,224 @@
 # chatbot/services/retrieval/vectorstores/pinecone/upsert.py
-from openai import OpenAI
-from pinecone import Pinecone
-import uuid
-import time
-from typing import List, Tuple
+from chatbot.services.embedding_pipeline import embedding_pipeline
+from chatbot.services.retrieval.vectorstores.pinecone.client import pinecone_registry
+from chatbot.services.retrieval.vectorstores.pinecone.batch_upsert import parallel_upsert
+from chatbot.services.retrieval.result_cache import bump_generation
+from chatbot.services.retrieval.vectorstores.chunk_ids import (
+    CONTENT_ID_FLAG, ChunkSyncPlan, chunk_id, document_prefix, filenames_of, plan_chunk_sync
+)
+import tiktoken
+from typing import Dict, List, Optional, Set, Tuple
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
-openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-pinecone = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+tokenizer = tiktoken.get_encoding("cl100k_base")
+
 
 def get_pinecone_index(index_name: str, dimension: int = 3072):
     try:
-        if not pinecone.has_index(index_name):
-            pinecone.create_index(
-                name=index_name,
-                dimension=dimension,
-                metric="cosine",
-                spec={"cloud": "aws", "region": "us-east-1"}
-            )
-            print(f"Created Pinecone index '{index_name}'.")
-            time.sleep(10)
-        else:
-            print(f"Index '{index_name}' already exists.")
-        
-        return pinecone.Index(index_name)
-    
+        return pinecone_registry.ensure_index(index_name, dimension=dimension)
     except Exception as e:
         print(f"Error with Pinecone index: {str(e)}")
         raise
 
-def upsert_chunks(chunks: List[Tuple[str, str]], index_name: str, namespace: str = ""):
+def list_chunk_ids(index, filename: str, namespace: str = "") -> Set[str]:
+    """IDs of the chunks stored for a file, listed by their shared ID prefix."""
+    ids: Set[str] = set()
+    for page in index.list(prefix=document_prefix(filename), namespace=namespace):
+        ids.update(page)
+    return ids
+
+
+def _clear_legacy_vectors(index, filename: str, namespace: str) -> None:
     """
-    Upsert chunks with associated filenames.
-    Args:
-        chunks: List of tuples (chunk_text, filename)
-        index_name: Name of the Pinecone index
-        namespace: Pinecone namespace
+    Delete a file's vectors that lack CONTENT_ID_FLAG. They were written with
+    random IDs, cannot be listed by prefix and would linger next to the new ones.
     """
-    index = get_pinecone_index(index_name=index_name, dimension=3072)
+    try:
+        index.delete(
+            namespace=namespace,
+            filter={"filename": {"$eq": filename}, CONTENT_ID_FLAG: {"$exists": False}}
+        )
+    except Exception as e:
+        print(f"Warning: could not clear previous vectors for '{filename}': {str(e)}")
 
-    # Extract chunk texts for embedding
-    chunk_texts = [chunk[0] for chunk in chunks]
-    embedding_resp = openai.embeddings.create(
-        model="text-embedding-3-large",
-        input=chunk_texts
-    )
-    embeddings = [r.embedding for r in embedding_resp.data]
+
+def _existing_chunk_ids(index, chunks: List[Tuple[str, str]], namespace: str) -> Dict[str, Set[str]]:
+    """List each file's stored chunk IDs, clearing its legacy random-ID vectors on the way."""
+    existing = {}
+    for filename in filenames_of(chunks):
+        existing[filename] = list_chunk_ids(index, filename, namespace)
+        _clear_legacy_vectors(index, filename, namespace)
+    return existing
+
+
+def _write_vectors(
+    index,
+    items: List[Tuple[str, str, str, Optional[int]]],
+    embeddings: List[List[float]],
+    namespace: str
+) -> None:
+    """
+    Write (chunk_id, chunk_text, filename, token_count) items with their
+    embeddings. Token counts from the splitter are used as given; only
+    missing ones are computed here.
+    """
+    uncounted = [i for i, item in enumerate(items) if item[3] is None]
+    token_counts = [item[3] for item in items]
+    for i, tokens in zip(uncounted, tokenizer.encode_batch([items[i][1] for i in uncounted])):
+        token_counts[i] = len(tokens)
 
     # Create vectors with metadata including filename
     vectors_to_upsert = []
-    for (chunk_text, filename), vector in zip(chunks, embeddings):
-        chunk_id = str(uuid.uuid4())
+    for (cid, chunk_text, filename, _), vector, token_count in zip(items, embeddings, token_counts):
         vectors_to_upsert.append({
-            "id": chunk_id,
+            "id": cid,
             "values": vector,
-            "metadata": {"text": chunk_text, "filename": filename}
+            "metadata": {"text": chunk_text, "filename": filename, "token_count": token_count, CONTENT_ID_FLAG: True}
         })
     
-    # Batch upsert
-    batch_size = 100
-    for i in range(0, len(vectors_to_upsert), batch_size):
-        batch = vectors_to_upsert[i:i+batch_size]
-        index.upsert(vectors=batch, namespace=namespace)
+    # Byte-sized batches, sent concurrently
+    parallel_upsert(index, vectors_to_upsert, namespace=namespace)
+
+
+def write_chunk_vectors(
+    chunks: List[Tuple[str, str]],
+    embeddings: List[List[float]],
+    index_name: str,
+    namespace: str = "",
+    token_counts: Optional[List[int]] = None
+):
+    """
+    Write embedded chunks under their deterministic IDs without diffing or
+    deleting anything; used to stream batches in while the rest is embedded.
+    """
+    index = get_pinecone_index(index_name=index_name, dimension=3072)
+    counts = token_counts or [None] * len(chunks)
+    items = [
+        (chunk_id(filename, chunk_text), chunk_text, filename, count)
+        for (chunk_text, filename), count in zip(chunks, counts)
+    ]
+    _write_vectors(index, items, embeddings, namespace)
+
+
+def _sync_chunks(
+    index,
+    chunks: List[Tuple[str, str]],
+    index_name: str,
+    namespace: str,
+    embeddings: Optional[List[List[float]]] = None,
+    token_counts: Optional[List[int]] = None,
+    existing_ids: Optional[Dict[str, Set[str]]] = None
+) -> ChunkSyncPlan:
+    """
+    Write the chunks not yet stored and delete the file's chunks that are gone.
+    Without precomputed embeddings, new chunks go through the embedding
+    pipeline and each batch is written as soon as it is embedded. Callers that
+    already know the stored IDs pass existing_ids: list() lags behind recent
+    writes, so listing again right after streaming batches in would miss them.
+    """
+    if existing_ids is None:
+        existing_ids = _existing_chunk_ids(index, chunks, namespace)
+    plan = plan_chunk_sync(chunks, existing_ids)
+    items = [
+        (cid, *chunks[position], token_counts[position] if token_counts else None)
+        for position, cid in plan.new
+    ]
+
+    if embeddings is not None:
+        _write_vectors(index, items, [embeddings[position] for position, _ in plan.new], namespace)
+    elif items:
+        embedding_pipeline.embed(
+            [item[1] for item in items],
+            model="text-embedding-3-large",
+            on_batch=lambda positions, vectors: _write_vectors(index, [items[p] for p in positions], vectors, namespace)
+        )
+
+    # Stale chunks go only after their replacements are written
+    for i in range(0, len(plan.stale), 1000):
+        index.delete(ids=plan.stale[i:i+1000], namespace=namespace)
     
-    print(f"Successfully upserted {len(chunks)} chunks to Pinecone (index={index_name}, namespace='{namespace}').")
+    bump_generation("pinecone", index_name, namespace)
+    print(f"Synced {len(chunks)} chunks to Pinecone (index={index_name}, namespace='{namespace}'): {plan.summary()}.")
+    return plan
+
+
+def upsert_chunks(
+    chunks: List[Tuple[str, str]],
+    index_name: str,
+    namespace: str = "",
+    token_counts: Optional[List[int]] = None
+):
+    """
+    Upsert chunks with associated filenames.
+    Chunk IDs are derived from (filename, chunk text), so only chunks that are
+    not stored yet are embedded and written, and chunks of the same files that
+    are no longer produced are deleted.
+    Args:
+        chunks: List of tuples (chunk_text, filename)
+        index_name: Name of the Pinecone index
+        namespace: Pinecone namespace
+        token_counts: Optional per-chunk token counts from the splitter
+    """
+    index = get_pinecone_index(index_name=index_name, dimension=3072)
+    return _sync_chunks(index, chunks, index_name, namespace, token_counts=token_counts)
+
+
+def upsert_embedded_chunks(
+    chunks: List[Tuple[str, str]],
+    embeddings: List[List[float]],
+    index_name: str,
+    namespace: str = "",
+    token_counts: Optional[List[int]] = None,
+    existing_ids: Optional[Dict[str, Set[str]]] = None
+):
+    """
+    Upsert chunks whose embeddings were already computed; chunks already
+    stored are skipped and stale chunks of the same files deleted.
+    Args:
+        chunks: List of tuples (chunk_text, filename)
+        embeddings: One embedding per chunk, in the same order
+        index_name: Name of the Pinecone index
+        namespace: Pinecone namespace
+        token_counts: Optional per-chunk token counts from the splitter
+        existing_ids: Stored chunk IDs per filename, if known; listed otherwise
+    """
+    index = get_pinecone_index(index_name=index_name, dimension=3072)
+    return _sync_chunks(
+        index, chunks, index_name, namespace,
+        embeddings=embeddings, token_counts=token_counts, existing_ids=existing_ids
+    )
+
+
+def fetch_stored_embeddings(
+    chunks: List[Tuple[str, str]],
+    index_name: str,
+    namespace: str = ""
+) -> Tuple[Dict[int, List[float]], Dict[str, Set[str]]]:
+    """
+    Embeddings of chunks that are already stored, keyed by position in chunks,
+    so re-indexing an edited document only embeds the chunks that changed,
+    and the stored chunk IDs per filename, to hand to the final sync.
+    Like a sync, this clears legacy random-ID vectors of the files, so chunks
+    streamed in with write_chunk_vectors do not sit next to them.
+    """
+    index = get_pinecone_index(index_name=index_name, dimension=3072)
+    existing = _existing_chunk_ids(index, chunks, namespace)
+    positions_by_id: Dict[str, List[int]] = {}
+    for position, (chunk_text, filename) in enumerate(chunks):
+        cid = chunk_id(filename, chunk_text)
+        if cid in existing[filename]:
+            positions_by_id.setdefault(cid, []).append(position)
+
+    stored = {}
+    ids = list(positions_by_id)
+    for i in range(0, len(ids), 100):
+        response = index.fetch(ids=ids[i:i+100], namespace=namespace)
+        for cid, vector in response.vectors.items():
+            for position in positions_by_id.get(cid, []):
+                stored[position] = list(vector.values)
+    return stored, existing
 
 
 def delete_vectors_by_filename(filename: str, index_name: str, namespace: str = "pdf_files"):
@@ -83,7 +235,7 @@ def delete_vectors_by_filename(filename: str, index_name: str, namespace: str =
     """
     try:
         # Get Pinecone index
-        index = pinecone.Index(index_name)
+        index = pinecone_registry.get_index(index_name)
         
         # Create a metadata filter for the filename
         filter_dict = {"filename": {"$eq": filename}}
@@ -98,8 +250,19 @@ def delete_vectors_by_filename(filename: str, index_name: str, namespace: str =
             filter=filter_dict
         )
         
+        bump_generation("pinecone", index_name, namespace)
         print(f"Pinecone delete response: {response}")
         return response
     except Exception as e:
         print(f"Error deleting vectors for filename '{filename}': {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def delete_vectors_by_ids(ids: List[str], index_name: str, namespace: str = "pdf_files") -> int:
+    """Delete specific vectors, e.g. the ones a failed ingestion job wrote; returns how many were requested."""
+    index = pinecone_registry.get_index(index_name)
+    for i in range(0, len(ids), 1000):
+        index.delete(ids=ids[i:i+1000], namespace=namespace)
+    bump_generation("pinecone", index_name, namespace)
+    print(f"Deleted {len(ids)} vectors by ID from index '{index_name}', namespace '{namespace}'")
+    return len(ids)
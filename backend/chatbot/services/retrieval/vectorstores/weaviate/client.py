@@ -0,0 +1,85 @@
+# chatbot/services/retrieval/vectorstores/weaviate/client.py
+import os
+import logging
+import threading
+from typing import Dict, Optional, Set
+import weaviate
+from weaviate.classes.init import Auth
+from weaviate.classes.config import Configure
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("weaviate_client")
+logger.setLevel(logging.INFO)
+
+
+class WeaviateClientManager:
+    """
+    Process-wide Weaviate connection shared by every query and upsert.
+
+    The client is opened once (on startup or on first use) and closed on
+    shutdown, so request handlers never pay for the TLS/gRPC handshake.
+    Collection handles are cached by name.
+
+    The sync client is used because batch imports (collection.batch) are not
+    available on the v4 async client; blocking calls are run in threads by
+    the callers.
+    """
+
+    def __init__(self):
+        self._client: Optional[weaviate.WeaviateClient] = None
+        self._collections: Dict[str, object] = {}
+        self._ensured: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def connect(self) -> weaviate.WeaviateClient:
+        with self._lock:
+            if self._client is not None and self._client.is_connected():
+                return self._client
+
+            logger.info("Connecting to Weaviate")
+            self._client = weaviate.connect_to_weaviate_cloud(
+                cluster_url=os.getenv("WEAVIATE_URL"),
+                auth_credentials=Auth.api_key(os.getenv("WEAVIATE_API_KEY")),
+                headers={"X-OpenAI-Api-Key": os.getenv("OPENAI_API_KEY")}
+            )
+            self._collections = {}
+            self._ensured = set()
+            return self._client
+
+    def get_collection(self, collection_name: str, create: bool = False, dimension: int = 3072):
+        """Return a cached collection handle, optionally creating the collection."""
+        client = self.connect()
+        collection = self._collections.get(collection_name)
+        if collection is not None and (not create or collection_name in self._ensured):
+            return collection
+
+        if create and not client.collections.exists(collection_name):
+            print(f"Creating Weaviate collection '{collection_name}'")
+            collection = client.collections.create(
+                name=collection_name,
+                vectorizer_config=Configure.Vectorizer.text2vec_openai(
+                    model="text-embedding-3-large",
+                    dimensions=dimension
+                )
+            )
+            print(f"Created Weaviate collection '{collection_name}'")
+        else:
+            collection = client.collections.get(collection_name)
+
+        if create:
+            self._ensured.add(collection_name)
+        self._collections[collection_name] = collection
+        return collection
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self._collections = {}
+            self._ensured = set()
+
+
+weaviate_manager = WeaviateClientManager()
@@ -1,27 +1,15 @@
 # chatbot/services/retrieval/vectorstores/weaviate/query.py
-import weaviate
-from weaviate.classes.init import Auth
 from weaviate.classes.query import HybridFusion, MetadataQuery
 from typing import List, Dict, Any, Optional
-import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from chatbot.services.openai_service import embed_texts
+from chatbot.services.retrieval.vectorstores.weaviate.client import weaviate_manager
 
 load_dotenv()
 
 class WeaviateQuery:
     def __init__(self, collection_name: str):
-        wcd_url = os.getenv("WEAVIATE_URL")
-        wcd_api_key = os.getenv("WEAVIATE_API_KEY")
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        
-        self.client = weaviate.connect_to_weaviate_cloud(
-            cluster_url=wcd_url,
-            auth_credentials=Auth.api_key(wcd_api_key),
-            headers={"X-OpenAI-Api-Key": openai_api_key}
-        )
-        
-        self.collection = self.client.collections.get(collection_name)
+        self.collection = weaviate_manager.get_collection(collection_name)
     
     def query(self, user_query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         try:
@@ -51,14 +39,11 @@ class WeaviateQuery:
                     top_k: int = 5,
                     alpha: float = 0.5,
                     fusion_type: Optional[str] = None,
-                    query_properties: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+                    query_properties: Optional[List[str]] = None,
+                    query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         try:
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            embedding_response = client.embeddings.create(
-                model="text-embedding-3-large",
-                input=user_query
-            )
-            query_vector = embedding_response.data[0].embedding
+            if query_vector is None:
+                query_vector = embed_texts([user_query], model="text-embedding-3-large")[0]
             
             hybrid_params = {
                 "query": user_query,
@@ -91,5 +76,5 @@ class WeaviateQuery:
             raise
     
     def close(self):
-        if hasattr(self, 'client'):
-            self.client.close()
\ No newline at end of file
+        # The client is shared by the whole process and closed on shutdown
+        pass
\ No newline at end of file
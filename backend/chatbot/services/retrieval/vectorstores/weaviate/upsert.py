@@ -1,72 +1,73 @@
 # chatbot/services/retrieval/vectorstores/weaviate/upsert.py
-from openai import OpenAI
-import weaviate
-from weaviate.classes.init import Auth
-from weaviate.classes.config import Configure
-from typing import List, Tuple
-import uuid
-import os
+from chatbot.services.embedding_pipeline import embedding_pipeline
+from chatbot.services.retrieval.vectorstores.weaviate.client import weaviate_manager
+from chatbot.services.retrieval.result_cache import bump_generation
+from chatbot.services.retrieval.vectorstores.chunk_ids import chunk_uuid, filenames_of, plan_chunk_sync
+from weaviate.classes.query import Filter
+from typing import List, Set, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
-openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 def get_weaviate_collection(collection_name: str, dimension: int = 3072):
     try:
-        wcd_url = os.getenv("WEAVIATE_URL")
-        wcd_api_key = os.getenv("WEAVIATE_API_KEY")
-        
-        client = weaviate.connect_to_weaviate_cloud(
-            cluster_url=wcd_url,
-            auth_credentials=Auth.api_key(wcd_api_key),
-        )
-        
-        try:
-            collection = client.collections.get(collection_name)
-            print(f"Collection '{collection_name}' already exists")
-        except weaviate.exceptions.WeaviateEntityDoesNotExist:
-            print(f"Creating Weaviate collection '{collection_name}'")
-            collection = client.collections.create(
-                name=collection_name,
-                vectorizer_config=Configure.Vectorizer.text2vec_openai(
-                    model="text-embedding-3-large",
-                    dimensions=dimension
-                )
-            )
-            print(f"Created Weaviate collection '{collection_name}'")
-        
-        return client, collection
-    
+        return weaviate_manager.get_collection(collection_name, create=True, dimension=dimension)
     except Exception as e:
         print(f"Error with Weaviate collection: {str(e)}")
         raise
 
+def list_chunk_ids(collection, filename: str, page_size: int = 1000) -> Set[str]:
+    """UUIDs of the objects stored for a file."""
+    ids: Set[str] = set()
+    offset = 0
+    while True:
+        response = collection.query.fetch_objects(
+            filters=Filter.by_property("filename").equal(filename),
+            return_properties=[],
+            limit=page_size,
+            offset=offset
+        )
+        ids.update(str(obj.uuid) for obj in response.objects)
+        if len(response.objects) < page_size:
+            return ids
+        offset += page_size
+
+
 def upsert_chunks(chunks: List[Tuple[str, str]], collection_name: str):
     """
     Upsert chunks with associated filenames.
+    Object UUIDs are derived from (filename, chunk text), so only chunks that
+    are not stored yet are embedded and written, and objects of the same files
+    that are no longer produced (including ones with random UUIDs from earlier
+    imports) are deleted.
     Args:
         chunks: List of tuples (chunk_text, filename)
         collection_name: Name of the Weaviate collection
     """
-    client, collection = get_weaviate_collection(collection_name=collection_name, dimension=3072)
+    collection = get_weaviate_collection(collection_name=collection_name, dimension=3072)
     
     try:
-        chunk_texts = [chunk[0] for chunk in chunks]
-        embedding_resp = openai.embeddings.create(
-            model="text-embedding-3-large",
-            input=chunk_texts
-        )
-        embeddings = [r.embedding for r in embedding_resp.data]
+        existing = {filename: list_chunk_ids(collection, filename) for filename in filenames_of(chunks)}
+        plan = plan_chunk_sync(chunks, existing, make_id=chunk_uuid)
+        
+        new_texts = [chunks[position][0] for position, _ in plan.new]
         
         with collection.batch.dynamic() as batch:
-            for (chunk_text, filename), vector in zip(chunks, embeddings):
-                chunk_id = str(uuid.uuid4())
-                batch.add_object(
-                    properties={"text": chunk_text, "filename": filename},
-                    vector=vector,
-                    uuid=chunk_id
-                )
+            # Objects are queued as each embedding batch finishes; the dynamic
+            # batch sends them in the background while the next batches embed
+            def add_objects(positions: List[int], vectors: List[List[float]]) -> None:
+                for i, vector in zip(positions, vectors):
+                    position, object_id = plan.new[i]
+                    chunk_text, filename = chunks[position]
+                    batch.add_object(
+                        properties={"text": chunk_text, "filename": filename},
+                        vector=vector,
+                        uuid=object_id
+                    )
+            
+            if new_texts:
+                embedding_pipeline.embed(new_texts, model="text-embedding-3-large", on_batch=add_objects)
             
             if batch.number_errors > 0:
                 print(f"Batch import has {batch.number_errors} errors so far.")
@@ -75,13 +76,21 @@ def upsert_chunks(chunks: List[Tuple[str, str]], collection_name: str):
         if failed_objects:
             print(f"Number of failed imports: {len(failed_objects)}")
             print(f"First failed object error: {failed_objects[0]}")
+            # Keep the stale objects while their replacements are missing; a retry
+            # writes only the objects that failed and then deletes them
+            bump_generation("weaviate", collection_name)
+            raise RuntimeError(
+                f"{len(failed_objects)} of {len(plan.new)} objects failed to import; stale objects were kept"
+            )
+        
+        # Stale objects go only after their replacements are written
+        for i in range(0, len(plan.stale), 1000):
+            collection.data.delete_many(where=Filter.by_id().contains_any(plan.stale[i:i+1000]))
         
-        print(f"Successfully upserted {len(chunks)} chunks to Weaviate (collection={collection_name}).")
+        bump_generation("weaviate", collection_name)
+        print(f"Synced {len(chunks)} chunks to Weaviate (collection={collection_name}): {plan.summary()}.")
+        return plan
     
     except Exception as e:
         print(f"Error upserting to Weaviate: {str(e)}")
         raise
-    
-    finally:
-        if client:
-            client.close()
\ No newline at end of file
@@ -0,0 +1,177 @@
+# chatbot/services/semantic_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("semantic_cache")
+logger.setLevel(logging.INFO)
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 3600))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 1000))
+
+
+def fingerprint_results(search_results: List[Dict[str, Any]]) -> str:
+    """Order-independent fingerprint of the retrieved chunk set."""
+    digests = sorted(
+        hashlib.sha256(f"{r.get('filename', '')}\x1f{r['text']}".encode("utf-8")).hexdigest()
+        for r in search_results
+    )
+    return hashlib.sha256("".join(digests).encode("utf-8")).hexdigest()
+
+
+def history_fingerprint(messages: List[Dict[str, Any]]) -> str:
+    """Hash of the prior conversation turns, so follow-ups only match the same conversation state."""
+    raw = json.dumps([[m.get("role"), m.get("content")] for m in messages], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def config_key(*configs: Dict[str, Any]) -> str:
+    """Stable hash of the LLM/vector store configuration an answer was produced with."""
+    raw = json.dumps(configs, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache for the RAG endpoints.
+
+    An entry is reused when the new query embedding is at least `threshold`
+    cosine-similar to a cached one, the retrieved chunk set has the same
+    fingerprint and the config key (LLM/vector store config and, for
+    conversations, the prior turns) is identical. Because the
+    fingerprint covers the retrieved chunks, re-indexed or deactivated PDFs
+    naturally miss; the PDF routes additionally drop entries that cite a
+    changed file. Entries expire after SEMANTIC_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _best_match(
+        self,
+        query_vector: List[float],
+        key: str,
+        threshold: float,
+        fingerprint: Optional[str] = None,
+    ) -> Optional[Tuple[int, Dict[str, Any], float]]:
+        """(entry_id, entry, similarity) of the closest live entry above threshold. Call with the lock held."""
+        now = time.monotonic()
+        expired = [i for i, e in self._entries.items() if now - e["created_at"] > self.ttl_seconds]
+        for i in expired:
+            del self._entries[i]
+
+        candidates = [
+            (i, e) for i, e in self._entries.items()
+            if e["config_key"] == key and (fingerprint is None or e["fingerprint"] == fingerprint)
+        ]
+        if not candidates:
+            return None
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        similarities = np.stack([e["vector"] for _, e in candidates]) @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            return None
+        entry_id, entry = candidates[best]
+        return entry_id, entry, float(similarities[best])
+
+    def has_candidate(
+        self,
+        query_vector: List[float],
+        key: str,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+    ) -> bool:
+        """
+        Whether any entry could match, before the retrieved chunks are known.
+        Callers skip the retrieval for the fingerprint when there is none.
+        """
+        with self._lock:
+            if self._best_match(query_vector, key, threshold) is not None:
+                return True
+            self.misses += 1
+            return False
+
+    def lookup(
+        self,
+        query_vector: List[float],
+        fingerprint: str,
+        key: str,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            match = self._best_match(query_vector, key, threshold, fingerprint)
+            if match is None:
+                self.misses += 1
+                return None
+            entry_id, entry, similarity = match
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            logger.info(f"Semantic cache hit (similarity={similarity:.4f})")
+            return entry
+
+    def store(
+        self,
+        query_vector: List[float],
+        fingerprint: str,
+        key: str,
+        answer: str,
+        search_results: List[Dict[str, Any]],
+    ) -> None:
+        if not answer:
+            return
+        vector = np.asarray(query_vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": vector,
+                "fingerprint": fingerprint,
+                "config_key": key,
+                "answer": answer,
+                "search_results": search_results,
+                "filenames": {r.get("filename") for r in search_results},
+                "created_at": time.monotonic(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_files(self, filenames: Iterable[str]) -> int:
+        filenames = set(filenames)
+        with self._lock:
+            stale = [i for i, e in self._entries.items() if e["filenames"] & filenames]
+            for i in stale:
+                del self._entries[i]
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached answers for {sorted(filenames)}")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+semantic_cache = SemanticAnswerCache()
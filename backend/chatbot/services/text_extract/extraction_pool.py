@@ -0,0 +1,80 @@
+# chatbot/services/text_extract/extraction_pool.py
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Union
+from dotenv import load_dotenv
+
+from chatbot.services.text_extract.pdf_extractor import PDFExtractor, EXTRACTION_PROCESSES
+
+load_dotenv()
+
+logger = logging.getLogger("extraction_pool")
+logger.setLevel(logging.INFO)
+
+
+def _init_process() -> None:
+    # Pages are OCR'd concurrently by PDFExtractor; keep each tesseract single-threaded
+    # so parallel pages do not oversubscribe the cores
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def _extract_pdf(source: Union[bytes, str]) -> str:
+    """Runs in a pool process: pypdf parsing, falling back to pdf2image + Tesseract OCR."""
+    extractor = PDFExtractor()
+    if isinstance(source, str):
+        with open(source, "rb") as pdf_file:
+            return extractor.extract_text(pdf_file)
+    return extractor.extract_text(source)
+
+
+class ExtractionPool:
+    """
+    Bounded process pool for PDF text extraction, so pypdf parsing and OCR
+    neither block the event loop nor hold the GIL of the web worker.
+    Processes are spawned (not forked) to stay clear of the parent's threads
+    and client connections, and the pool is created on first use.
+    """
+
+    def __init__(self, max_workers: int = EXTRACTION_PROCESSES):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_process
+                )
+                logger.info(f"Started PDF extraction pool with {self.max_workers} processes")
+            return self._executor
+
+    async def extract_pdf(self, source: Union[bytes, str]) -> str:
+        """Extract text from PDF bytes or a PDF file path."""
+        executor = self._get_executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, _extract_pdf, source)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed while OCR'ing a huge scan); start fresh for the next call
+            logger.error("PDF extraction process died; restarting the pool")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+extraction_pool = ExtractionPool()
@@ -4,78 +4,161 @@
 import os
 import io
 import logging
-from typing import Optional, BinaryIO, Union
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple, BinaryIO, Union
 
 import pytesseract
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path, pdfinfo_from_bytes
 from pypdf import PdfReader
 
 from .base import BaseExtractor
 
+# Extraction pool processes per uvicorn worker (used by extraction_pool); defaults
+# to half the cores, at most 4, so OCR never starves the web workers
+EXTRACTION_PROCESSES = int(os.getenv("EXTRACTION_PROCESSES", max(1, min(4, (os.cpu_count() or 2) // 2))))
+# Concurrent page OCRs per extraction. The settings multiply: each uvicorn worker
+# runs up to EXTRACTION_PROCESSES x OCR_WORKERS pdftoppm/tesseract subprocesses,
+# so the default splits half the cores between one worker's pool processes
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", max(1, (os.cpu_count() or 1) // (2 * EXTRACTION_PROCESSES))))
+# Pages rasterized and held (on disk) at once while OCR'ing a document
+OCR_WINDOW_PAGES = int(os.getenv("OCR_WINDOW_PAGES", 8))
+
 class PDFExtractor(BaseExtractor):
-    """Extract text from PDF files, with OCR capability for images/scanned documents."""
+    """
+    Extract text from PDF files, with OCR capability for images/scanned documents.
+
+    Each page is classified on its own: pages with embedded text keep it, and
+    only pages without (scans, figure pages) are rasterized and OCR'd. Those
+    pages are OCR'd concurrently in fixed-size windows; pdftoppm and tesseract
+    run as subprocesses, so threads spread the work across cores.
+    """
 
-    def __init__(self, logger: Optional[logging.Logger] = None, text_threshold: int = 50):
+    def __init__(
+        self,
+        logger: Optional[logging.Logger] = None,
+        text_threshold: int = 50,
+        ocr_workers: Optional[int] = None,
+        dpi: int = 150,
+        window_pages: Optional[int] = None
+    ):
         self.logger = logger or logging.getLogger(__name__)
-        self.text_threshold = text_threshold  # Minimum character count to consider embedded text sufficient
+        self.text_threshold = text_threshold  # Minimum character count for a page's embedded text to be kept
+        self.ocr_workers = ocr_workers or OCR_WORKERS
+        self.dpi = dpi
+        self.window_pages = max(1, window_pages or OCR_WINDOW_PAGES)
 
     def extract_text(self, file: Union[BinaryIO, io.BytesIO]) -> str:
-        """Extract text from a PDF file, using OCR if necessary."""
+        """Extract text from a PDF file, using OCR for pages without embedded text."""
+        return "\n".join(self.iter_page_texts(file))
+
+    def iter_page_texts(self, file: Union[BinaryIO, io.BytesIO]) -> Iterator[str]:
+        """
+        Yield the text of each page in order. Pages that need OCR are rasterized
+        a window at a time, so only OCR_WINDOW_PAGES page images exist at once.
+        """
         pdf_bytes = file.read() if hasattr(file, 'read') else file
         if isinstance(pdf_bytes, str):
             # If it's a file path
             with open(pdf_bytes, 'rb') as f:
                 pdf_bytes = f.read()
 
-        # 1) Try extracting embedded text using pypdf
-        embedded_text = self._extract_embedded_text(pdf_bytes)
-
-        # Check if embedded text is sufficient (at least text_threshold characters)
-        if len(embedded_text.strip()) > self.text_threshold:
-            self.logger.info("Sufficient embedded text found; returning extracted text.")
-            return embedded_text
-        else:
-            # 2) If insufficient text found, run OCR
-            self.logger.info("Minimal embedded text found; attempting OCR...")
-            ocr_text = self._run_ocr(pdf_bytes)
-            
-            # If OCR also found very little text, try combining results
-            if len(ocr_text.strip()) < self.text_threshold:
-                combined_text = f"{embedded_text}\n\n{ocr_text}"
-                self.logger.info(f"Combined text length: {len(combined_text)}")
-                return combined_text.strip()
-                
-            return ocr_text
+        # 1) Extract embedded text page by page using pypdf
+        pages = self._extract_embedded_pages(pdf_bytes)
+        if pages is None:
+            # pypdf could not parse the file; let poppler count the pages and OCR them all
+            try:
+                pages = [""] * pdfinfo_from_bytes(pdf_bytes)["Pages"]
+            except Exception as e:
+                self.logger.error(f"Error reading PDF page count: {str(e)}")
+                return
+
+        # 2) OCR only the pages whose embedded text is insufficient
+        image_pages = [i + 1 for i, text in enumerate(pages) if len(text.strip()) < self.text_threshold]
+        if not image_pages:
+            self.logger.info("Sufficient embedded text found on every page; no OCR needed.")
+            yield from pages
+            return
+
+        self.logger.info(f"OCR needed for {len(image_pages)} of {len(pages)} pages")
+        ocr_results = self._ocr_pages(pdf_bytes, image_pages)
+        ocr_page_numbers = set(image_pages)
+        for page_number, text in enumerate(pages, start=1):
+            if page_number in ocr_page_numbers:
+                _, ocr_text = next(ocr_results)
+                # Keep whichever is longer; OCR of a near-empty page can be worse than its few embedded chars
+                if len(ocr_text.strip()) > len(text.strip()):
+                    text = ocr_text
+            yield text
 
     def _extract_embedded_text(self, pdf_bytes: bytes) -> str:
         """Extract embedded text from the PDF using pypdf (no OCR)."""
+        pages = self._extract_embedded_pages(pdf_bytes)
+        return "\n".join(pages) if pages is not None else ""
+
+    def _extract_embedded_pages(self, pdf_bytes: bytes) -> Optional[List[str]]:
+        """Embedded text of every page, or None if pypdf cannot read the file."""
         text_buffer = []
         try:
             reader = PdfReader(io.BytesIO(pdf_bytes))
             for page in reader.pages:
-                page_text = page.extract_text() or ""
-                text_buffer.append(page_text)
+                try:
+                    text_buffer.append(page.extract_text() or "")
+                except Exception as e:
+                    self.logger.error(f"Error extracting text from page {len(text_buffer) + 1}: {str(e)}")
+                    text_buffer.append("")
         except Exception as e:
             self.logger.error(f"Error reading PDF with PdfReader: {str(e)}")
-            return ""
-        return "\n".join(text_buffer)
+            return None
+        return text_buffer
 
-    def _run_ocr(self, pdf_bytes: bytes) -> str:
-        """Convert PDF pages to images and run Tesseract OCR on each page."""
-        extracted = []
+    def _ocr_pages(self, pdf_bytes: bytes, page_numbers: List[int]) -> Iterator[Tuple[int, str]]:
+        """
+        OCR the given 1-based pages, yielding (page_number, text) in order.
+
+        Pages are processed in windows of OCR_WINDOW_PAGES: each window is
+        rendered to a temporary directory (paths_only, so the rasters never
+        sit in this process's memory), OCR'd concurrently from disk, and its
+        files are deleted before the next window starts. Peak memory and
+        disk use therefore depend on the window size, not the page count.
+        """
+        # Write the PDF once so each page render reads it from disk instead of re-copying the bytes
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file, \
+                ThreadPoolExecutor(max_workers=min(self.ocr_workers, self.window_pages, len(page_numbers))) as executor:
+            pdf_file.write(pdf_bytes)
+            pdf_file.flush()
+            for start in range(0, len(page_numbers), self.window_pages):
+                window = page_numbers[start:start + self.window_pages]
+                with tempfile.TemporaryDirectory(prefix="ocr-") as output_dir:
+                    texts = list(executor.map(lambda n: self._ocr_page(pdf_file.name, n, output_dir), window))
+                yield from zip(window, texts)
+
+    def _ocr_page(self, pdf_path: str, page_number: int, output_dir: str) -> str:
+        """Rasterize a single page to output_dir, run Tesseract on the file and delete it."""
         try:
             # You can adjust DPI to balance speed vs. accuracy
-            images = convert_from_bytes(pdf_bytes, dpi=150)
+            image_paths = convert_from_path(
+                pdf_path,
+                dpi=self.dpi,
+                first_page=page_number,
+                last_page=page_number,
+                output_folder=output_dir,
+                output_file=f"page-{page_number}",
+                paths_only=True
+            )
         except Exception as e:
-            self.logger.error(f"Error converting PDF to images for OCR: {str(e)}")
+            self.logger.error(f"Error converting PDF page {page_number} to an image for OCR: {str(e)}")
             return ""
 
-        for i, img in enumerate(images):
-            try:
-                self.logger.info(f"Running OCR on page {i+1}")
-                text = pytesseract.image_to_string(img)
-                extracted.append(text)
-            except Exception as e:
-                self.logger.error(f"Error during Tesseract OCR: {str(e)}")
-
-        return "\n".join(extracted)
\ No newline at end of file
+        try:
+            self.logger.info(f"Running OCR on page {page_number}")
+            return "\n".join(pytesseract.image_to_string(path) for path in image_paths)
+        except Exception as e:
+            self.logger.error(f"Error during Tesseract OCR on page {page_number}: {str(e)}")
+            return ""
+        finally:
+            for path in image_paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -5,44 +5,66 @@ import nltk
 nltk.download('punkt')  # Make sure we're downloading the correct tokenizer data
 
 import tiktoken
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import accumulate
 from nltk.tokenize import sent_tokenize
-from typing import List
+from typing import List, Tuple
 
-def text_splitter(
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model_name: str) -> tiktoken.Encoding:
+    return tiktoken.encoding_for_model(model_name)
+
+
+def text_splitter_with_token_counts(
     text: str,
     model_name: str = "text-embedding-3-large",
     target_chunk_size: int = 1000,
     chunk_overlap: int = 200
-) -> List[str]:
-    tokenizer = tiktoken.encoding_for_model(model_name)
+) -> Tuple[List[str], List[int]]:
+    """
+    Split text into chunks of whole sentences of about target_chunk_size
+    tokens, each starting with up to chunk_overlap tokens of trailing
+    sentences from the previous chunk.
+
+    Every sentence is tokenized once (in one batch); chunk and overlap sizes
+    come from prefix sums of the sentence token counts. Returns the chunks
+    and their token counts (the sum over their sentences).
+    """
+    tokenizer = get_tokenizer(model_name)
     sentences = sent_tokenize(text)
+    sentence_tokens = [len(tokens) for tokens in tokenizer.encode_batch(sentences, disallowed_special=())]
+    # prefix[i] is the token count of sentences[:i]
+    prefix = [0, *accumulate(sentence_tokens)]
 
     chunks = []
-    current_chunk = []
-    current_length = 0
-
-    for sentence in sentences:
-        sentence_length = len(tokenizer.encode(sentence))
-
-        if current_length + sentence_length > target_chunk_size:
-            chunks.append(" ".join(current_chunk).strip())
-            
-            overlap_sentences = []
-            overlap_length = 0
-            for prev_sentence in reversed(current_chunk):
-                prev_sentence_length = len(tokenizer.encode(prev_sentence))
-                if overlap_length + prev_sentence_length > chunk_overlap:
-                    break
-                overlap_sentences.insert(0, prev_sentence)
-                overlap_length += prev_sentence_length
-
-            current_chunk = overlap_sentences
-            current_length = overlap_length
-
-        current_chunk.append(sentence)
-        current_length += sentence_length
-
-    if current_chunk:
-        chunks.append(" ".join(current_chunk).strip())
-
-    return chunks
\ No newline at end of file
+    token_counts = []
+    start = 0  # current chunk is sentences[start:i]
+
+    def emit(end: int) -> None:
+        chunk = " ".join(sentences[start:end]).strip()
+        if chunk:
+            chunks.append(chunk)
+            token_counts.append(prefix[end] - prefix[start])
+
+    for i in range(len(sentences)):
+        if prefix[i + 1] - prefix[start] > target_chunk_size:
+            emit(i)
+            # Overlap: the longest run of trailing sentences within chunk_overlap tokens
+            start = bisect_left(prefix, prefix[i] - chunk_overlap, start, i + 1)
+
+    if start < len(sentences):
+        emit(len(sentences))
+
+    return chunks, token_counts
+
+
+def text_splitter(
+    text: str,
+    model_name: str = "text-embedding-3-large",
+    target_chunk_size: int = 1000,
+    chunk_overlap: int = 200
+) -> List[str]:
+    chunks, _ = text_splitter_with_token_counts(text, model_name, target_chunk_size, chunk_overlap)
+    return chunks
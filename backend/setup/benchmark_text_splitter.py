@@ -0,0 +1,110 @@
+"""Micro-benchmark of text_splitter on the sample .txt corpora in backend/.
+
+Compares the current splitter with the previous implementation (which
+re-tokenized sentences for every overlap window), checks that both produce
+the same chunks, and reports the time per corpus.
+
+Usage (from backend/):
+    python setup/benchmark_text_splitter.py [--repeat N] [files...]
+"""
+import argparse
+import pathlib
+import sys
+import time
+from typing import Callable, List
+
+BACKEND_PATH = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.append(str(BACKEND_PATH))
+
+import tiktoken
+from nltk.tokenize import sent_tokenize
+
+from chatbot.services.text_extract.text_splitter import get_tokenizer, text_splitter_with_token_counts
+
+
+def previous_text_splitter(
+    text: str,
+    model_name: str = "text-embedding-3-large",
+    target_chunk_size: int = 1000,
+    chunk_overlap: int = 200
+) -> List[str]:
+    """The splitter as it was before the single-pass rewrite, for comparison."""
+    tokenizer = tiktoken.encoding_for_model(model_name)
+    sentences = sent_tokenize(text)
+
+    chunks = []
+    current_chunk = []
+    current_length = 0
+
+    for sentence in sentences:
+        sentence_length = len(tokenizer.encode(sentence))
+
+        if current_length + sentence_length > target_chunk_size:
+            chunks.append(" ".join(current_chunk).strip())
+
+            overlap_sentences = []
+            overlap_length = 0
+            for prev_sentence in reversed(current_chunk):
+                prev_sentence_length = len(tokenizer.encode(prev_sentence))
+                if overlap_length + prev_sentence_length > chunk_overlap:
+                    break
+                overlap_sentences.insert(0, prev_sentence)
+                overlap_length += prev_sentence_length
+
+            current_chunk = overlap_sentences
+            current_length = overlap_length
+
+        current_chunk.append(sentence)
+        current_length += sentence_length
+
+    if current_chunk:
+        chunks.append(" ".join(current_chunk).strip())
+
+    return chunks
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="Text files (default: backend/*.txt corpora)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per file; the best time is reported")
+    args = parser.parse_args()
+
+    paths = [pathlib.Path(f) for f in args.files] or sorted(
+        p for p in BACKEND_PATH.glob("*.txt") if p.name != "requirements.txt"
+    )
+    get_tokenizer("text-embedding-3-large")  # Load the encoding outside the timings
+
+    print(f"{'file':<40} {'chars':>9} {'chunks':>7} {'previous':>10} {'current':>10} {'speedup':>8}")
+    total_previous = total_current = 0.0
+    for path in paths:
+        text = path.read_text(encoding="utf-8")
+        chunks, token_counts = text_splitter_with_token_counts(text)
+        previous_chunks = [c for c in previous_text_splitter(text) if c]
+        if chunks != previous_chunks:
+            print(f"{path.name}: chunks differ from the previous implementation", file=sys.stderr)
+            sys.exit(1)
+
+        previous = best_of(lambda: previous_text_splitter(text), args.repeat)
+        current = best_of(lambda: text_splitter_with_token_counts(text), args.repeat)
+        total_previous += previous
+        total_current += current
+        print(
+            f"{path.name[:40]:<40} {len(text):>9} {len(chunks):>7} "
+            f"{previous * 1000:>8.1f}ms {current * 1000:>8.1f}ms {previous / current:>7.1f}x"
+        )
+
+    print(f"{'total':<40} {'':>9} {'':>7} {total_previous * 1000:>8.1f}ms {total_current * 1000:>8.1f}ms "
+          f"{total_previous / total_current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
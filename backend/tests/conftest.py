@@ -0,0 +1,5 @@
+import os
+
+# Module-level clients are created on import; tests never reach the services
+os.environ.setdefault("PINECONE_API_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,42 @@
+import json
+
+from chatbot.services.retrieval.vectorstores.pinecone.batch_upsert import make_batches
+
+
+def vector(i, dimension=8, text="x"):
+    return {"id": f"id-{i}", "values": [0.123456] * dimension, "metadata": {"text": text}}
+
+
+def test_no_vectors_no_batches():
+    assert make_batches([]) == []
+
+
+def test_batches_respect_the_vector_limit():
+    batches = make_batches([vector(i) for i in range(25)], max_bytes=10**9, max_vectors=10)
+    assert [len(batch) for batch, _ in batches] == [10, 10, 5]
+
+
+def test_batches_respect_the_byte_limit():
+    vectors = [vector(i, dimension=100) for i in range(50)]
+    max_bytes = 5000
+    batches = make_batches(vectors, max_bytes=max_bytes, max_vectors=1000)
+    assert sum(len(batch) for batch, _ in batches) == 50
+    for batch, size in batches:
+        assert size <= max_bytes
+        assert len(json.dumps(batch)) <= max_bytes
+
+
+def test_large_metadata_makes_smaller_batches():
+    small = make_batches([vector(i) for i in range(20)], max_bytes=4000)
+    large = make_batches([vector(i, text="y" * 500) for i in range(20)], max_bytes=4000)
+    assert len(large) > len(small)
+
+
+def test_tuple_vectors_are_supported():
+    batches = make_batches([(f"id-{i}", [0.5, 0.5], {}) for i in range(3)], max_vectors=2)
+    assert [len(batch) for batch, _ in batches] == [2, 1]
+
+
+def test_an_oversized_vector_gets_its_own_batch():
+    batches = make_batches([vector(0, text="z" * 1000), vector(1)], max_bytes=100)
+    assert [len(batch) for batch, _ in batches] == [1, 1]
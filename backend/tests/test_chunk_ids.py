@@ -0,0 +1,58 @@
+import uuid
+
+from chatbot.services.retrieval.vectorstores.chunk_ids import (
+    chunk_id, chunk_uuid, document_prefix, filenames_of, plan_chunk_sync
+)
+
+
+def test_chunk_id_is_deterministic_and_prefixed_by_document():
+    assert chunk_id("a.pdf", "text") == chunk_id("a.pdf", "text")
+    assert chunk_id("a.pdf", "text") != chunk_id("b.pdf", "text")
+    assert chunk_id("a.pdf", "text").startswith(document_prefix("a.pdf"))
+    assert chunk_id("a.pdf", "other").startswith(document_prefix("a.pdf"))
+
+
+def test_chunk_uuid_is_a_stable_uuid():
+    value = chunk_uuid("a.pdf", "text")
+    assert str(uuid.UUID(value)) == value
+    assert chunk_uuid("a.pdf", "text") == value
+
+
+def test_plan_for_unindexed_document_writes_every_chunk():
+    chunks = [("one", "a.pdf"), ("two", "a.pdf")]
+    plan = plan_chunk_sync(chunks, {"a.pdf": set()})
+    assert plan.new == [(0, chunk_id("a.pdf", "one")), (1, chunk_id("a.pdf", "two"))]
+    assert plan.stale == []
+    assert plan.unchanged == 0
+
+
+def test_plan_diffs_against_stored_ids():
+    stored = {"a.pdf": {chunk_id("a.pdf", "one"), chunk_id("a.pdf", "gone"), "legacy-random-id"}}
+    plan = plan_chunk_sync([("one", "a.pdf"), ("new", "a.pdf")], stored)
+    assert plan.new == [(1, chunk_id("a.pdf", "new"))]
+    assert sorted(plan.stale) == sorted([chunk_id("a.pdf", "gone"), "legacy-random-id"])
+    assert plan.unchanged == 1
+    assert plan.summary() == "1 new, 1 unchanged, 2 stale"
+
+
+def test_plan_writes_repeated_chunk_text_once():
+    plan = plan_chunk_sync([("same", "a.pdf"), ("same", "a.pdf"), ("same", "b.pdf")], {})
+    assert [position for position, _ in plan.new] == [0, 2]
+
+
+def test_plan_only_touches_listed_files():
+    stored = {"a.pdf": {chunk_id("a.pdf", "one")}}
+    plan = plan_chunk_sync([("one", "a.pdf"), ("one", "b.pdf")], stored)
+    assert plan.new == [(1, chunk_id("b.pdf", "one"))]
+    assert plan.stale == []
+
+
+def test_plan_with_uuid_ids():
+    stored = {"a.pdf": {chunk_uuid("a.pdf", "one")}}
+    plan = plan_chunk_sync([("one", "a.pdf"), ("two", "a.pdf")], stored, make_id=chunk_uuid)
+    assert plan.new == [(1, chunk_uuid("a.pdf", "two"))]
+    assert plan.unchanged == 1
+
+
+def test_filenames_of_keeps_first_seen_order():
+    assert filenames_of([("x", "b"), ("y", "a"), ("z", "b")]) == ["b", "a"]
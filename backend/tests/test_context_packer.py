@@ -0,0 +1,78 @@
+import re
+
+import pytest
+
+from chatbot.services.retrieval import context_packer
+from chatbot.services.retrieval.context_packer import budget_for_model, pack_context
+
+
+@pytest.fixture(autouse=True)
+def simple_sentences(monkeypatch):
+    # Deterministic sentence boundaries, independent of the punkt model
+    monkeypatch.setattr(
+        context_packer, "sent_tokenize",
+        lambda text: [s for s in re.split(r"(?<=[.!?])\s+", text.strip()) if s]
+    )
+
+
+def hit(text, filename="a.pdf", score=1.0, token_count=None):
+    result = {"text": text, "filename": filename, "score": score}
+    if token_count is not None:
+        result["token_count"] = token_count
+    return result
+
+
+def test_overlapping_chunks_are_stitched_into_one_passage():
+    first = hit("One is here. Two is here. Three is here.", score=0.9, token_count=12)
+    second = hit("Two is here. Three is here. Four is here.", score=0.8, token_count=12)
+    context, stats = pack_context([first, second], token_budget=1000)
+    assert context == "[a.pdf]: One is here. Two is here. Three is here. Four is here.\n"
+    assert stats["passages"] == 1
+    assert stats["input_tokens"] == 24
+    assert stats["tokens_deduped"] > 0
+    assert stats["tokens_truncated"] == 0
+
+
+def test_sentences_repeated_in_other_files_are_dropped():
+    context, _ = pack_context(
+        [hit("Shared sentence. Only in a.", "a.pdf", 0.9), hit("Shared sentence. Only in b.", "b.pdf", 0.8)],
+        token_budget=1000
+    )
+    assert context == "[a.pdf]: Shared sentence. Only in a.\n\n[b.pdf]: Only in b.\n"
+
+
+def test_formatting_inside_chunks_is_kept():
+    text = "Steps:\n- first step.\n- second step.\n\n| a | b |"
+    context, _ = pack_context([hit(text)], token_budget=1000)
+    assert context == f"[a.pdf]: {text}\n"
+
+
+def test_dedupe_ignores_whitespace_differences():
+    context, _ = pack_context(
+        [hit("Same  text here.", "a.pdf", 0.9), hit("Same text\nhere.", "b.pdf", 0.8)],
+        token_budget=1000
+    )
+    assert context == "[a.pdf]: Same  text here.\n"
+
+
+def test_budget_truncation_is_reported_separately_from_dedupe():
+    text = "One two three four. Five six seven eight. Nine ten eleven twelve."
+    context, stats = pack_context([hit(text, token_count=12)], token_budget=5)
+    assert context == "[a.pdf]: One two three four.\n"
+    assert stats["packed_tokens"] == 4
+    assert stats["tokens_deduped"] == 0
+    assert stats["tokens_truncated"] == 8
+
+
+def test_best_scoring_hits_are_packed_first():
+    context, _ = pack_context(
+        [hit("Low score text.", "low.pdf", 0.1, 3), hit("High score text.", "high.pdf", 0.9, 3)],
+        token_budget=3
+    )
+    assert context == "[high.pdf]: High score text.\n"
+
+
+def test_budget_for_model_falls_back_to_default():
+    assert budget_for_model("gpt-4") == context_packer.MODEL_CONTEXT_BUDGETS["gpt-4"]
+    assert budget_for_model("unknown-model") == context_packer.CONTEXT_TOKEN_BUDGET
+    assert budget_for_model(None) == context_packer.CONTEXT_TOKEN_BUDGET
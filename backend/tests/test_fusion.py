@@ -0,0 +1,53 @@
+import pytest
+
+from chatbot.services.retrieval.fusion import fuse_results
+
+
+def hit(text, score, filename="a.pdf"):
+    return {"text": text, "score": score, "filename": filename}
+
+
+def test_rrf_rewards_chunks_returned_by_several_stores():
+    fused = fuse_results({
+        "pinecone": [hit("alpha", 0.9), hit("beta", 0.8)],
+        "weaviate": [hit("beta", 0.7), hit("gamma", 0.6)],
+    })
+    assert [r["text"] for r in fused] == ["beta", "alpha", "gamma"]
+    assert fused[0]["sources"] == ["pinecone", "weaviate"]
+    assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_rrf_weights_scale_store_contributions():
+    fused = fuse_results(
+        {"pinecone": [hit("alpha", 0.9)], "weaviate": [hit("beta", 0.9)]},
+        weights={"weaviate": 2.0}
+    )
+    assert [r["text"] for r in fused] == ["beta", "alpha"]
+
+
+def test_weighted_fusion_normalizes_each_store():
+    fused = fuse_results(
+        {
+            "pinecone": [hit("alpha", 0.9), hit("beta", 0.5)],
+            "weaviate": [hit("gamma", 40.0), hit("alpha", 10.0)],
+        },
+        method="weighted"
+    )
+    scores = {r["text"]: r["score"] for r in fused}
+    assert scores == pytest.approx({"alpha": 1.0, "beta": 0.0, "gamma": 1.0})
+
+
+def test_identical_text_is_merged_across_whitespace():
+    fused = fuse_results({"pinecone": [hit("same  text", 0.9)], "weaviate": [hit("same\ntext", 0.9)]})
+    assert len(fused) == 1
+    assert fused[0]["sources"] == ["pinecone", "weaviate"]
+
+
+def test_duplicates_within_one_store_count_once():
+    fused = fuse_results({"pinecone": [hit("same", 0.9), hit("same", 0.8)]})
+    assert len(fused) == 1
+    assert fused[0]["score"] == pytest.approx(1 / 61)
+
+
+def test_empty_lists_are_ignored():
+    assert fuse_results({"pinecone": [], "weaviate": []}) == []
@@ -0,0 +1,41 @@
+from chatbot.services.retrieval.mmr import mmr_select
+
+
+def candidate(name, values):
+    return {"text": name, "values": values}
+
+
+def test_near_duplicates_are_skipped_for_new_material():
+    candidates = [
+        candidate("best", [1.0, 0.0, 0.0]),
+        candidate("duplicate", [0.99, 0.01, 0.0]),
+        candidate("different", [0.7, 0.7, 0.0]),
+    ]
+    selected = mmr_select([1.0, 0.0, 0.0], candidates, top_k=2, lambda_mult=0.3)
+    assert [c["text"] for c in selected] == ["best", "different"]
+
+
+def test_lambda_one_is_plain_relevance_order():
+    candidates = [
+        candidate("third", [0.0, 1.0]),
+        candidate("first", [1.0, 0.0]),
+        candidate("second", [1.0, 0.2]),
+    ]
+    selected = mmr_select([1.0, 0.0], candidates, top_k=2, lambda_mult=1.0)
+    assert [c["text"] for c in selected] == ["first", "second"]
+
+
+def test_fewer_candidates_than_top_k_are_returned_unchanged():
+    candidates = [candidate("b", [0.0, 1.0]), candidate("a", [1.0, 0.0])]
+    assert mmr_select([1.0, 0.0], candidates, top_k=5) == candidates
+
+
+def test_candidates_without_values_fill_up_last():
+    candidates = [{"text": "no vector"}, candidate("vector", [1.0, 0.0])]
+    selected = mmr_select([1.0, 0.0], candidates, top_k=2)
+    assert [c["text"] for c in selected] == ["vector", "no vector"]
+
+
+def test_returns_at_most_top_k():
+    candidates = [candidate(str(i), [1.0, float(i)]) for i in range(5)]
+    assert len(mmr_select([1.0, 0.0], candidates, top_k=3)) == 3
@@ -0,0 +1,43 @@
+from chatbot.services.retrieval import result_cache
+from chatbot.services.retrieval.result_cache import GenerationTracker, RetrievalResultCache
+
+TARGET = ("pinecone", "pdf-vectors", "pdf_files")
+
+
+def test_generation_starts_at_zero_and_changes_on_every_bump(tmp_path):
+    tracker = GenerationTracker(root=str(tmp_path))
+    assert tracker.current(TARGET) == 0
+    tracker.bump(TARGET)
+    first = tracker.current(TARGET)
+    tracker.bump(TARGET)
+    assert first != 0
+    assert tracker.current(TARGET) > first
+
+
+def test_bump_is_seen_by_other_trackers_on_the_same_root(tmp_path):
+    writer = GenerationTracker(root=str(tmp_path))
+    reader = GenerationTracker(root=str(tmp_path))
+    before = reader.current(TARGET)
+    writer.bump(TARGET)
+    assert reader.current(TARGET) != before
+
+
+def test_targets_are_independent(tmp_path):
+    tracker = GenerationTracker(root=str(tmp_path))
+    tracker.bump(TARGET)
+    assert tracker.current(("pinecone", "pdf-vectors", "other")) == 0
+
+
+def test_cached_results_expire_when_a_target_is_bumped(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "generation_tracker", GenerationTracker(root=str(tmp_path)))
+    cache = RetrievalResultCache(max_size=10, ttl_seconds=60)
+    key = cache.make_key("query", {"top_k": 3})
+    cache.set(key, cache.generations([TARGET]), [{"text": "hit"}])
+    assert cache.get(key, [TARGET]) == [{"text": "hit"}]
+
+    result_cache.generation_tracker.bump(TARGET)
+    assert cache.get(key, [TARGET]) is None
+
+
+def test_cache_key_ignores_whitespace_in_the_query():
+    assert RetrievalResultCache.make_key("a  query", {}) == RetrievalResultCache.make_key("a query ", {})
@@ -0,0 +1,91 @@
+import random
+from typing import List
+
+import pytest
+
+from chatbot.services.text_extract import text_splitter
+
+
+class WhitespaceTokenizer:
+    """One token per word, so expected token counts are easy to state."""
+
+    def encode(self, text: str, **kwargs) -> List[str]:
+        return text.split()
+
+    def encode_batch(self, texts: List[str], **kwargs) -> List[List[str]]:
+        return [text.split() for text in texts]
+
+
+@pytest.fixture(autouse=True)
+def fake_tokenizers(monkeypatch):
+    monkeypatch.setattr(text_splitter, "get_tokenizer", lambda model_name: WhitespaceTokenizer())
+    monkeypatch.setattr(text_splitter, "sent_tokenize", lambda text: text.split("\n"))
+
+
+def previous_text_splitter(text: str, target_chunk_size: int, chunk_overlap: int) -> List[str]:
+    """The splitter before the prefix-sum rewrite (re-tokenizing every overlap window)."""
+    tokenizer = WhitespaceTokenizer()
+    sentences = text.split("\n")
+
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for sentence in sentences:
+        sentence_length = len(tokenizer.encode(sentence))
+        if current_length + sentence_length > target_chunk_size:
+            chunks.append(" ".join(current_chunk).strip())
+            overlap_sentences = []
+            overlap_length = 0
+            for prev_sentence in reversed(current_chunk):
+                prev_sentence_length = len(tokenizer.encode(prev_sentence))
+                if overlap_length + prev_sentence_length > chunk_overlap:
+                    break
+                overlap_sentences.insert(0, prev_sentence)
+                overlap_length += prev_sentence_length
+            current_chunk = overlap_sentences
+            current_length = overlap_length
+        current_chunk.append(sentence)
+        current_length += sentence_length
+    if current_chunk:
+        chunks.append(" ".join(current_chunk).strip())
+    # The old loop emitted an empty chunk when the first sentence alone exceeded the target
+    return [chunk for chunk in chunks if chunk]
+
+
+def random_text(rng: random.Random) -> str:
+    sentences = []
+    for _ in range(rng.randint(1, 60)):
+        words = rng.randint(1, 80)
+        sentences.append(" ".join(f"w{rng.randint(0, 9)}" for _ in range(words)) + ".")
+    return "\n".join(sentences)
+
+
+def test_matches_previous_implementation():
+    rng = random.Random(0)
+    for _ in range(1000):
+        text = random_text(rng)
+        target = rng.choice([20, 50, 100, 1000])
+        overlap = rng.choice([0, 5, 20, 200])
+        chunks, _ = text_splitter.text_splitter_with_token_counts(
+            text, target_chunk_size=target, chunk_overlap=overlap
+        )
+        assert chunks == previous_text_splitter(text, target, overlap)
+
+
+def test_token_counts_are_chunk_token_counts():
+    rng = random.Random(1)
+    for _ in range(200):
+        chunks, token_counts = text_splitter.text_splitter_with_token_counts(
+            random_text(rng), target_chunk_size=60, chunk_overlap=15
+        )
+        assert token_counts == [len(chunk.split()) for chunk in chunks]
+
+
+def test_chunks_overlap_by_trailing_sentences():
+    text = "\n".join(["a b c.", "d e f.", "g h i.", "j k l."])
+    chunks = text_splitter.text_splitter(text, target_chunk_size=6, chunk_overlap=3)
+    assert chunks == ["a b c. d e f.", "d e f. g h i.", "g h i. j k l."]
+
+
+def test_empty_text_has_no_chunks():
+    assert text_splitter.text_splitter_with_token_counts("") == ([], [])